@@ -1,37 +1,326 @@
 # api.py
 # Finance-Specific Chatbot Backend with Ollama
 
-from fastapi import FastAPI, HTTPException
+import time
+
+# Start of the startup clock (import time and time-to-ready are on /health)
+STARTUP_STARTED = time.perf_counter()
+
+import asyncio
+import hmac
+import json
+import os
+import threading
+from contextlib import aclosing, asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import ollama
+from pydantic import BaseModel, Field
 import uuid
 from sse_starlette.sse import EventSourceResponse
-from typing import List, Dict, Optional
+from typing import Annotated, Iterator, List, Dict, Literal, Optional
 from finance_utils import FinanceQueryValidator
+from context_builder import ContextBuilder
+from response_cache import ResponseCache, make_cache_key, split_for_replay
+from warm_answers import WarmAnswerCache, WarmQuery
+from session_store import create_session_store
+from single_flight import SingleFlight, flight_key
+from scheduler import GenerationScheduler, QueueFull
+from rate_limit import RateLimiter, RateLimitMiddleware
+from tracing import RequestIdMiddleware, Tracer
+from sampling_profiler import ProfilerBusy, SamplingProfiler
+from ollama_pool import OllamaPool
+from stream_coalescing import coalesce, resolve_policy
+from portfolio_batch import MAX_AMOUNT, compute_batch, iter_ndjson, to_columns
+from projections import project_portfolio
+from calculators import (
+    MAX_MONTHS, amortization_schedule, asks_for_advice, calculate, format_answer,
+    format_context, sip_schedule, to_columns as calculation_columns
+)
+from catalog import SORT_FIELDS, InstrumentCatalog
+from fast_responses import FastJSONResponse, StaticJSON, dumps
+from metrics import (
+    CHAR_COUNT_BUCKETS, MESSAGE_COUNT_BUCKETS, TOKEN_RATE_BUCKETS,
+    MetricsRegistry, RouteLatencyMiddleware
+)
 from investment_data import (
     MUTUAL_FUNDS, STOCKS, DEBT_INSTRUMENTS, 
-    RISK_ALLOCATIONS, get_investment_recommendations
+    RISK_ALLOCATIONS, SIP_GUIDELINES, get_investment_recommendations, build_portfolio
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ollama_client.start_health_checks()
+    # Load and pin the model in the background; /health turns ready after
+    warmup = run_in_background(warm_up_model())
+    # Then precompute the sample queries' answers, and keep them fresh
+    answers_job = run_in_background(keep_answers_warm(warmup))
+    yield
+    warmup.cancel()
+    answers_job.cancel()
+    await ollama_client.aclose()
+    # Flush write-behind message batches before the worker exits
+    session_store.close()
+
+
+app = FastAPI(
+    title="FinanceGPT API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    """422 rendered with orjson, which writes a rejected inf/NaN input as null"""
+    return FastJSONResponse(status_code=422, content={"detail": jsonable_encoder(exc.errors())})
+
+
+# Prometheus metrics for this worker (served on /metrics)
+metrics = MetricsRegistry()
+request_latency = metrics.histogram(
+    "financegpt_http_request_duration_seconds",
+    "Request latency by route template (whole stream for SSE routes)",
+    labelnames=("route", "method"),
+)
+validator_latency = metrics.histogram(
+    "financegpt_query_validation_seconds",
+    "Time spent in FinanceQueryValidator.is_finance_query",
+)
+query_rejections = metrics.counter(
+    "financegpt_query_rejections_total",
+    "Queries rejected as not finance-related, by validator category",
+    labelnames=("category",),
+)
+active_streams = metrics.gauge(
+    "financegpt_active_sse_streams",
+    "SSE chat responses currently streaming",
+)
+prompt_messages = metrics.histogram(
+    "financegpt_prompt_messages",
+    "Messages sent to the model per generation",
+    buckets=MESSAGE_COUNT_BUCKETS,
+)
+prompt_chars = metrics.histogram(
+    "financegpt_prompt_chars",
+    "Characters sent to the model per generation",
+    buckets=CHAR_COUNT_BUCKETS,
+)
+time_to_first_token = metrics.histogram(
+    "financegpt_time_to_first_token_seconds",
+    "From the request arriving to the first generated chunk being sent",
+)
+inter_token_latency = metrics.histogram(
+    "financegpt_inter_token_seconds",
+    "Gap between consecutive generated chunks",
+)
+generation_duration = metrics.histogram(
+    "financegpt_generation_duration_seconds",
+    "From requesting the generation (after queueing) to its last chunk",
+)
+generation_token_rate = metrics.histogram(
+    "financegpt_generation_tokens_per_second",
+    "Decode rate after the first chunk (Ollama streams one token per chunk)",
+    buckets=TOKEN_RATE_BUCKETS,
+)
+
+rate_limited_requests = metrics.counter(
+    "financegpt_rate_limited_requests_total",
+    "Requests refused with 429, by exhausted budget",
+    labelnames=("limit",),
 )
 
-app = FastAPI(title="FinanceGPT API", version="1.0.0")
+# Token buckets per client IP and per chat for session creation, messages
+# and generated tokens (see rate_limit.py; RATE_LIMIT_ENABLED=0 turns off)
+rate_limiter = RateLimiter.from_env()
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, rejections=rate_limited_requests)
 
-# Enable CORS for frontend
+# Enable CORS for frontend (outside the rate limiter, so 429s carry CORS
+# headers and the browser can read Retry-After)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:3000"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Request-ID"],
 )
 
-# Store active chats with conversation history and user profiles (in-memory)
-chats: Dict[str, List[Dict]] = {}
-user_profiles: Dict[str, Dict] = {}  # Store user profiles per chat
+calculator_answers = metrics.counter(
+    "financegpt_calculator_answers_total",
+    "Chat questions handled by the calculators: answered directly, or with "
+    "the numbers passed to the model",
+    labelnames=("kind", "mode"),
+)
+
+app.add_middleware(RouteLatencyMiddleware, histogram=request_latency)
+
+# Outermost, so every response (429s included) carries X-Request-ID
+app.add_middleware(RequestIdMiddleware)
+
+# Stage timings of every chat request; a TRACE_SAMPLE_RATE share of them,
+# plus slow and failed ones, stay in a ring buffer for /debug/traces
+tracer = Tracer(
+    capacity=int(os.getenv("TRACE_BUFFER_SIZE", "512")),
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0.1")),
+    slow_seconds=float(os.getenv("TRACE_SLOW_SECONDS", "2")),
+)
+# On-demand stack sampling of the event loop for /debug/profile
+profiler = SamplingProfiler()
+# /debug endpoints need this value in an X-Admin-Token header; while it is
+# unset they answer 404
+DEBUG_ADMIN_TOKEN = os.getenv("DEBUG_ADMIN_TOKEN")
+
+# Async Ollama clients so token streaming never blocks the event loop, one
+# per configured server (OLLAMA_HOSTS) with least-loaded routing, per-chat
+# affinity and failover (see ollama_pool.py)
+ollama_client = OllamaPool.from_env()
+OLLAMA_MODEL = "qwen2.5:7b"
+
+# Cache of complete answers for repeated queries with similar profiles
+response_cache = ResponseCache(max_entries=1024, ttl_seconds=6 * 3600)
+
+# Precomputed answers to the sample queries for every risk level, served on
+# a chat's first turn (see warm_answers.py). WARM_ANSWERS_PATH="" keeps them
+# in memory only
+warm_answers = WarmAnswerCache(
+    os.getenv("WARM_ANSWERS_PATH",
+              os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_answers.json")),
+    max_age_seconds=float(os.getenv("WARM_ANSWERS_MAX_AGE", str(24 * 3600))),
+)
+# Seconds between refreshes (0 = only at startup, negative = never generate)
+WARM_ANSWERS_INTERVAL = float(os.getenv("WARM_ANSWERS_INTERVAL", "3600"))
+# Pause between replayed chunks of a warm answer, so it streams like a live one
+WARM_REPLAY_DELAY = 0.015
+# Scheduler queue the refresh job's generations wait in
+WARM_ANSWERS_QUEUE = "warm-answers"
+
+# Identical concurrent generations share one upstream Ollama stream
+generations = SingleFlight()
+
+# Bounded concurrency and fair queueing of upstream generations
+scheduler = GenerationScheduler(
+    max_concurrent=int(os.environ.get("GENERATION_MAX_CONCURRENT", "4")),
+    max_queue=int(os.environ.get("GENERATION_MAX_QUEUE", "64")),
+)
+QUEUE_RETRY_AFTER_SECONDS = 5
+
+# chat_id -> stop handles of its running generations, for POST /chats/{id}/cancel
+active_generations: Dict[str, List[Dict]] = {}
+
+# Chat sessions, conversation history and user profiles.
+# SESSION_STORE=sqlite keeps them across restarts (see session_store.py)
+session_store = create_session_store()
+
+# Messages read from the store per chunk when streaming history as NDJSON
+HISTORY_PAGE_SIZE = 500
+
+# Fits history into a prompt token budget and summarizes older turns.
+# PROMPT_LAYOUT=stable (default) keeps the prompt prefix fixed across turns
+# so Ollama reuses its KV cache; "sliding" re-fits the newest turns each time
+context_builder = ContextBuilder(budget_tokens=2048, layout=os.getenv("PROMPT_LAYOUT", "stable"))
+
+# Fixed context window for every request: Ollama reloads the model (and
+# drops its KV cache) when num_ctx changes, and it must hold the prompt
+# budget plus the longest answer
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+background_tasks = set()
+
+
+def run_in_background(coro):
+    """Schedule a coroutine without awaiting it"""
+    task = asyncio.get_running_loop().create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def refresh_summary(chat_id: str):
+    """Extend the chat's rolling summary after an answer has been stored"""
+    if not session_store.exists(chat_id):
+        return
+    if context_builder.layout == "stable":
+        # Compacts once the next question would no longer fit
+        context_builder.compact(chat_id, load_history(chat_id))
+    else:
+        context_builder.update_summary(chat_id, session_store.get_messages(chat_id))
+
+
+# Startup budgets: importing this module, and import until the model is warm
+IMPORT_BUDGET_SECONDS = 2.0
+READY_BUDGET_SECONDS = 60.0
+
+startup = {
+    "ready": False,
+    "import_seconds": None,
+    "time_to_ready_seconds": None,
+    "warmup": None,
+}
+
+
+async def warm_up_model():
+    """Make every Ollama backend load the model so the first chat doesn't wait for it"""
+    try:
+        startup["warmup"] = await ollama_client.warm_up(
+            OLLAMA_MODEL, options={"num_ctx": OLLAMA_NUM_CTX}, system_prompt=SYSTEM_PROMPT_BASE
+        )
+    finally:
+        # A failed warm-up still ends the startup phase; the pool's health
+        # probes and failover take it from there
+        startup["time_to_ready_seconds"] = round(time.perf_counter() - STARTUP_STARTED, 3)
+        startup["ready"] = True
+
+
+def startup_stats():
+    import_ok = startup["import_seconds"] is not None and startup["import_seconds"] <= IMPORT_BUDGET_SECONDS
+    ready_ok = (startup["time_to_ready_seconds"] is not None
+                and startup["time_to_ready_seconds"] <= READY_BUDGET_SECONDS)
+    return {
+        **startup,
+        "import_budget_seconds": IMPORT_BUDGET_SECONDS,
+        "ready_budget_seconds": READY_BUDGET_SECONDS,
+        "within_budget": import_ok and ready_ok,
+    }
+
+# Generation length limits: a precomputed portfolio leaves only the narrative
+NUM_PREDICT_DEFAULT = 1000
+NUM_PREDICT_WITH_PORTFOLIO = 600
+
+PRECOMPUTED_PORTFOLIO_INSTRUCTIONS = """
+PRECOMPUTED PORTFOLIO (authoritative - use these exact percentages, amounts
+and fund/stock names; do not recalculate them, explain and personalize them):
+"""
+
+
+def format_portfolio_context(portfolio):
+    """Render a build_portfolio() result as compact prompt text"""
+    lines = [PRECOMPUTED_PORTFOLIO_INSTRUCTIONS.rstrip("\n")]
+    lines.append(f"Risk profile: {portfolio['risk_profile']} "
+                 f"(expected return {portfolio['total_expected_return']})")
+    for asset_class, capital in portfolio["capital_breakdown"].items():
+        sip = portfolio["sip_breakdown"][asset_class]
+        lines.append(f"- {asset_class}: {capital['percentage']}% = "
+                     f"?{capital['amount']:,.0f} lump sum + ?{sip['amount']:,.0f}/month SIP")
+    for asset_class, picks in portfolio["picks"].items():
+        names = ", ".join(pick["name"] for pick in picks)
+        lines.append(f"- {asset_class} picks: {names}")
+    guidance = portfolio["sip_guidance"]
+    lines.append(f"SIP guidance: {guidance['recommendation']} "
+                 f"({', '.join(guidance['suggested_funds'])})")
+    return "\n".join(lines) + "\n"
+
+
+# Investment catalog parsed once into typed, indexed records
+catalog = InstrumentCatalog.from_investment_data()
 
 # Finance-specific system prompt - Portfolio Advisor Edition
-def get_portfolio_prompt(user_profile=None):
-    base_prompt = """You are FinanceGPT, an AI Portfolio Advisor specializing in Indian investments.
+SYSTEM_PROMPT_BASE = """You are FinanceGPT, an AI Portfolio Advisor specializing in Indian investments.
 
 YOUR PRIMARY ROLE: Generate personalized investment portfolios for Indian investors based on their:
 - Capital amount
@@ -63,9 +352,13 @@ When generating a portfolio, always include:
 - Disclaimer to consult SEBI-registered advisor
 
 """
-    
-    if user_profile:
-        profile_context = f"""
+
+
+def get_profile_prompt(user_profile=None, portfolio=None):
+    """Per-user prompt text (profile and precomputed portfolio), or None"""
+    if not user_profile:
+        return None
+    profile_context = f"""
 CURRENT USER PROFILE:
 - Capital: ?{user_profile.get('capital', 'Not specified')}
 - Monthly SIP: ?{user_profile.get('monthly_sip', 'Not specified')}
@@ -74,9 +367,82 @@ CURRENT USER PROFILE:
 
 Generate a customized portfolio for this user.
 """
-        return base_prompt + profile_context
-    
-    return base_prompt
+    if portfolio:
+        profile_context += format_portfolio_context(portfolio)
+    return profile_context
+
+
+def get_risk_prompt(risk_appetite):
+    """Profile text for a risk level alone, which warm answers are generated with"""
+    return f"""
+CURRENT USER PROFILE:
+- Risk Appetite: {risk_appetite}
+
+Tailor the answer to this risk appetite; the user's amounts are not known yet.
+"""
+
+
+def generation_options(portfolio=None):
+    return {
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "top_k": 40,
+        "num_predict": NUM_PREDICT_WITH_PORTFOLIO if portfolio else NUM_PREDICT_DEFAULT,
+        "num_ctx": OLLAMA_NUM_CTX,
+        "repeat_penalty": 1.0,
+    }
+
+
+def warm_queries() -> List[WarmQuery]:
+    """Every sample query under every risk level, and without a profile"""
+    queries = []
+    for risk in [None, *RISK_ALLOCATIONS]:
+        system = [{"role": "system", "content": SYSTEM_PROMPT_BASE}]
+        if risk is not None:
+            system.append({"role": "system", "content": get_risk_prompt(risk)})
+        for query in FinanceQueryValidator.get_sample_queries():
+            messages = system + [{"role": "user", "content": query}]
+            queries.append(WarmQuery(query, risk, messages, generation_options()))
+    return queries
+
+
+# Entries generated from other prompts than these count as stale
+warm_answers.expect(warm_queries())
+
+
+async def generate_warm_answer(query: WarmQuery) -> str:
+    """One non-streamed generation, taking a scheduler slot like a chat would"""
+    ticket = scheduler.enqueue(WARM_ANSWERS_QUEUE)
+    try:
+        async for _ in scheduler.wait(ticket):
+            pass
+        response = await ollama_client.chat(
+            model=OLLAMA_MODEL, messages=query.messages, options=query.options
+        )
+    finally:
+        scheduler.release(ticket)
+    return response["message"]["content"]
+
+
+async def keep_answers_warm(warmup: asyncio.Task):
+    """Refresh warm answers once the model is loaded, then every WARM_ANSWERS_INTERVAL"""
+    if WARM_ANSWERS_INTERVAL < 0:
+        return
+    await asyncio.wait({warmup})
+    queries = warm_queries()
+    while True:
+        await warm_answers.refresh(queries, OLLAMA_MODEL, generate_warm_answer)
+        if WARM_ANSWERS_INTERVAL <= 0:
+            return
+        await asyncio.sleep(WARM_ANSWERS_INTERVAL)
+
+
+def load_history(chat_id: str) -> List[Dict]:
+    """The history context_builder.build() expects for its layout"""
+    if context_builder.layout == "stable":
+        # Everything from the window start on, so earlier turns keep their place
+        return session_store.get_page(chat_id, after=context_builder.window_start(chat_id) - 1)
+    return session_store.get_messages(chat_id, limit=context_builder.max_history_messages)
 
 
 class UserProfile(BaseModel):
@@ -89,6 +455,49 @@ class UserProfile(BaseModel):
 class ChatMessage(BaseModel):
     message: str
     user_profile: Optional[UserProfile] = None
+    # Compute the allocation locally and let the model write only the narrative
+    use_precomputed_portfolio: bool = True
+    # SSE batching: "token" sends every model chunk as its own event,
+    # "interval" and "sentence" coalesce them (see stream_coalescing.py)
+    stream_mode: Literal["token", "interval", "sentence"] = "interval"
+    flush_interval_ms: Optional[int] = Field(None, ge=0, le=1000)
+    flush_max_bytes: Optional[int] = Field(None, ge=0, le=65536)
+
+
+BatchAmount = Annotated[float, Field(ge=0, le=MAX_AMOUNT, allow_inf_nan=False)]
+
+
+class PortfolioBatchRequest(BaseModel):
+    # Columnar input: element i of each list describes profile i
+    capital: List[BatchAmount]
+    monthly_sip: List[BatchAmount]
+    risk_appetite: List[str]
+    format: Literal["ndjson", "columns"] = "ndjson"
+
+
+class ProjectionRequest(BaseModel):
+    capital: float = Field(ge=0)
+    monthly_sip: float = Field(ge=0)
+    risk_appetite: str = "medium"
+    years: int = Field(default=10, ge=1, le=50)
+    # Override the risk template's range, e.g. a fund's "12-14%"
+    expected_return: Optional[str] = None
+    paths: int = Field(default=10000, ge=100, le=100000)
+    seed: Optional[int] = 42
+
+
+class AmortizationRequest(BaseModel):
+    principal: float = Field(gt=0)
+    annual_rate: float = Field(ge=0, le=100)  # percent, 8.5 = 8.5%
+    months: int = Field(ge=1, le=MAX_MONTHS)
+
+
+class SIPScheduleRequest(BaseModel):
+    monthly_investment: float = Field(gt=0)
+    annual_rate: float = Field(ge=0, le=100)
+    months: int = Field(ge=1, le=MAX_MONTHS)
+    # Yearly increase of the instalment, percent
+    step_up: float = Field(default=0.0, ge=0, le=100)
 
 
 class ChatResponse(BaseModel):
@@ -96,169 +505,632 @@ class ChatResponse(BaseModel):
     message: str
 
 
+# Bodies that only change between deploys, serialized once with ETags
+ROOT_BODY = StaticJSON({
+    "service": "FinanceGPT API",
+    "version": "1.0.0",
+    "status": "active",
+    "description": "Finance-specific chatbot powered by Ollama"
+})
+INVESTMENT_OPTIONS_BODY = StaticJSON({
+    "mutual_funds": {
+        "large_cap": [fund["name"] for fund in MUTUAL_FUNDS["large_cap"][:3]],
+        "mid_cap": [fund["name"] for fund in MUTUAL_FUNDS["mid_cap"][:2]],
+        "debt": [fund["name"] for fund in MUTUAL_FUNDS["debt"][:2]]
+    },
+    "stocks": {
+        "blue_chip": [stock["name"] for stock in STOCKS["blue_chip"][:5]]
+    },
+    "risk_allocations": RISK_ALLOCATIONS
+})
+ALLOCATIONS_BODY = StaticJSON({
+    "risk_allocations": RISK_ALLOCATIONS,
+    "sip_guidelines": SIP_GUIDELINES
+})
+SAMPLE_QUERIES_BODY = StaticJSON({
+    "queries": FinanceQueryValidator.get_sample_queries()
+})
+
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """API root endpoint"""
-    return {
-        "service": "FinanceGPT API",
-        "version": "1.0.0",
-        "status": "active",
-        "description": "Finance-specific chatbot powered by Ollama"
-    }
+    return ROOT_BODY.response(request)
 
 
 @app.post("/chats")
 async def create_chat():
     """Create a new chat session"""
     chat_id = str(uuid.uuid4())
-    chats[chat_id] = []
-    user_profiles[chat_id] = None
+    session_store.create(chat_id)
     return {"id": chat_id, "message": "Chat session created successfully"}
 
 
+def iter_history_ndjson(chat_id: str, after: Optional[int], limit: Optional[int]) -> Iterator[bytes]:
+    """Yield history as NDJSON, reading HISTORY_PAGE_SIZE messages at a time"""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = HISTORY_PAGE_SIZE if remaining is None else min(HISTORY_PAGE_SIZE, remaining)
+        page = session_store.get_page(chat_id, after, size)
+        if not page:
+            return
+        yield b"".join(dumps(message) + b"\n" for message in page)
+        if len(page) < size:
+            return
+        after = page[-1]["seq"]
+        if remaining is not None:
+            remaining -= len(page)
+
+
 @app.get("/chats/{chat_id}/history")
-async def get_chat_history(chat_id: str):
-    """Get conversation history for a chat"""
-    if chat_id not in chats:
+async def get_chat_history(
+    chat_id: str,
+    after: Optional[int] = Query(default=None, ge=0),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    format: Literal["json", "ndjson"] = "json",
+):
+    """
+    Get conversation history for a chat
+    Each message carries its seq; pass next_after back as after to fetch the
+    following page. format=ndjson streams one message per line instead
+    """
+    if not session_store.exists(chat_id):
         raise HTTPException(status_code=404, detail="Chat session not found")
-    return {"chat_id": chat_id, "history": chats[chat_id]}
+    if format == "ndjson":
+        return StreamingResponse(
+            iter_history_ndjson(chat_id, after, limit), media_type="application/x-ndjson"
+        )
+    # One extra message tells whether another page follows
+    page = session_store.get_page(chat_id, after, limit + 1 if limit is not None else None)
+    next_after = None
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        next_after = page[-1]["seq"]
+    return {"chat_id": chat_id, "history": page, "next_after": next_after}
 
 
 @app.post("/chats/{chat_id}")
-async def send_message(chat_id: str, message: ChatMessage):
+async def send_message(chat_id: str, message: ChatMessage, request: Request):
     """
     Send a message and get streaming response
     Only accepts finance-related queries
     """
+    request_started = time.perf_counter()
+    client = rate_limiter.client_key(request.scope)
+    trace = tracer.start("send_message", request.state.request_id, chat_id=chat_id)
     
-    # Validate chat session exists
-    if chat_id not in chats:
-        raise HTTPException(status_code=404, detail="Chat session not found")
-    
-    # Store user profile if provided
-    if message.user_profile:
-        user_profiles[chat_id] = {
-            "capital": message.user_profile.capital,
-            "monthly_sip": message.user_profile.monthly_sip,
-            "risk_appetite": message.user_profile.risk_appetite,
-            "preferences": message.user_profile.preferences
-        }
-    
-    # Validate that query is finance-related
-    is_finance, category = FinanceQueryValidator.is_finance_query(message.message)
-    
-    if not is_finance:
-        # Return error for non-finance queries
-        rejection_msg = FinanceQueryValidator.get_rejection_message()
-        raise HTTPException(
-            status_code=400, 
-            detail={
-                "error": "non_finance_query",
-                "message": rejection_msg
-            }
-        )
+    try:
+        # Validate chat session exists
+        with trace.span("load_session"):
+            if not session_store.exists(chat_id):
+                raise HTTPException(status_code=404, detail="Chat session not found")
+        
+            # Store user profile if provided
+            if message.user_profile:
+                session_store.set_profile(chat_id, {
+                    "capital": message.user_profile.capital,
+                    "monthly_sip": message.user_profile.monthly_sip,
+                    "risk_appetite": message.user_profile.risk_appetite,
+                    "preferences": message.user_profile.preferences
+                })
+        
+        # Validate that query is finance-related
+        with trace.span("validate") as span:
+            is_finance, category = FinanceQueryValidator.is_finance_query(message.message)
+        validator_latency.observe(time.perf_counter() - span.started)
+        
+        if not is_finance:
+            query_rejections.labels(category).inc()
+            # Return error for non-finance queries
+            rejection_msg = FinanceQueryValidator.get_rejection_message()
+            raise HTTPException(
+                status_code=400, 
+                detail={
+                    "error": "non_finance_query",
+                    "message": rejection_msg
+                }
+            )
+        
+        # Reject right away when the generation queue is full
+        try:
+            scheduler.check_admission()
+        except QueueFull as e:
+            raise HTTPException(
+                status_code=503,
+                detail={
+                    "error": "server_busy",
+                    "message": "FinanceGPT is busy right now, please retry shortly."
+                },
+                headers={"Retry-After": str(QUEUE_RETRY_AFTER_SECONDS)}
+            )
+        
+        # Add user message to history
+        with trace.span("store_user_message"):
+            session_store.append_message(chat_id, {
+                "role": "user",
+                "content": message.message,
+                "category": category
+            })
+    except HTTPException as e:
+        tracer.finish(trace, status=str(e.status_code))
+        raise
     
-    # Add user message to history
-    chats[chat_id].append({
-        "role": "user",
-        "content": message.message,
-        "category": category
-    })
+    flush_policy = resolve_policy(
+        message.stream_mode, message.flush_interval_ms, message.flush_max_bytes
+    )
     
     async def event_generator():
+        ticket = None
+        full_response = ""
+        generated_tokens = 0
+        answer_stored = False
+        status = "ok"
+        # Time spent handing events to the client (resumed after each yield)
+        sse_write_seconds = 0.0
+        sse_writes = 0
+        handle = {"stop": asyncio.Event(), "stream_key": None}
+        active_generations.setdefault(chat_id, []).append(handle)
+        active_streams.inc()
+        
+        def store_answer(interrupted=False):
+            nonlocal answer_stored, status
+            answer = {"role": "assistant", "content": full_response}
+            if interrupted:
+                # Partial answer: the client went away or cancelled the chat
+                answer["interrupted"] = True
+                status = "interrupted"
+            answer_stored = True
+            try:
+                with trace.span("store_answer"):
+                    session_store.append_message(chat_id, answer)
+            except KeyError:
+                # The chat was deleted while the answer was being generated
+                return
+            run_in_background(refresh_summary(chat_id))
+        
         try:
             # Get user profile for this chat
-            profile = user_profiles.get(chat_id)
+            profile = session_store.get_profile(chat_id)
             
-            # Build conversation context with user profile
-            system_prompt = get_portfolio_prompt(profile)
-            messages = [{"role": "system", "content": system_prompt}]
+            # Loan and savings arithmetic is computed locally: a question the
+            # calculators fully answer never reaches the model, otherwise the
+            # exact numbers go into the prompt
+            with trace.span("calculate"):
+                calculation = calculate(message.message, profile)
+            if (calculation is not None and calculation.complete
+                    and not asks_for_advice(message.message)):
+                trace.attrs["source"] = "calculator"
+                calculator_answers.labels(calculation.kind, "direct").inc()
+                full_response = format_answer(calculation)
+                write_started = time.perf_counter()
+                yield {"data": full_response}
+                sse_write_seconds += time.perf_counter() - write_started
+                sse_writes += 1
+                store_answer()
+                return
             
-            # Add conversation history (last 5 exchanges to keep context manageable)
-            history_to_include = chats[chat_id][-10:]  # Last 10 messages (5 exchanges)
-            for msg in history_to_include:
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
+            # Precompute the allocation and picks so the model doesn't spend
+            # tokens on arithmetic
+            portfolio = None
+            if profile and message.use_precomputed_portfolio:
+                with trace.span("build_portfolio"):
+                    portfolio = build_portfolio(
+                        profile["capital"], profile["monthly_sip"],
+                        profile["risk_appetite"], profile["preferences"]
+                    )
             
-            # Stream response from Ollama using Qwen 2.5
-            full_response = ""
-            stream = ollama.chat(
-                model='qwen2.5:7b',
-                messages=messages,
-                stream=True,
-                options={
-                    "temperature": 0.7,
-                    "top_p": 0.9,
-                    "top_k": 40,
-                    "num_predict": 1000,
-                    "repeat_penalty": 1.0,
-                }
+            # Build conversation context with user profile, keeping as much
+            # recent history as fits the token budget (older turns are
+            # represented by the rolling summary)
+            with trace.span("build_prompt") as span:
+                history = load_history(chat_id)
+                messages, prompt_tokens = context_builder.build(
+                    chat_id, SYSTEM_PROMPT_BASE, history,
+                    get_profile_prompt(profile, portfolio),
+                )
+            span.attrs = {"messages": len(messages), "prompt_tokens": prompt_tokens}
+            if calculation is not None:
+                # Attached to this turn's question, so the cached prompt
+                # prefix stays the same
+                calculator_answers.labels(calculation.kind, "context").inc()
+                question = messages[-1]
+                messages[-1] = dict(question, content=question["content"] + "\n" + format_context(calculation))
+            prompt_messages.observe(len(messages))
+            prompt_chars.observe(sum(len(m["content"]) for m in messages))
+            
+            # A sample query opening a chat is answered from warm_answers,
+            # paced like a live stream
+            stop = handle["stop"]
+            if len(history) == 1:
+                risk = str(profile["risk_appetite"]).lower() if profile else None
+                warm_answer = warm_answers.get(message.message, risk, OLLAMA_MODEL)
+                if warm_answer is not None:
+                    trace.attrs["source"] = "warm_answers"
+                    for piece in split_for_replay(warm_answer):
+                        if stop.is_set():
+                            break
+                        full_response += piece
+                        write_started = time.perf_counter()
+                        yield {"data": piece}
+                        sse_write_seconds += time.perf_counter() - write_started
+                        sse_writes += 1
+                        await asyncio.sleep(WARM_REPLAY_DELAY)
+                    if stop.is_set():
+                        store_answer(interrupted=True)
+                        yield {"event": "interrupted", "data": ""}
+                    else:
+                        store_answer()
+                    return
+            
+            # Serve repeated questions from the response cache, replayed in
+            # chunks so the client sees the same kind of stream. The key
+            # covers the prompt as built (exact match): the sliding layout
+            # puts the user's exact amounts into the system message, the
+            # stable one into the message after it
+            cache_key = make_cache_key(
+                message.message,
+                messages[0]["content"],
+                messages[1:-1],
+                OLLAMA_MODEL,
             )
+            cached_response = response_cache.get(cache_key)
+            if cached_response is not None:
+                trace.attrs["source"] = "response_cache"
+                full_response = cached_response
+                for piece in split_for_replay(cached_response):
+                    write_started = time.perf_counter()
+                    yield {"data": piece}
+                    sse_write_seconds += time.perf_counter() - write_started
+                    sse_writes += 1
+                store_answer()
+                return
+            
+            # Stream response from Ollama using Qwen 2.5 (async, so other
+            # chats and endpoints keep being served while tokens arrive).
+            # Identical concurrent requests join the same upstream stream.
+            options = generation_options(portfolio)
+            
+            # The slot belongs to the upstream generation, which requests
+            # joining it keep running after this one leaves: the flight
+            # releases it when the generation ends
+            flight_ticket = None
+            
+            def release_flight_ticket():
+                if flight_ticket is not None:
+                    scheduler.release(flight_ticket)
+            
+            async def start_generation():
+                nonlocal flight_ticket
+                if flight_ticket is None:
+                    # Meant to join a generation that ended before this
+                    # request subscribed: take a slot like any other start
+                    flight_ticket = scheduler.enqueue(chat_id, admitted=True)
+                    async for _ in scheduler.wait(flight_ticket):
+                        pass
+                return await ollama_client.chat(
+                    model=OLLAMA_MODEL,
+                    messages=messages,
+                    stream=True,
+                    chat_id=chat_id,
+                    options=options
+                )
+            
+            stream_key = flight_key(OLLAMA_MODEL, messages, options)
+            handle["stream_key"] = stream_key
+            
+            # Joining an in-flight generation costs no GPU time; anything
+            # else waits for a slot, reporting its queue position meanwhile
+            if generations.is_in_flight(stream_key):
+                trace.attrs["source"] = "joined_generation"
+            else:
+                trace.attrs["source"] = "ollama"
+                ticket = scheduler.enqueue(chat_id, admitted=True)
+                with trace.span("queue_wait"):
+                    async for position in scheduler.wait(ticket, stop):
+                        yield {"event": "queue", "data": json.dumps({"position": position})}
             
-            for chunk in stream:
-                content = chunk['message']['content']
-                if content:
-                    full_response += content
-                    yield {"data": content}
+            async def generated_chunks():
+                nonlocal full_response, generated_tokens, ticket, flight_ticket
+                generation_started = time.perf_counter()
+                first_chunk_at = last_chunk_at = None
+                chunk_count = 0
+                # Whether this request starts the flight or joins one is only
+                # decided inside stream(), which hands the slot to the flight
+                # or releases it right away
+                flight_ticket, ticket = ticket, None
+                async with aclosing(generations.stream(stream_key, start_generation, stop,
+                                                       release_flight_ticket)) as stream:
+                    async for content in stream:
+                        now = time.perf_counter()
+                        if first_chunk_at is None:
+                            first_chunk_at = now
+                            time_to_first_token.observe(now - request_started)
+                            trace.add("ollama_first_token", generation_started, now - generation_started)
+                        else:
+                            inter_token_latency.observe(now - last_chunk_at)
+                        last_chunk_at = now
+                        chunk_count += 1
+                        generated_tokens += 1
+                        full_response += content
+                        yield content
+                if last_chunk_at is not None:
+                    trace.add("ollama_generation", generation_started,
+                              last_chunk_at - generation_started, {"chunks": chunk_count})
+                    generation_duration.observe(last_chunk_at - generation_started)
+                    if chunk_count > 1 and last_chunk_at > first_chunk_at:
+                        generation_token_rate.observe(
+                            (chunk_count - 1) / (last_chunk_at - first_chunk_at)
+                        )
+            
+            # Batch tokens into fewer SSE events unless the client asked for
+            # per-token streaming
+            if not stop.is_set():
+                async with aclosing(coalesce(generated_chunks(), flush_policy)) as batches:
+                    async for text in batches:
+                        write_started = time.perf_counter()
+                        yield {"data": text}
+                        sse_write_seconds += time.perf_counter() - write_started
+                        sse_writes += 1
             
             # Store assistant response in history
-            chats[chat_id].append({
-                "role": "assistant",
-                "content": full_response
-            })
+            if stop.is_set():
+                store_answer(interrupted=True)
+                yield {"event": "interrupted", "data": ""}
+            else:
+                store_answer()
+                if full_response:
+                    response_cache.set(cache_key, full_response)
                 
+        except asyncio.CancelledError:
+            # Client disconnected: leaving the stream above already released
+            # the upstream generation, keep what was produced so far
+            if not answer_stored:
+                store_answer(interrupted=True)
+            status = "interrupted"
+            raise
         except Exception as e:
+            status = "error"
+            trace.attrs["error"] = f"{type(e).__name__}: {e}"
             error_message = f"Error: {str(e)}"
             yield {"data": error_message}
+        finally:
+            if sse_writes:
+                trace.add("sse_write", request_started, sse_write_seconds, {"events": sse_writes})
+            tracer.finish(trace, status)
+            active_streams.dec()
+            # Answers from the caches cost no generation budget
+            rate_limiter.charge("generated_tokens_per_ip", client, generated_tokens)
+            if ticket is not None:
+                scheduler.release(ticket)
+            handles = active_generations.get(chat_id)
+            if handles is not None:
+                handles.remove(handle)
+                if not handles:
+                    del active_generations[chat_id]
     
     return EventSourceResponse(event_generator())
 
 
+@app.post("/chats/{chat_id}/cancel")
+async def cancel_generation(chat_id: str):
+    """Stop the chat's running generations, keeping the partial answers"""
+    if not session_store.exists(chat_id):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    
+    handles = list(active_generations.get(chat_id, ()))
+    for handle in handles:
+        handle["stop"].set()
+        if handle["stream_key"] is not None:
+            await generations.wake(handle["stream_key"])
+    return {"chat_id": chat_id, "cancelled": len(handles)}
+
+
 @app.delete("/chats/{chat_id}")
 async def delete_chat(chat_id: str):
     """Delete a chat session"""
-    if chat_id not in chats:
+    if not session_store.delete(chat_id):
         raise HTTPException(status_code=404, detail="Chat session not found")
-    
-    del chats[chat_id]
+    context_builder.forget(chat_id)
+    ollama_client.forget(chat_id)
     return {"message": "Chat session deleted successfully"}
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "ok",
-        "model": "qwen2.5:7b",
+    """Health check endpoint (503 until the startup warm-up has finished)"""
+    body = {
+        "status": "ok" if startup["ready"] else "warming_up",
+        "ready": startup["ready"],
+        "startup": startup_stats(),
+        "model": OLLAMA_MODEL,
         "service": "FinanceGPT Portfolio Advisor",
-        "active_chats": len(chats)
+        "ollama": ollama_client.stats(),
+        "active_chats": session_store.count(),
+        "response_cache": response_cache.stats(),
+        "warm_answers": warm_answers.stats(),
+        "context": context_builder.stats(),
+        "query_classifier": FinanceQueryValidator.classifier.stats(),
+        "single_flight": generations.stats(),
+        "scheduler": scheduler.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "tracing": tracer.stats(),
+        "profiler": profiler.stats(),
+        "active_generations": sum(len(handles) for handles in active_generations.values())
     }
+    if not startup["ready"]:
+        return FastJSONResponse(body, status_code=503)
+    return body
+
+
+def require_admin(request: Request):
+    """Hide /debug endpoints unless DEBUG_ADMIN_TOKEN is set and presented"""
+    if not DEBUG_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), DEBUG_ADMIN_TOKEN.encode()):
+        raise HTTPException(
+            status_code=403,
+            detail={"error": "forbidden", "message": "A valid X-Admin-Token header is required."}
+        )
+
+
+@app.get("/debug/traces")
+async def debug_traces(
+    request: Request,
+    limit: int = Query(default=50, ge=1, le=512),
+    min_ms: float = Query(default=0.0, ge=0),
+    name: Optional[str] = None,
+):
+    """Most recent sampled, slow and failed request traces (newest first)"""
+    require_admin(request)
+    return {"tracer": tracer.stats(), "traces": tracer.recent(limit, min_ms / 1000, name)}
+
+
+@app.get("/debug/profile")
+async def debug_profile(
+    request: Request,
+    seconds: float = Query(default=5.0, gt=0, le=60),
+    interval_ms: float = Query(default=5.0, ge=1, le=100),
+    format: Literal["json", "collapsed"] = "json",
+):
+    """
+    Sample the event loop's stack for a few seconds and report where it spent
+    its time. format=collapsed returns folded stacks for flame graph tools
+    """
+    require_admin(request)
+    # The sampler runs in a worker thread while this (the loop) thread goes
+    # on serving requests
+    loop_thread = threading.get_ident()
+    try:
+        result = await run_in_threadpool(profiler.run, seconds, loop_thread, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"error": "profile_running", "message": str(e)}
+        )
+    if format == "collapsed":
+        return Response(content=result["collapsed"], media_type="text/plain")
+    return result
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this worker"""
+    return Response(content=metrics.render(), media_type=MetricsRegistry.CONTENT_TYPE)
 
 
 @app.get("/investment-options")
-async def get_investment_options():
+async def get_investment_options(request: Request):
     """Get available investment options for reference"""
-    return {
-        "mutual_funds": {
-            "large_cap": [fund["name"] for fund in MUTUAL_FUNDS["large_cap"][:3]],
-            "mid_cap": [fund["name"] for fund in MUTUAL_FUNDS["mid_cap"][:2]],
-            "debt": [fund["name"] for fund in MUTUAL_FUNDS["debt"][:2]]
-        },
-        "stocks": {
-            "blue_chip": [stock["name"] for stock in STOCKS["blue_chip"][:5]]
-        },
-        "risk_allocations": RISK_ALLOCATIONS
-    }
+    return INVESTMENT_OPTIONS_BODY.response(request)
+
+
+@app.get("/allocations")
+async def get_allocations(request: Request):
+    """Get risk allocation templates and SIP guidelines"""
+    return ALLOCATIONS_BODY.response(request)
+
+
+@app.get("/instruments")
+async def list_instruments(
+    kind: Optional[str] = None,
+    risk: Optional[str] = None,
+    category: Optional[str] = None,
+    sector: Optional[str] = None,
+    max_min_investment: Optional[float] = None,
+    sort: str = "name",
+    order: Literal["asc", "desc"] = "asc",
+    limit: int = Query(default=20, ge=1, le=200),
+    cursor: Optional[str] = None,
+):
+    """
+    Query the investment catalog
+    Filters are exact matches (case-insensitive); pass next_cursor back as
+    cursor to fetch the following page
+    """
+    try:
+        return catalog.query(
+            kind=kind, risk=risk, category=category, sector=sector,
+            max_min_investment=max_min_investment,
+            sort=sort, descending=order == "desc",
+            limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_query", "message": str(e), "sort_fields": list(SORT_FIELDS)}
+        )
+
+
+@app.post("/portfolio")
+async def get_portfolio(profile: UserProfile):
+    """Compute a deterministic portfolio (allocation, picks, SIP guidance) for a profile"""
+    return build_portfolio(
+        profile.capital, profile.monthly_sip, profile.risk_appetite, profile.preferences
+    )
+
+
+@app.post("/portfolio/batch")
+async def get_portfolio_batch(batch: PortfolioBatchRequest):
+    """
+    Compute capital and SIP breakdowns for many profiles at once
+    Streams NDJSON (one profile per line) or returns Arrow-style columns
+    """
+    try:
+        result = compute_batch(batch.capital, batch.monthly_sip, batch.risk_appetite)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_batch", "message": str(e)}
+        )
+    
+    if batch.format == "columns":
+        return to_columns(result)
+    return StreamingResponse(iter_ndjson(result), media_type="application/x-ndjson")
+
+
+@app.post("/projection")
+async def get_projection(request: ProjectionRequest):
+    """
+    Monte Carlo projection of lump sum + SIP outcomes
+    Returns P10/P50/P90 wealth per year so answers can cite computed numbers
+    """
+    try:
+        # CPU-bound simulation runs off the event loop
+        return await run_in_threadpool(
+            project_portfolio,
+            request.capital, request.monthly_sip, request.risk_appetite,
+            years=request.years, expected_return=request.expected_return,
+            paths=request.paths, seed=request.seed,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_projection", "message": str(e)}
+        )
+
+
+@app.post("/calculators/amortization")
+async def get_amortization(request: AmortizationRequest):
+    """EMI, totals and the month-by-month schedule as columns (one list per field)"""
+    return calculation_columns(amortization_schedule(request.principal, request.annual_rate, request.months))
+
+
+@app.post("/calculators/sip")
+async def get_sip_schedule(request: SIPScheduleRequest):
+    """Future value of a (step-up) SIP and its month-by-month schedule as columns"""
+    return calculation_columns(sip_schedule(
+        request.monthly_investment, request.annual_rate, request.months, request.step_up
+    ))
 
 
 @app.get("/sample-queries")
-async def get_sample_queries():
+async def get_sample_queries(request: Request):
     """Get sample finance queries for UI"""
-    return {
-        "queries": FinanceQueryValidator.get_sample_queries()
-    }
+    return SAMPLE_QUERIES_BODY.response(request)
+
+
+startup["import_seconds"] = round(time.perf_counter() - STARTUP_STARTED, 3)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,587 @@
+# calculators.py
+# Deterministic loan and savings calculators, and a parser for chat questions asking for them
+#
+# Rates are annual percentages (8.5 means 8.5%) throughout. Schedules are
+# computed in closed form over numpy arrays, so a 30-year monthly schedule
+# costs the same handful of vector operations as a 1-year one.
+
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from investment_data import DEBT_INSTRUMENTS, RISK_ALLOCATIONS
+from projections import parse_return_range
+
+# Longest tenure the calculators accept (50 years of months)
+MAX_MONTHS = 600
+
+# PPF rules: yearly deposit limits and the minimum lock-in
+PPF_MIN_DEPOSIT = 500
+PPF_MAX_DEPOSIT = 150000
+PPF_YEARS = 15
+PPF_RATE = round(parse_return_range(DEBT_INSTRUMENTS["government_schemes"][0]["interest_rate"])[0] * 100, 2)
+
+# Typical bank FD rate, used when a question doesn't give one
+FD_TYPICAL_RATE = round(parse_return_range(DEBT_INSTRUMENTS["fixed_deposits"][0]["interest_rate"])[0] * 100, 2)
+
+COMPOUNDING = {"monthly": 12, "quarterly": 4, "half-yearly": 2, "half yearly": 2,
+               "semi-annually": 2, "yearly": 1, "annually": 1, "annual": 1}
+COMPOUNDING_NAMES = {12: "monthly", 4: "quarterly", 2: "half-yearly", 1: "yearly"}
+
+
+# -- calculations ----------------------------------------------------------
+
+def _check_tenure(months: int) -> None:
+    if months < 1:
+        raise ValueError(f"Tenure must be at least one month, got {months}")
+
+
+def emi(principal: float, annual_rate: float, months: int) -> float:
+    """Equated monthly instalment of a reducing-balance loan"""
+    _check_tenure(months)
+    r = annual_rate / 1200
+    if r == 0:
+        return principal / months
+    growth = (1 + r) ** months
+    return principal * r * growth / (growth - 1)
+
+
+def amortization_schedule(principal: float, annual_rate: float, months: int) -> Dict:
+    """
+    Month-by-month split of every EMI into interest and principal
+
+    Returns the EMI, totals, and arrays "month", "payment", "interest",
+    "principal" and "balance" (closing balance) of length months.
+    """
+    r = annual_rate / 1200
+    payment = emi(principal, annual_rate, months)
+    month = np.arange(1, months + 1)
+    if r == 0:
+        balance = principal - payment * month
+    else:
+        growth = (1 + r) ** month
+        balance = principal * growth - payment * (growth - 1) / r
+    balance = np.maximum(balance, 0.0)
+    balance[-1] = 0.0
+    opening = np.concatenate(([principal], balance[:-1]))
+    interest = opening * r
+    return {
+        "emi": payment,
+        "total_payment": payment * months,
+        "total_interest": payment * months - principal,
+        "month": month,
+        "payment": np.full(months, payment),
+        "interest": interest,
+        "principal": payment - interest,
+        "balance": balance,
+    }
+
+
+def flat_rate_loan(principal: float, annual_rate: float, months: int) -> Dict:
+    """
+    EMI of a flat-rate loan, where interest is charged on the full principal
+    for the whole tenure
+
+    Also returns "effective_rate": the reducing-balance rate with the same
+    EMI, which is what the loan really costs.
+    """
+    _check_tenure(months)
+    total_interest = principal * annual_rate / 100 * months / 12
+    payment = (principal + total_interest) / months
+    # emi() grows with the rate, so bisect for the rate giving this payment
+    low, high = 0.0, 2 * annual_rate + 1
+    for _ in range(60):
+        mid = (low + high) / 2
+        if emi(principal, mid, months) < payment:
+            low = mid
+        else:
+            high = mid
+    return {
+        "emi": payment,
+        "total_interest": total_interest,
+        "total_payment": principal + total_interest,
+        "effective_rate": (low + high) / 2,
+    }
+
+
+def sip_schedule(monthly: float, annual_rate: float, months: int,
+                 step_up: float = 0.0) -> Dict:
+    """
+    Value of a monthly SIP after every month
+
+    Instalments are invested at the start of each month and grow at
+    annual_rate / 12 a month; with step_up (percent) the instalment rises
+    that much every 12 months. Returns totals and arrays "month",
+    "contribution", "invested" and "value".
+    """
+    _check_tenure(months)
+    r = annual_rate / 1200
+    month = np.arange(1, months + 1)
+    contribution = monthly * (1 + step_up / 100) ** ((month - 1) // 12)
+    # value_k = sum_{j<=k} c_j (1+r)^(k-j+1) = (1+r)^(k+1) * cumsum(c_j (1+r)^-j)
+    discount = (1 + r) ** -month.astype(np.float64)
+    value = (1 + r) ** (month + 1.0) * np.cumsum(contribution * discount)
+    invested = np.cumsum(contribution)
+    return {
+        "future_value": float(value[-1]),
+        "invested": float(invested[-1]),
+        "gains": float(value[-1] - invested[-1]),
+        "final_instalment": float(contribution[-1]),
+        "month": month,
+        "contribution": contribution,
+        "invested_to_date": invested,
+        "value": value,
+    }
+
+
+def compound_interest(principal: float, annual_rate: float, years: float,
+                      periods_per_year: int = 1) -> Dict:
+    amount = principal * (1 + annual_rate / (100 * periods_per_year)) ** (periods_per_year * years)
+    return {"amount": amount, "interest": amount - principal}
+
+
+def ppf_schedule(yearly_deposit: float, years: int = PPF_YEARS,
+                 annual_rate: float = PPF_RATE) -> Dict:
+    """
+    Year-end PPF balances for a fixed deposit made before 5 April each year
+
+    Such deposits earn the whole year's interest, compounded yearly.
+    """
+    _check_tenure(years)
+    r = annual_rate / 100
+    year = np.arange(1, years + 1)
+    if r == 0:
+        balance = yearly_deposit * year.astype(np.float64)
+    else:
+        balance = yearly_deposit * (1 + r) * ((1 + r) ** year - 1) / r
+    deposited = yearly_deposit * year
+    return {
+        "maturity": float(balance[-1]),
+        "deposited": float(deposited[-1]),
+        "interest": float(balance[-1] - deposited[-1]),
+        "year": year,
+        "deposited_to_date": deposited,
+        "balance": balance,
+    }
+
+
+# -- formatting ------------------------------------------------------------
+
+def format_inr(value: float) -> str:
+    """₹ with Indian digit grouping: 1234567 -> ₹12,34,567"""
+    negative = value < 0
+    digits = str(int(round(abs(value))))
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        groups.insert(0, head)
+        digits = ",".join(groups) + "," + tail
+    return ("-₹" if negative else "₹") + digits
+
+
+def format_amount(value: float) -> str:
+    """format_inr plus lakh/crore in words for large amounts"""
+    text = format_inr(value)
+    for size, name in ((1e7, "crore"), (1e5, "lakh")):
+        if abs(value) >= size:
+            words = f"{value / size:.2f}".rstrip("0").rstrip(".")
+            return f"{text} ({words} {name})"
+    return text
+
+
+def format_rate(rate: float) -> str:
+    return f"{rate:g}%"
+
+
+def format_tenure(months: int) -> str:
+    if months % 12 == 0:
+        years = months // 12
+        return f"{years} year" + ("s" if years != 1 else "")
+    return f"{months} months"
+
+
+# -- parsing chat questions ------------------------------------------------
+
+_NUMBER = re.compile(
+    r"(?P<currency>₹|\brs\.?|\binr)?\s*"
+    r"(?P<value>\d+(?:,\d+)*(?:\.\d+)?)\s*-?\s*"
+    r"(?P<unit>%|percent\b|per cent\b|lakhs?\b|lacs?\b|l\b|crores?\b|cr\b|k\b|thousand\b|"
+    r"million\b|mn\b|years?\b|yrs?\b|months?\b|mos?\b)?"
+)
+_MULTIPLIERS = {"lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5, "l": 1e5,
+                "crore": 1e7, "crores": 1e7, "cr": 1e7, "k": 1e3, "thousand": 1e3,
+                "million": 1e6, "mn": 1e6}
+_STEP_UP_WORDS = re.compile(r"step[- ]?up|top[- ]?up|increas|increment|hike")
+# Returns are quoted "per year" or "p.a."; "10% every year" is a step-up
+_STEP_UP_AFTER = re.compile(r"^\s*(?:every|each) year")
+_PER_MONTH = re.compile(r"per month|a month|monthly|/\s*month|every month|p\.?m\b")
+# An amount that is a repayment rather than a principal ("I pay 25000 EMI"),
+# and questions about a loan already running
+_LOAN_PAYMENT = re.compile(
+    r"(?:emi|instal+ment)\s+(?:of\s+)?(?:₹|rs\.?|inr)?\s*\d"
+    r"|\d\s*(?:k|thousand|lakhs?)?\s*(?:emi|instal+ment|per month|a month|monthly)\b"
+)
+# "10% flat", "flat rate of 10%", "flat interest" (but not "a loan for a flat")
+_FLAT_RATE = re.compile(r"flat[- ](?:rate|interest)|\bflat\s+(?:of\s+)?\d|%\s*(?:p\.?a\.?\s*)?flat\b")
+_EXISTING_LOAN = re.compile(r"\b(?:remain|outstanding|prepay|part[- ]?pay|foreclos|already|left\b|balance)")
+_ADVICE = re.compile(r"\b(should|better|best|recommend|suggest|advi[cs]e|worth|afford|compare|"
+                     r"versus|vs|which|prefer|good idea)\b")
+
+# Checked in order: the first pattern found decides the calculator
+_KINDS = [
+    ("ppf", re.compile(r"\bppf\b|public provident")),
+    ("sip", re.compile(r"\bsips?\b|systematic investment")),
+    ("fd", re.compile(r"\bfds?\b|fixed deposit")),
+    ("amortization", re.compile(r"amorti[sz]ation|repayment schedule|loan schedule")),
+    ("emi", re.compile(r"\bemis?\b|\bloan\b|mortgage")),
+    ("compound_interest", re.compile(r"compound(?:ed|ing)?\b")),
+]
+
+
+class Quantities(NamedTuple):
+    """Numbers found in a question, in order of appearance"""
+    amounts: List[float]
+    rates: List[float]
+    step_ups: List[float]
+    months: List[int]
+    # Numbers that are none of the above (an age, "0 years"), as written
+    others: List[str]
+
+
+def extract_quantities(text: str) -> Quantities:
+    """Amounts (₹, lakh/crore/k), percentages and tenures in lowercased text"""
+    amounts, rates, step_ups, months, others = [], [], [], [], []
+    matches = list(_NUMBER.finditer(text))
+    for index, match in enumerate(matches):
+        value = float(match.group("value").replace(",", ""))
+        unit = match.group("unit")
+        if value <= 0 and unit not in ("%", "percent", "per cent"):
+            # A zero amount or tenure can't be calculated with: it counts as missing
+            others.append(match.group().strip())
+            continue
+        if unit in ("%", "percent", "per cent"):
+            # A step-up word must sit next to this percentage, not beyond
+            # the neighbouring numbers ("10% step-up for 20 years at 12%")
+            previous_end = matches[index - 1].end() if index else 0
+            next_start = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+            before = text[max(previous_end, match.start() - 30):match.start()]
+            after = text[match.end():min(next_start, match.end() + 20)]
+            step_up = _STEP_UP_WORDS.search(before + " " + after) or _STEP_UP_AFTER.search(after)
+            (step_ups if step_up else rates).append(value)
+        elif unit and unit.startswith(("year", "yr", "month", "mo")):
+            tenure = int(round(value * 12 if unit.startswith(("year", "yr")) else value))
+            if tenure >= 1:
+                months.append(tenure)
+            else:
+                others.append(match.group().strip())
+        elif unit in _MULTIPLIERS:
+            amounts.append(value * _MULTIPLIERS[unit])
+        elif match.group("currency") or value >= 100:
+            # Bare numbers below 100 are too ambiguous to treat as money
+            amounts.append(value)
+        else:
+            others.append(match.group().strip())
+    return Quantities(amounts, rates, step_ups, months, others)
+
+
+class Calculation(NamedTuple):
+    kind: str
+    inputs: Dict
+    results: Dict
+    # Lines of the answer: the headline first, then details
+    lines: List[str]
+    # Values the calculation had to estimate, or pick among several the
+    # question gives
+    assumptions: List[str]
+
+    @property
+    def complete(self) -> bool:
+        """Every input came from the question, and nothing else in it looks like one"""
+        return not self.assumptions
+
+
+def _ambiguities(q: Quantities, amount: str, step_up: bool = False) -> List[str]:
+    """
+    Assumptions behind reading the question's first amount, rate and tenure
+
+    A question with more numbers than the calculation takes ("I am 30 years
+    old...", "a 2024 model car") may mean a different one, so the result
+    is only offered to the model as context.
+    """
+    notes = []
+    if len(q.amounts) > 1:
+        notes.append(f"the {amount} is the first of the amounts in the question ("
+                     + ", ".join(format_amount(value) for value in q.amounts) + ")")
+    if len(q.rates) > 1:
+        notes.append("the rate is the first of the percentages in the question ("
+                     + ", ".join(format_rate(rate) for rate in q.rates) + ")")
+    if len(q.step_ups) > (1 if step_up else 0):
+        notes.append("step-ups in the question were not all used ("
+                     + ", ".join(format_rate(rate) for rate in q.step_ups) + ")")
+    if len(q.months) > 1:
+        notes.append("the tenure is the first of the durations in the question ("
+                     + ", ".join(format_tenure(months) for months in q.months) + ")")
+    if q.months and q.months[0] > MAX_MONTHS:
+        notes.append(f"the tenure is capped at {format_tenure(MAX_MONTHS)}")
+    if q.others:
+        notes.append("the question's other numbers (" + ", ".join(q.others) + ") are not inputs")
+    return notes
+
+
+def _expected_return(profile: Optional[Dict]) -> float:
+    """Midpoint of the profile's (or the medium) RISK_ALLOCATIONS expected return"""
+    risk = str((profile or {}).get("risk_appetite", "medium")).lower()
+    low, high = parse_return_range(RISK_ALLOCATIONS.get(risk, RISK_ALLOCATIONS["medium"])["expected_return"])
+    return round((low + high) / 2 * 100, 2)
+
+
+def _loan(kind: str, q: Quantities, text: str) -> Optional[Calculation]:
+    if not (q.amounts and q.rates and q.months):
+        return None
+    assumptions = _ambiguities(q, "loan principal")
+    if _LOAN_PAYMENT.search(text) or _EXISTING_LOAN.search(text):
+        assumptions.append("the amount is the principal of a new loan, though the question "
+                           "mentions a repayment or an existing loan")
+    principal, rate, months = q.amounts[0], q.rates[0], min(q.months[0], MAX_MONTHS)
+    if _FLAT_RATE.search(text):
+        return _flat_rate_loan(kind, principal, rate, months, assumptions)
+    schedule = amortization_schedule(principal, rate, months)
+    lines = [
+        f"**EMI for a {format_amount(principal)} loan at {format_rate(rate)} for "
+        f"{format_tenure(months)}: {format_inr(schedule['emi'])} per month**",
+        f"- Total interest: {format_amount(schedule['total_interest'])}",
+        f"- Total amount paid: {format_amount(schedule['total_payment'])}",
+        f"- Formula: EMI = P × r × (1 + r)^n / ((1 + r)^n − 1), with r = {format_rate(rate)} / 12 "
+        f"and n = {months} months",
+    ]
+    if kind == "amortization":
+        lines.append("")
+        lines.append("| Year | Principal paid | Interest paid | Balance at year end |")
+        lines.append("|---|---|---|---|")
+        for start in range(0, months, 12):
+            end = min(start + 12, months)
+            lines.append(
+                f"| {start // 12 + 1} | {format_inr(schedule['principal'][start:end].sum())} "
+                f"| {format_inr(schedule['interest'][start:end].sum())} "
+                f"| {format_inr(schedule['balance'][end - 1])} |"
+            )
+    return Calculation(
+        kind, {"principal": principal, "annual_rate": rate, "months": months},
+        {"emi": round(schedule["emi"], 2), "total_interest": round(schedule["total_interest"], 2),
+         "total_payment": round(schedule["total_payment"], 2)},
+        lines, assumptions,
+    )
+
+
+def _flat_rate_loan(kind: str, principal: float, rate: float, months: int,
+                    assumptions: List[str]) -> Calculation:
+    loan = flat_rate_loan(principal, rate, months)
+    lines = [
+        f"**EMI for a {format_amount(principal)} loan at a flat {format_rate(rate)} for "
+        f"{format_tenure(months)}: {format_inr(loan['emi'])} per month**",
+        f"- Total interest: {format_amount(loan['total_interest'])}",
+        f"- Total amount paid: {format_amount(loan['total_payment'])}",
+        f"- Formula: interest = P × {format_rate(rate)} × {months / 12:g} years on the full "
+        f"principal, EMI = (P + interest) / {months} months",
+        f"- Effective reducing-balance rate: {format_rate(round(loan['effective_rate'], 2))}, "
+        f"since a flat rate keeps charging interest on principal already repaid",
+    ]
+    if kind == "amortization":
+        # Lenders split flat-rate EMIs differently (e.g. the rule of 78)
+        assumptions.append("a flat-rate loan has no standard month-by-month split, so no "
+                           "schedule is given")
+    return Calculation(
+        kind, {"principal": principal, "annual_rate": rate, "months": months, "flat_rate": True},
+        {"emi": round(loan["emi"], 2), "total_interest": round(loan["total_interest"], 2),
+         "total_payment": round(loan["total_payment"], 2),
+         "effective_rate": round(loan["effective_rate"], 2)},
+        lines, assumptions,
+    )
+
+
+def _sip(q: Quantities, text: str, profile: Optional[Dict]) -> Optional[Calculation]:
+    if not (q.amounts and q.months):
+        return None
+    monthly, months = q.amounts[0], min(q.months[0], MAX_MONTHS)
+    step_up = q.step_ups[0] if q.step_ups else 0.0
+    assumptions = _ambiguities(q, "monthly investment", step_up=True)
+    if q.rates:
+        rate = q.rates[0]
+    else:
+        rate = _expected_return(profile)
+        assumptions.append(f"an annual return of {format_rate(rate)}, the midpoint of the "
+                           "expected return for the user's risk profile")
+    schedule = sip_schedule(monthly, rate, months, step_up)
+    headline = f"{format_inr(monthly)}/month SIP"
+    if step_up:
+        headline += f" stepped up {format_rate(step_up)} every year"
+    lines = [
+        f"**{headline} for {format_tenure(months)} at {format_rate(rate)}: "
+        f"{format_amount(schedule['future_value'])}**",
+        f"- Total invested: {format_amount(schedule['invested'])}",
+        f"- Estimated gains: {format_amount(schedule['gains'])}",
+    ]
+    if step_up:
+        lines.append(f"- Monthly instalment in the final year: {format_inr(schedule['final_instalment'])}")
+    lines.append(f"- Assumes each instalment is invested at the start of the month and "
+                 f"grows at {format_rate(rate)} / 12 a month; market returns are not guaranteed")
+    return Calculation(
+        "step_up_sip" if step_up else "sip",
+        {"monthly_investment": monthly, "annual_rate": rate, "months": months, "step_up": step_up},
+        {"future_value": round(schedule["future_value"], 2), "invested": round(schedule["invested"], 2),
+         "gains": round(schedule["gains"], 2)},
+        lines, assumptions,
+    )
+
+
+def _compounding(text: str, default: int) -> int:
+    for word, periods in COMPOUNDING.items():
+        if word in text:
+            return periods
+    return default
+
+
+def _fixed_deposit(q: Quantities, text: str) -> Optional[Calculation]:
+    if not (q.amounts and q.months):
+        return None
+    principal, months = q.amounts[0], min(q.months[0], MAX_MONTHS)
+    assumptions = _ambiguities(q, "deposit")
+    if q.rates:
+        rate = q.rates[0]
+    else:
+        rate = FD_TYPICAL_RATE
+        assumptions.append(f"an interest rate of {format_rate(rate)}, typical of large banks' FDs")
+    periods = _compounding(text, 4)
+    result = compound_interest(principal, rate, months / 12, periods)
+    lines = [
+        f"**FD of {format_amount(principal)} at {format_rate(rate)} for {format_tenure(months)}: "
+        f"matures at {format_amount(result['amount'])}**",
+        f"- Interest earned: {format_amount(result['interest'])}",
+        f"- Compounded {COMPOUNDING_NAMES[periods]}, as most Indian banks do; "
+        "interest is taxable and may be subject to TDS",
+    ]
+    return Calculation(
+        "fd", {"principal": principal, "annual_rate": rate, "months": months, "periods_per_year": periods},
+        {"maturity": round(result["amount"], 2), "interest": round(result["interest"], 2)},
+        lines, assumptions,
+    )
+
+
+def _ppf(q: Quantities, text: str) -> Optional[Calculation]:
+    if not q.amounts:
+        return None
+    yearly = q.amounts[0] * (12 if _PER_MONTH.search(text) else 1)
+    assumptions = _ambiguities(q, "deposit")
+    notes = []
+    if yearly > PPF_MAX_DEPOSIT:
+        notes.append(f"- PPF deposits are capped at {format_inr(PPF_MAX_DEPOSIT)} a year, "
+                     "so the projection uses the cap")
+        yearly = PPF_MAX_DEPOSIT
+    elif yearly < PPF_MIN_DEPOSIT:
+        return None
+    years = max(q.months[0] // 12, PPF_YEARS) if q.months else PPF_YEARS
+    rate = q.rates[0] if q.rates else PPF_RATE
+    schedule = ppf_schedule(yearly, years, rate)
+    lines = [
+        f"**PPF with {format_inr(yearly)} a year for {years} years at {format_rate(rate)}: "
+        f"{format_amount(schedule['maturity'])} at maturity**",
+        f"- Total deposited: {format_amount(schedule['deposited'])}",
+        f"- Interest earned (tax-free): {format_amount(schedule['interest'])}",
+        *notes,
+        f"- Assumes each deposit is made before 5 April and the rate stays at {format_rate(rate)} "
+        f"(the government revises it quarterly); the lock-in is {PPF_YEARS} years",
+    ]
+    return Calculation(
+        "ppf", {"yearly_deposit": yearly, "annual_rate": rate, "years": years},
+        {"maturity": round(schedule["maturity"], 2), "deposited": round(schedule["deposited"], 2),
+         "interest": round(schedule["interest"], 2)},
+        lines, assumptions,
+    )
+
+
+def _compound(q: Quantities, text: str) -> Optional[Calculation]:
+    if not (q.amounts and q.rates and q.months):
+        return None
+    principal, rate, months = q.amounts[0], q.rates[0], min(q.months[0], MAX_MONTHS)
+    assumptions = _ambiguities(q, "principal")
+    periods = _compounding(text, 1)
+    result = compound_interest(principal, rate, months / 12, periods)
+    lines = [
+        f"**{format_amount(principal)} at {format_rate(rate)} compounded {COMPOUNDING_NAMES[periods]} "
+        f"for {format_tenure(months)}: {format_amount(result['amount'])}**",
+        f"- Interest earned: {format_amount(result['interest'])}",
+        f"- Formula: A = P × (1 + r/m)^(m × t), with m = {periods} compounding periods a year",
+    ]
+    return Calculation(
+        "compound_interest",
+        {"principal": principal, "annual_rate": rate, "months": months, "periods_per_year": periods},
+        {"amount": round(result["amount"], 2), "interest": round(result["interest"], 2)},
+        lines, assumptions,
+    )
+
+
+def calculate(message: str, profile: Optional[Dict] = None) -> Optional[Calculation]:
+    """
+    Run the calculator a question asks for, if it gives enough numbers
+
+    Returns None when no calculator applies or a required input (amount,
+    and for loans and compound interest also rate and tenure) is missing.
+    """
+    text = message.lower()
+    kind = next((kind for kind, pattern in _KINDS if pattern.search(text)), None)
+    if kind is None:
+        return None
+    q = extract_quantities(text)
+    if kind in ("emi", "amortization"):
+        return _loan(kind, q, text)
+    if kind == "sip":
+        return _sip(q, text, profile)
+    if kind == "fd":
+        return _fixed_deposit(q, text)
+    if kind == "ppf":
+        return _ppf(q, text)
+    return _compound(q, text)
+
+
+def asks_for_advice(message: str) -> bool:
+    """True for questions wanting a judgement ("should I", "which is better"), not just numbers"""
+    return _ADVICE.search(message.lower()) is not None
+
+
+CALCULATION_INSTRUCTIONS = """
+CALCULATOR RESULT (computed exactly - quote these numbers as they are, do not
+recalculate them; explain them and answer the rest of the question):
+"""
+
+
+def format_answer(calculation: Calculation) -> str:
+    return "\n".join(calculation.lines) + (
+        "\n\n_Calculated exactly by FinanceGPT's calculator. For personalised advice, "
+        "consult a SEBI-registered advisor._"
+    )
+
+
+def format_context(calculation: Calculation) -> str:
+    """Calculator output as prompt text for the model"""
+    text = CALCULATION_INSTRUCTIONS + "\n".join(calculation.lines) + "\n"
+    if calculation.assumptions:
+        text += ("Assumed by the calculator (say so; if an assumption does not fit the question, "
+                 "ignore this result): " + "; ".join(calculation.assumptions) + "\n")
+    return text
+
+
+def to_columns(result: Dict) -> Dict:
+    """A schedule result as JSON: scalar totals plus one list per array column"""
+    body: Dict = {}
+    columns: Dict = {}
+    for key, value in result.items():
+        if isinstance(value, np.ndarray):
+            columns[key] = np.round(value, 2).tolist()
+        else:
+            body[key] = round(float(value), 2)
+    body["schedule"] = columns
+    return body
@@ -0,0 +1,282 @@
+# catalog.py
+# Typed, indexed view of the investment catalog with filter/sort/paginate queries
+
+import base64
+import re
+from bisect import bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from investment_data import DEBT_INSTRUMENTS, MUTUAL_FUNDS, STOCKS
+
+
+class Instrument(NamedTuple):
+    """One catalog entry with numeric facts parsed out of the display strings"""
+    id: str
+    name: str
+    kind: str                      # mutual_fund, stock, debt
+    section: str                   # key in the source dict, e.g. large_cap, blue_chip
+    category: str
+    risk: str
+    sector: Optional[str] = None
+    return_low: Optional[float] = None    # percent per year
+    return_high: Optional[float] = None
+    expense_ratio: Optional[float] = None  # percent
+    aum_cr: Optional[float] = None         # rupees crore
+    market_cap_cr: Optional[float] = None  # rupees crore
+    price: Optional[float] = None          # rupees
+    min_investment: Optional[float] = None
+    max_investment: Optional[float] = None
+    tenure: Optional[str] = None
+    tax_benefit: Optional[str] = None
+
+
+SORT_FIELDS = ("name", "return_low", "return_high", "expense_ratio", "aum_cr",
+               "market_cap_cr", "price", "min_investment")
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_SLUG = re.compile(r"[^a-z0-9]+")
+
+
+def parse_amount(text) -> Optional[float]:
+    """Parse "?2,400" / "?25,000 Cr" / "?17 Lakh Cr" (crore amounts stay in crore)"""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = _NUMBER.search(text.replace(",", ""))
+    if not match:
+        return None
+    value = float(match.group())
+    if "lakh" in text.lower():
+        value *= 100000
+    return value
+
+
+def parse_percent_range(text) -> Tuple[Optional[float], Optional[float]]:
+    """Parse "12-14%" / "7.1%" / "0.46%" into (low, high) percentages"""
+    if not text:
+        return None, None
+    numbers = [float(n) for n in _NUMBER.findall(text)]
+    if not numbers:
+        return None, None
+    return min(numbers), max(numbers)
+
+
+def _slug(text: str) -> str:
+    return _SLUG.sub("-", text.lower()).strip("-")
+
+
+def _fund(section: str, item: Dict) -> Instrument:
+    low, high = parse_percent_range(item.get("expected_return"))
+    return Instrument(
+        id=f"mutual_fund/{_slug(item['name'])}", name=item["name"], kind="mutual_fund",
+        section=section, category=item.get("category", section).lower(), risk=item["risk"],
+        return_low=low, return_high=high,
+        expense_ratio=parse_percent_range(item.get("expense_ratio"))[0],
+        aum_cr=parse_amount(item.get("aum")),
+        min_investment=parse_amount(item.get("min_investment")),
+    )
+
+
+def _stock(section: str, item: Dict) -> Instrument:
+    return Instrument(
+        id=f"stock/{_slug(item['name'])}", name=item["name"], kind="stock",
+        section=section, category=section, risk=item["risk"], sector=item.get("sector"),
+        market_cap_cr=parse_amount(item.get("market_cap")),
+        price=parse_amount(item.get("approx_price")),
+        # One share is the smallest possible investment
+        min_investment=parse_amount(item.get("approx_price")),
+    )
+
+
+def _debt(section: str, item: Dict) -> Instrument:
+    name = item.get("name") or f"{item['bank']} {item['type']}"
+    low, high = parse_percent_range(item.get("interest_rate"))
+    return Instrument(
+        id=f"debt/{_slug(name)}", name=name, kind="debt",
+        section=section, category=section, risk=item["risk"],
+        return_low=low, return_high=high,
+        min_investment=parse_amount(item.get("min_investment")),
+        max_investment=parse_amount(item.get("max_investment")),
+        tenure=item.get("tenure"), tax_benefit=item.get("tax_benefit"),
+    )
+
+
+def load_instruments() -> List[Instrument]:
+    """Parse MUTUAL_FUNDS, STOCKS and DEBT_INSTRUMENTS into Instrument records"""
+    instruments = []
+    for source, parse in ((MUTUAL_FUNDS, _fund), (STOCKS, _stock), (DEBT_INSTRUMENTS, _debt)):
+        for section, items in source.items():
+            instruments.extend(parse(section, item) for item in items)
+    return instruments
+
+
+def _encode_cursor(sort: str, descending: bool, rank: int) -> str:
+    raw = f"{sort}:{int(descending)}:{rank}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, descending: bool) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        field, desc, rank = base64.urlsafe_b64decode(padded).decode("ascii").split(":")
+        rank = int(rank)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if field != sort or bool(int(desc)) != descending:
+        raise ValueError("Cursor does not match the requested sort order")
+    return rank
+
+
+class InstrumentCatalog:
+    """
+    Immutable catalog with secondary indexes
+
+    Equality filters (kind, risk, category/section, sector) are answered from
+    hash indexes of record positions, the min-investment bound from a sorted
+    array, and every sort order is precomputed once. A page is produced either
+    by sorting the (small) filtered set or by walking the precomputed order
+    from the cursor, whichever touches fewer records.
+    """
+
+    def __init__(self, instruments: Iterable[Instrument]):
+        self.instruments: List[Instrument] = list(instruments)
+        self.by_id: Dict[str, Instrument] = {inst.id: inst for inst in self.instruments}
+
+        self._indexes: Dict[str, Dict[str, Set[int]]] = {
+            "kind": {}, "risk": {}, "category": {}, "sector": {},
+        }
+        for pos, inst in enumerate(self.instruments):
+            self._index("kind", inst.kind, pos)
+            self._index("risk", inst.risk, pos)
+            self._index("category", inst.category, pos)
+            self._index("category", inst.section, pos)
+            if inst.sector:
+                self._index("sector", inst.sector, pos)
+
+        with_min = sorted(
+            (inst.min_investment, pos) for pos, inst in enumerate(self.instruments)
+            if inst.min_investment is not None
+        )
+        self._min_values = [value for value, _ in with_min]
+        self._min_positions = [pos for _, pos in with_min]
+
+        # Ascending and descending order per sort field, missing values last
+        # in both; _ranks[key][pos] is a record's position in that order
+        self._orders: Dict[Tuple[str, bool], List[int]] = {}
+        self._ranks: Dict[Tuple[str, bool], List[int]] = {}
+        for field in SORT_FIELDS:
+            present = [pos for pos, inst in enumerate(self.instruments)
+                       if getattr(inst, field) is not None]
+            missing = [pos for pos, inst in enumerate(self.instruments)
+                       if getattr(inst, field) is None]
+            present.sort(key=lambda pos: self._sort_key(field, pos))
+            missing.sort(key=lambda pos: self._sort_key("name", pos))
+            for descending, order in ((False, present + missing),
+                                      (True, present[::-1] + missing)):
+                ranks = [0] * len(order)
+                for rank, pos in enumerate(order):
+                    ranks[pos] = rank
+                self._orders[(field, descending)] = order
+                self._ranks[(field, descending)] = ranks
+
+    @classmethod
+    def from_investment_data(cls) -> "InstrumentCatalog":
+        return cls(load_instruments())
+
+    def __len__(self) -> int:
+        return len(self.instruments)
+
+    def _index(self, name: str, value: str, pos: int) -> None:
+        self._indexes[name].setdefault(value.lower(), set()).add(pos)
+
+    def _sort_key(self, field: str, pos: int):
+        inst = self.instruments[pos]
+        value = getattr(inst, field)
+        if isinstance(value, str):
+            value = value.lower()
+        return (value, inst.name.lower(), pos)
+
+    def _candidates(self, filters: Dict[str, Optional[str]]) -> Optional[Set[int]]:
+        """Positions matching all equality filters (None means "no filter applied")"""
+        sets = [
+            self._indexes[name].get(value.lower(), set())
+            for name, value in filters.items() if value is not None
+        ]
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = set(sets[0])
+        for other in sets[1:]:
+            result &= other
+        return result
+
+    def query(self, kind: Optional[str] = None, risk: Optional[str] = None,
+              category: Optional[str] = None, sector: Optional[str] = None,
+              max_min_investment: Optional[float] = None,
+              sort: str = "name", descending: bool = False,
+              limit: int = 20, cursor: Optional[str] = None) -> Dict:
+        """
+        Filter, sort and paginate the catalog
+
+        Returns {"items": [...], "next_cursor": str | None, "total": int}.
+        Raises ValueError for an unknown sort field or a bad cursor.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        ranks = self._ranks[(sort, descending)]
+        order = self._orders[(sort, descending)]
+        after = _decode_cursor(cursor, sort, descending) if cursor else -1
+        small = 4 * limit + 64
+
+        candidates = self._candidates(
+            {"kind": kind, "risk": risk, "category": category, "sector": sector}
+        )
+        within_budget = None  # per-record min-investment check, when not folded into candidates
+        if max_min_investment is not None:
+            stop = bisect_right(self._min_values, max_min_investment)
+            if candidates is not None:
+                candidates = {
+                    pos for pos in candidates
+                    if self.instruments[pos].min_investment is not None
+                    and self.instruments[pos].min_investment <= max_min_investment
+                }
+            elif stop <= small:
+                candidates = set(self._min_positions[:stop])
+            else:
+                def within_budget(pos: int) -> bool:
+                    value = self.instruments[pos].min_investment
+                    return value is not None and value <= max_min_investment
+                total = stop
+        if candidates is not None:
+            total = len(candidates)
+        elif within_budget is None:
+            total = len(order)
+
+        if candidates is not None and len(candidates) <= small:
+            # Few matches: sort them by their precomputed rank
+            page = sorted(
+                (pos for pos in candidates if ranks[pos] > after),
+                key=ranks.__getitem__,
+            )[:limit + 1]
+        else:
+            # Many matches: walk the precomputed order from the cursor
+            page = []
+            for rank in range(after + 1, len(order)):
+                pos = order[rank]
+                if candidates is not None and pos not in candidates:
+                    continue
+                if within_budget is not None and not within_budget(pos):
+                    continue
+                page.append(pos)
+                if len(page) > limit:
+                    break
+
+        has_more = len(page) > limit
+        page = page[:limit]
+        next_cursor = _encode_cursor(sort, descending, ranks[page[-1]]) if has_more else None
+        return {
+            "items": [self.instruments[pos]._asdict() for pos in page],
+            "next_cursor": next_cursor,
+            "total": total,
+        }
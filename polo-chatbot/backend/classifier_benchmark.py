@@ -0,0 +1,117 @@
+# classifier_benchmark.py
+# Accuracy and latency of the keyword validator vs. keyword + second-stage classifier
+#
+# python classifier_benchmark.py --folds 5 --repeat 200
+#
+# Accuracy is measured by k-fold cross-validation over query_samples.tsv: each
+# fold's classifier is trained on the keyword tables plus the other folds and
+# scored on the held-out queries, so no query is judged by a model that saw it.
+
+import argparse
+import json
+import random
+import time
+from typing import Dict, List, Tuple
+
+from finance_utils import FinanceQueryValidator
+from loadtest import summarize
+from query_classifier import load_samples, train_query_classifier
+
+
+def score(verdicts: List[Tuple[bool, bool]]) -> Dict:
+    """verdicts are (predicted, expected) pairs; positive = finance"""
+    false_rejects = sum(1 for predicted, expected in verdicts if expected and not predicted)
+    false_accepts = sum(1 for predicted, expected in verdicts if predicted and not expected)
+    return {
+        "queries": len(verdicts),
+        "accuracy": round(1 - (false_rejects + false_accepts) / len(verdicts), 4),
+        "false_rejects": false_rejects,
+        "false_accepts": false_accepts,
+    }
+
+
+def cross_validate(samples: List[Tuple[str, bool]], folds: int, seed: int) -> Dict:
+    order = list(range(len(samples)))
+    random.Random(seed).shuffle(order)
+    keyword_only: List[Tuple[bool, bool]] = []
+    two_stage: List[Tuple[bool, bool]] = []
+    classifier_calls = 0
+    original = FinanceQueryValidator.classifier
+    try:
+        for fold in range(folds):
+            held_out = [samples[i] for i in order[fold::folds]]
+            training = [samples[i] for n, i in enumerate(order) if n % folds != fold]
+            classifier = train_query_classifier(
+                FinanceQueryValidator.FINANCE_KEYWORDS,
+                FinanceQueryValidator.NON_FINANCE_INDICATORS,
+                training,
+            )
+            FinanceQueryValidator.classifier = classifier
+            for text, expected in held_out:
+                keyword_only.append((FinanceQueryValidator.is_finance_query(text, use_classifier=False)[0], expected))
+                two_stage.append((FinanceQueryValidator.is_finance_query(text)[0], expected))
+            classifier_calls += classifier.misses
+    finally:
+        FinanceQueryValidator.classifier = original
+    return {
+        "folds": folds,
+        "keyword_only": score(keyword_only),
+        "two_stage": dict(score(two_stage), classifier_calls=classifier_calls),
+    }
+
+
+def time_calls(texts: List[str], repeat: int, call) -> Dict:
+    """Per-call latency (seconds) of call(text) over repeat passes"""
+    timings = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            call(text)
+            timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def measure_latency(samples: List[Tuple[str, bool]], repeat: int) -> Dict:
+    texts = [text for text, _ in samples]
+    classifier = FinanceQueryValidator.classifier
+
+    def uncached(text: str):
+        classifier.clear_cache()
+        return FinanceQueryValidator.is_finance_query(text)
+
+    started = time.perf_counter()
+    train_query_classifier(FinanceQueryValidator.FINANCE_KEYWORDS,
+                           FinanceQueryValidator.NON_FINANCE_INDICATORS, samples)
+    training_seconds = time.perf_counter() - started
+    return {
+        "training_seconds": round(training_seconds, 4),
+        "keyword_only": time_calls(texts, repeat, lambda text: FinanceQueryValidator.is_finance_query(text, use_classifier=False)),
+        "two_stage_uncached": time_calls(texts, repeat, uncached),
+        "two_stage_cached": time_calls(texts, repeat, FinanceQueryValidator.is_finance_query),
+        "classifier_only_uncached": time_calls(texts, repeat, lambda text: (classifier.clear_cache(), classifier.predict(text))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the finance query validator")
+    parser.add_argument("--samples", default=FinanceQueryValidator.SAMPLES_PATH)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200, help="timing passes over the samples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    report = {
+        "accuracy": cross_validate(samples, args.folds, args.seed),
+        "latency_seconds": measure_latency(samples, args.repeat),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# concurrency_benchmark.py
+# Aggregate tokens/sec and time-to-first-token of parallel chats: blocking vs. async Ollama client
+#
+# python concurrency_benchmark.py --levels 1 4 16 --chats-per-level 4
+#
+# For each client mode, fake_ollama.py and the API are started as child
+# processes and loadtest.run_load drives one batch of chats per concurrency
+# level. "async" is api.py as it is, streaming through ollama.AsyncClient.
+# "blocking" is the same app with the client swapped for the previous
+# behaviour: ollama.Client(stream=True) iterated inside the event loop, so
+# every token read blocks all other requests. The scheduler's slot limit is
+# raised to the highest level so it does not cap either mode. Tokens/sec is
+# measured from the streamed text (loadtest's tokens_per_second), not taken
+# from the fake server's configured rate. The script exits non-zero if the
+# async client does not deliver more tokens/sec and a lower p99 TTFT than the
+# blocking one at every level above 1.
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+import httpx
+
+from loadtest import BACKEND_DIR, run_load, stop_servers, wait_until_up
+
+MODES = ("blocking", "async")
+
+
+class BlockingOllamaClient:
+    """Delegates to the app's OllamaPool but streams through the sync client"""
+
+    def __init__(self, pool, host: str):
+        import ollama
+        self._pool = pool
+        self._sync = ollama.Client(host=host)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    async def chat(self, *args, stream: bool = False, chat_id=None, **kwargs):
+        if not stream:
+            return await self._pool.chat(*args, chat_id=chat_id, **kwargs)
+        chunks = self._sync.chat(*args, stream=True, **kwargs)
+
+        async def blocking_stream():
+            for chunk in chunks:
+                yield chunk
+
+        return blocking_stream()
+
+
+def serve(mode: str, port: int) -> None:
+    """Run api:app in this process, with the blocking client if asked"""
+    import uvicorn
+    import api
+
+    if mode == "blocking":
+        api.ollama_client = BlockingOllamaClient(api.ollama_client, os.environ["OLLAMA_HOST"])
+    uvicorn.run(api.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def spawn(args, mode: str) -> List[subprocess.Popen]:
+    fake = subprocess.Popen([
+        sys.executable, "fake_ollama.py",
+        "--port", str(args.fake_port),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--first-token-latency", str(args.first_token_latency),
+        "--response-tokens", str(args.response_tokens),
+    ], cwd=BACKEND_DIR)
+    env = dict(os.environ, OLLAMA_HOST=f"http://127.0.0.1:{args.fake_port}",
+               WARM_ANSWERS_INTERVAL="-1", WARM_ANSWERS_PATH="", RATE_LIMIT_ENABLED="0",
+               GENERATION_MAX_CONCURRENT=str(max(args.levels)),
+               GENERATION_MAX_QUEUE=str(max(args.levels) * args.chats_per_level))
+    api = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(args.port),
+    ], cwd=BACKEND_DIR, env=env)
+    processes = [fake, api]
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.fake_port}/api/version")
+        wait_until_up(f"http://127.0.0.1:{args.port}/health")
+    except Exception:
+        stop_servers(processes)
+        raise
+    return processes
+
+
+def load_args(args, mode: str, concurrency: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        url=f"http://127.0.0.1:{args.port}", chats=concurrency * args.chats_per_level,
+        turns=1, concurrency=concurrency, warmup=1, timeout=args.timeout, allow_cache=False,
+        stream_mode="token", run_id=f"{args.run_id}-{mode}-{concurrency}", spawn=False,
+        prompt_layout=None,
+    )
+
+
+def level_result(report: Dict) -> Dict:
+    return {
+        "succeeded": report["succeeded"],
+        "errors": report["errors"],
+        "duration_seconds": report["duration_seconds"],
+        "tokens_per_second": report["throughput"]["tokens_per_second"],
+        "ttft_seconds": report["ttft_seconds"],
+        "latency_seconds": report["latency_seconds"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare blocking and async Ollama streaming under parallel chats")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16],
+                        help="concurrent chats to measure")
+    parser.add_argument("--chats-per-level", type=int, default=4,
+                        help="chats per level, as a multiple of its concurrency")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fake-port", type=int, default=11436)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--run-id", default=str(int(time.time())))
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+    if min(args.levels) < 1 or args.chats_per_level < 1:
+        parser.error("--levels and --chats-per-level must be at least 1")
+
+    report: Dict = {
+        "config": {
+            "levels": args.levels,
+            "chats_per_level": args.chats_per_level,
+            "tokens_per_second": args.tokens_per_second,
+            "first_token_latency": args.first_token_latency,
+            "response_tokens": args.response_tokens,
+        },
+        "modes": {},
+    }
+    for mode in MODES:
+        processes = spawn(args, mode)
+        try:
+            report["modes"][mode] = {
+                concurrency: level_result(asyncio.run(run_load(load_args(args, mode, concurrency))))
+                for concurrency in args.levels
+            }
+        finally:
+            stop_servers(processes)
+
+    failures = []
+    report["speedup"] = {}
+    for concurrency in args.levels:
+        blocking = report["modes"]["blocking"][concurrency]
+        fast = report["modes"]["async"][concurrency]
+        for mode, result in (("blocking", blocking), ("async", fast)):
+            if result["errors"]:
+                failures.append(f"{mode} at concurrency {concurrency} had errors {result['errors']}")
+        if not blocking["tokens_per_second"] or not fast["ttft_seconds"].get("p99"):
+            continue
+        report["speedup"][concurrency] = {
+            "tokens_per_second": round(fast["tokens_per_second"] / blocking["tokens_per_second"], 2),
+            "ttft_p99": round(blocking["ttft_seconds"]["p99"] / fast["ttft_seconds"]["p99"], 2),
+        }
+        if concurrency > 1:
+            if fast["tokens_per_second"] <= blocking["tokens_per_second"]:
+                failures.append(f"async tokens/sec not above blocking at concurrency {concurrency}")
+            if fast["ttft_seconds"]["p99"] >= blocking["ttft_seconds"]["p99"]:
+                failures.append(f"async p99 TTFT not below blocking at concurrency {concurrency}")
+    report["failures"] = failures
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if failures:
+        sys.exit("FAILED: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# context_builder.py
+# Token-budgeted prompt assembly with a rolling summary of older turns
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Rough BPE-style estimate: words are split into pieces of up to 4 characters
+# and every punctuation mark counts as its own token. It tracks the Qwen
+# tokenizer closely enough for budgeting without loading it.
+_TOKEN_PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)", re.S)
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role markers / separators per chat message
+
+# "stable" keeps the prompt prefix byte-identical across turns so the model
+# server can reuse its KV cache; "sliding" re-fits the newest messages every turn
+PROMPT_LAYOUTS = ("stable", "sliding")
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of model tokens in text"""
+    return len(_TOKEN_PIECE.findall(text))
+
+
+def message_tokens(message: Dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    pieces = list(_TOKEN_PIECE.finditer(text))
+    if len(pieces) <= max_tokens:
+        return text
+    return text[:pieces[max_tokens - 1].end()].rstrip() + "..."
+
+
+def summarize_message(message: Dict, max_tokens: int = 40) -> str:
+    """One-line extractive summary of a message (its first sentence)"""
+    content = " ".join(message["content"].split())
+    match = _FIRST_SENTENCE.match(content)
+    sentence = match.group(1) if match else content
+    speaker = "User" if message["role"] == "user" else "Advisor"
+    return f"- {speaker}: {_truncate_tokens(sentence, max_tokens)}"
+
+
+class RollingSummary:
+    """Summary lines for the first `covered` messages of a conversation"""
+
+    __slots__ = ("covered", "lines", "tokens", "prefix_tokens")
+
+    def __init__(self):
+        self.covered = 0
+        self.lines: List[str] = []
+        self.tokens = 0
+        # Size of the system + profile messages at the last stable build
+        self.prefix_tokens = 0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+def _summary_message(summary: RollingSummary) -> Optional[Dict]:
+    if not summary.lines:
+        return None
+    return {"role": "system", "content": "Summary of the earlier conversation:\n" + summary.text}
+
+
+class ContextBuilder:
+    """
+    Fits conversation history into a prompt token budget
+
+    With the "sliding" layout the newest messages are kept verbatim for as
+    long as they fit in budget_tokens (after the system prompt). When older
+    messages are left out, a rolling summary of them is included instead.
+    Summaries are extended incrementally by update_summary(), which api.py
+    runs in the background after each answer so it never sits on the
+    request path.
+
+    The "stable" layout orders the prompt from most to least shared: the
+    system prompt (identical for every user), the profile (fixed for the
+    session), the summary, then the history. History only grows at the end.
+    Once less than reserve_tokens of the budget is left for the next
+    question, compact() (also run in the background after each answer)
+    folds the oldest messages into the summary at once, down to compact_to
+    of the room for history, so the prefix changes once per compaction
+    instead of on every turn. The summary's covered count doubles as the
+    index of the first verbatim message (see window_start()). If a build
+    still overflows before the next compaction (e.g. one very long
+    question), it leaves the oldest messages out of that prompt without
+    summarizing them.
+    """
+
+    def __init__(self, budget_tokens: int = 2048, max_history_messages: int = 50,
+                 keep_recent: int = 4, summary_budget_tokens: int = 300,
+                 layout: str = "stable", compact_to: float = 0.5,
+                 reserve_tokens: int = 256):
+        if layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Unknown prompt layout: {layout}")
+        self.budget_tokens = budget_tokens
+        self.max_history_messages = max_history_messages
+        self.keep_recent = keep_recent
+        self.summary_budget_tokens = summary_budget_tokens
+        self.layout = layout
+        self.compact_to = compact_to
+        self.reserve_tokens = reserve_tokens
+        self._summaries: Dict[str, RollingSummary] = {}
+
+        # Prompt size metrics
+        self.requests = 0
+        self.prompt_tokens_total = 0
+        self.prompt_tokens_max = 0
+        self.prompt_tokens_last = 0
+        self.messages_dropped_total = 0
+        self.compactions = 0
+        self.overflow_builds = 0
+
+    def window_start(self, chat_id: str) -> int:
+        """Index of the first message a stable-layout build() needs in history"""
+        summary = self._summaries.get(chat_id)
+        return summary.covered if summary else 0
+
+    def build(self, chat_id: str, system_prompt: str, history: List[Dict],
+              profile_prompt: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """
+        Assemble chat messages for the model
+
+        history is the newest max_history_messages messages for the sliding
+        layout, and every message from window_start() on for the stable one.
+        Returns (messages, estimated_prompt_tokens). The last history entry
+        (the current user message) is always included.
+        """
+        if self.layout == "stable":
+            return self._build_stable(chat_id, system_prompt, profile_prompt, history)
+        if profile_prompt:
+            system_prompt += profile_prompt
+        used = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        summary = self._summaries.get(chat_id)
+        summary_message = _summary_message(summary) if summary else None
+
+        included: List[Dict] = []
+        remaining = self.budget_tokens - used
+        for idx, msg in enumerate(reversed(history)):
+            cost = message_tokens(msg)
+            if idx > 0 and cost > remaining:
+                break
+            included.append(msg)
+            remaining -= cost
+        included.reverse()
+
+        dropped = len(history) - len(included)
+        truncated = dropped or len(history) >= self.max_history_messages
+        messages = [{"role": "system", "content": system_prompt}]
+        if truncated and summary_message:
+            messages.append(summary_message)
+            remaining -= message_tokens(summary_message)
+        messages.extend({"role": msg["role"], "content": msg["content"]} for msg in included)
+
+        prompt_tokens = self.budget_tokens - remaining
+        self._record(prompt_tokens, dropped)
+        return messages, prompt_tokens
+
+    def _build_stable(self, chat_id: str, system_prompt: str, profile_prompt: Optional[str],
+                      history: List[Dict]) -> Tuple[List[Dict], int]:
+        summary = self._summaries.setdefault(chat_id, RollingSummary())
+        prefix = [{"role": "system", "content": system_prompt}]
+        if profile_prompt:
+            prefix.append({"role": "system", "content": profile_prompt})
+        fixed = sum(message_tokens(msg) for msg in prefix)
+        summary.prefix_tokens = fixed
+        costs = [message_tokens(msg) for msg in history]
+        verbatim = sum(costs)
+
+        summary_message = _summary_message(summary)
+        summary_cost = message_tokens(summary_message) if summary_message else 0
+        # Compaction runs after answers (see compact()); a prompt that still
+        # overflows leaves out its oldest messages without summarizing them
+        skip = 0
+        while (skip < len(history) - 1
+               and (fixed + summary_cost + verbatim > self.budget_tokens
+                    or len(history) - skip > self.max_history_messages)):
+            verbatim -= costs[skip]
+            skip += 1
+        if skip:
+            self.overflow_builds += 1
+
+        messages = list(prefix)
+        if summary_message:
+            messages.append(summary_message)
+        messages.extend({"role": msg["role"], "content": msg["content"]} for msg in history[skip:])
+        prompt_tokens = fixed + summary_cost + verbatim
+        self._record(prompt_tokens, 0)
+        return messages, prompt_tokens
+
+    def compact(self, chat_id: str, history: List[Dict]) -> int:
+        """
+        Fold the oldest stable-layout messages into the summary if needed
+
+        history is every message from window_start() on, as for build().
+        Nothing happens while the next question still has reserve_tokens of
+        room; otherwise the oldest messages are summarized until the rest
+        fits in compact_to of the room left next to the prefix and a full
+        summary, so the following turns have space to append. Returns the
+        number of messages folded.
+        """
+        summary = self._summaries.get(chat_id)
+        if summary is None or not history:
+            return 0
+        fixed = summary.prefix_tokens
+        costs = [message_tokens(msg) for msg in history]
+        verbatim = sum(costs)
+        summary_message = _summary_message(summary)
+        summary_cost = message_tokens(summary_message) if summary_message else 0
+        if (fixed + summary_cost + verbatim <= self.budget_tokens - self.reserve_tokens
+                and len(history) < self.max_history_messages):
+            return 0
+
+        target = self.compact_to * (self.budget_tokens - fixed - self.summary_budget_tokens
+                                    - MESSAGE_OVERHEAD_TOKENS)
+        max_messages = max(1, int(self.max_history_messages * self.compact_to))
+        drop = 0
+        while drop < len(history) - 1 and (verbatim > target or len(history) - drop > max_messages):
+            verbatim -= costs[drop]
+            drop += 1
+        self._extend_summary(summary, history[:drop])
+        self.compactions += 1
+        self.messages_dropped_total += drop
+        return drop
+
+    def update_summary(self, chat_id: str, history: List[Dict]) -> None:
+        """
+        Extend the chat's summary to cover all but the last keep_recent messages
+
+        history must be the full conversation. Only messages not yet covered
+        are summarized, so each call does work proportional to the new turns.
+        The stable layout summarizes in compact() instead, so this is a no-op
+        there.
+        """
+        if self.layout == "stable":
+            return
+        summary = self._summaries.setdefault(chat_id, RollingSummary())
+        target = len(history) - self.keep_recent
+        if target <= summary.covered:
+            return
+        self._extend_summary(summary, history[summary.covered:target])
+
+    def _extend_summary(self, summary: RollingSummary, messages: List[Dict]) -> None:
+        for msg in messages:
+            line = summarize_message(msg)
+            summary.lines.append(line)
+            summary.tokens += count_tokens(line)
+        summary.covered += len(messages)
+        # Oldest summary lines go first once the summary outgrows its budget
+        while summary.tokens > self.summary_budget_tokens and len(summary.lines) > 1:
+            summary.tokens -= count_tokens(summary.lines.pop(0))
+
+    def get_summary(self, chat_id: str) -> Optional[str]:
+        summary = self._summaries.get(chat_id)
+        return summary.text if summary else None
+
+    def forget(self, chat_id: str) -> None:
+        self._summaries.pop(chat_id, None)
+
+    def _record(self, prompt_tokens: int, dropped: int) -> None:
+        self.requests += 1
+        self.prompt_tokens_total += prompt_tokens
+        self.prompt_tokens_last = prompt_tokens
+        self.prompt_tokens_max = max(self.prompt_tokens_max, prompt_tokens)
+        self.messages_dropped_total += dropped
+
+    def stats(self) -> Dict:
+        return {
+            "layout": self.layout,
+            "budget_tokens": self.budget_tokens,
+            "requests": self.requests,
+            "prompt_tokens_avg": round(self.prompt_tokens_total / self.requests, 1) if self.requests else 0.0,
+            "prompt_tokens_max": self.prompt_tokens_max,
+            "prompt_tokens_last": self.prompt_tokens_last,
+            "messages_dropped_total": self.messages_dropped_total,
+            "compactions": self.compactions,
+            "overflow_builds": self.overflow_builds,
+            "summaries": len(self._summaries),
+        }
@@ -0,0 +1,168 @@
+# disconnect_benchmark.py
+# How soon the Ollama stream closes after a chat client disconnects or cancels
+#
+# python disconnect_benchmark.py --trials 20 --max-seconds 1.0
+#
+# Runs fake_ollama's HTTP server and the API in this process, the API talking
+# to the fake server over HTTP like it would to Ollama. Each trial starts a
+# long generation, waits for the first SSE event, then either drops the
+# connection or calls POST /chats/{chat_id}/cancel, and times how long the
+# fake server keeps sending the upstream stream. It also checks that the
+# partial answer was stored with the "interrupted" marker. The script exits
+# non-zero if any stream outlives --max-seconds or any partial answer is
+# missing, so it can gate a change.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from fake_ollama import FakeOllamaConfig, create_app
+from finance_utils import FinanceQueryValidator
+from loadtest import summarize
+
+
+async def serve(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.get_running_loop().create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def first_event(lines) -> None:
+    """Read SSE lines until the first data line"""
+    async for line in lines:
+        if line.startswith("data:"):
+            return
+
+
+async def wait_for_close(fake_app, closed_before: int, timeout: float) -> Optional[float]:
+    """perf_counter() time the upstream stream ended, or None after timeout"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if len(fake_app.state.closed_streams) > closed_before:
+            return fake_app.state.closed_streams[closed_before]
+        await asyncio.sleep(0.001)
+    return None
+
+
+async def trial(client: httpx.AsyncClient, fake_app, mode: str, text: str, timeout: float) -> Dict:
+    chat_id = (await client.post("/chats")).json()["id"]
+    closed_before = len(fake_app.state.closed_streams)
+    async with client.stream("POST", f"/chats/{chat_id}",
+                             json={"message": text, "stream_mode": "token"}) as response:
+        lines = response.aiter_lines()
+        await first_event(lines)
+        if mode == "cancel":
+            stopped_at = time.perf_counter()
+            await client.post(f"/chats/{chat_id}/cancel")
+            async for _ in lines:
+                pass
+        else:
+            # Leaving the block closes the connection mid-stream
+            stopped_at = time.perf_counter()
+    closed_at = await wait_for_close(fake_app, closed_before, timeout)
+    # The partial answer is stored once the API has noticed the disconnect
+    interrupted = False
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline and not interrupted:
+        history = (await client.get(f"/chats/{chat_id}/history")).json()["history"]
+        interrupted = bool(history) and history[-1].get("interrupted", False)
+        if not interrupted:
+            await asyncio.sleep(0.01)
+    return {
+        "close_seconds": None if closed_at is None else max(0.0, closed_at - stopped_at),
+        "interrupted_stored": interrupted,
+    }
+
+
+async def run(args) -> Dict:
+    config = FakeOllamaConfig(tokens_per_second=args.tokens_per_second,
+                              first_token_latency=0.05, response_tokens=args.response_tokens)
+    fake_app = create_app(config)
+    fake_server, fake_task = await serve(fake_app, args.fake_port)
+
+    os.environ.update(OLLAMA_HOST=f"http://127.0.0.1:{args.fake_port}", WARM_ANSWERS_INTERVAL="-1",
+                      WARM_ANSWERS_PATH="", RATE_LIMIT_ENABLED="0")
+    import api
+    api_server, api_task = await serve(api.app, args.port)
+
+    query = FinanceQueryValidator.get_sample_queries()[0]
+    results: Dict[str, List[Dict]] = {"disconnect": [], "cancel": []}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout) as client:
+            while not (await client.get("/health")).json().get("ready"):
+                await asyncio.sleep(0.05)
+            for i in range(args.trials):
+                for mode, trials in results.items():
+                    # Unique text so neither the response cache nor coalescing applies
+                    text = f"{query} (disconnect test {mode} {i})"
+                    trials.append(await trial(client, fake_app, mode, text, args.timeout))
+    finally:
+        api_server.should_exit = True
+        fake_server.should_exit = True
+        await asyncio.gather(api_task, fake_task)
+
+    report = {
+        "config": {"trials": args.trials, "tokens_per_second": args.tokens_per_second,
+                   "response_tokens": args.response_tokens,
+                   "full_generation_seconds": round(args.response_tokens / args.tokens_per_second, 1),
+                   "max_seconds": args.max_seconds},
+    }
+    failures = []
+    for mode, trials in results.items():
+        closes = [t["close_seconds"] for t in trials if t["close_seconds"] is not None]
+        stored = sum(t["interrupted_stored"] for t in trials)
+        report[mode] = {
+            "upstream_close_seconds": summarize(closes),
+            "not_closed": len(trials) - len(closes),
+            "interrupted_stored": stored,
+        }
+        if len(closes) < len(trials):
+            failures.append(f"{mode}: {len(trials) - len(closes)} upstream streams never closed")
+        slow = sum(1 for seconds in closes if seconds > args.max_seconds)
+        if slow:
+            failures.append(f"{mode}: {slow} upstream streams closed after more than {args.max_seconds}s")
+        if stored < len(trials):
+            failures.append(f"{mode}: {len(trials) - stored} partial answers not stored as interrupted")
+    report["failures"] = failures
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time upstream cancellation after a client disconnects")
+    parser.add_argument("--trials", type=int, default=20, help="trials per mode")
+    parser.add_argument("--tokens-per-second", type=float, default=20.0)
+    parser.add_argument("--response-tokens", type=int, default=400,
+                        help="length of an uncancelled generation")
+    parser.add_argument("--max-seconds", type=float, default=1.0,
+                        help="bound on disconnect -> upstream close")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--fake-port", type=int, default=11436)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if report["failures"]:
+        sys.exit("FAILED: " + "; ".join(report["failures"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# fake_ollama.py
+# Deterministic stand-in for Ollama: an in-process client and a local HTTP server
+#
+# In-process:  api.ollama_client = OllamaPool.from_clients([FakeOllamaClient(FakeOllamaConfig(tokens_per_second=50))])
+#              (before the app starts; the pool's health probes and shutdown call ps() and close())
+# HTTP server: python fake_ollama.py --port 11435 --tokens-per-second 40 --error-rate 0.01
+#              (--prompt-tokens-per-second 400 adds prefill time for prompt text
+#              not shared with a cached earlier prompt)
+#              OLLAMA_HOST=http://127.0.0.1:11435 python api.py
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+import ollama
+
+VOCABULARY = (
+    "Based", " on", " your", " risk", " profile", ",", " a", " balanced", " mix", " of",
+    " equity", " mutual", " funds", " and", " debt", " instruments", " works", " well", ".",
+    " Consider", " a", " monthly", " SIP", " in", " index", " funds", " for", " long", "-term",
+    " wealth", " creation", " while", " keeping", " an", " emergency", " fund", " in", " liquid",
+    " assets", ".", " Review", " the", " allocation", " every", " year", ".",
+)
+
+
+class FakeOllamaConfig(NamedTuple):
+    """How the fake model behaves (all timings in seconds)"""
+    model: str = "qwen2.5:7b"
+    tokens_per_second: float = 40.0
+    first_token_latency: float = 0.2    # prompt processing before the first token
+    response_tokens: int = 120          # capped by options.num_predict
+    error_rate: float = 0.0             # share of requests failing before any token
+    seed: int = 0
+    prompt_tokens_per_second: float = 0.0  # prefill speed for uncached prompt tokens (0 = free)
+    cache_slots: int = 4                # prompts whose KV cache is kept for prefix reuse
+
+
+def plan_response(config: FakeOllamaConfig, messages: List[Dict],
+                  options: Optional[Dict] = None) -> Tuple[bool, List[str]]:
+    """
+    Decide whether a request fails and which tokens it produces
+
+    The decision is a pure function of the seed and the request, so repeated
+    load-test runs see the same failures and lengths whatever the arrival order.
+    """
+    digest = hashlib.sha256(
+        json.dumps([config.seed, messages], sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).digest()
+    rng = random.Random(digest)
+    if rng.random() < config.error_rate:
+        return True, []
+    count = config.response_tokens
+    if options and options.get("num_predict"):
+        count = min(count, int(options["num_predict"]))
+    start = rng.randrange(len(VOCABULARY))
+    return False, [VOCABULARY[(start + i) % len(VOCABULARY)] for i in range(count)]
+
+
+def render_prompt(messages: List[Dict]) -> str:
+    """The prompt text a ChatML model would see (prefix-cache comparisons only)"""
+    return "".join(f"<|im_start|>{m.get('role', '')}\n{m.get('content', '')}<|im_end|>\n"
+                   for m in messages)
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+class PrefixCache:
+    """
+    The server's KV cache slots, reduced to the prompts they hold
+
+    Like llama.cpp, a request takes the slot sharing the longest prefix with
+    its prompt, provided that prefix is at least half of what the slot holds;
+    otherwise it takes the least recently used slot rather than evicting
+    another conversation. Only the part of the prompt not in the slot has to
+    be prefilled. The slot then holds the prompt followed by the generated
+    answer, so a follow-up turn that appends to the conversation finds both
+    cached.
+    """
+
+    def __init__(self, slots: int, min_similarity: float = 0.5):
+        self.slots = slots
+        self.min_similarity = min_similarity
+        self._prompts: List[str] = []  # least recently used first
+
+    def admit(self, prompt: str, completion: str = "") -> int:
+        """Store prompt + completion and return how many prompt characters were cached"""
+        best, reused = None, 0
+        for i, cached in enumerate(self._prompts):
+            length = common_prefix_length(cached, prompt)
+            if length > reused and length >= self.min_similarity * len(cached):
+                best, reused = i, length
+        if best is None and len(self._prompts) >= self.slots and self._prompts:
+            best = 0
+            reused = common_prefix_length(self._prompts[0], prompt)
+        if best is not None:
+            self._prompts.pop(best)
+        if self.slots:
+            self._prompts.append(prompt + completion)
+        return reused
+
+
+def prefill_seconds(config: FakeOllamaConfig, cache: PrefixCache, messages: List[Dict],
+                    tokens: List[str]) -> Tuple[float, int]:
+    """(time to process the uncached part of the prompt, its token count)"""
+    prompt = render_prompt(messages)
+    completion = render_prompt([{"role": "assistant", "content": "".join(tokens)}])
+    uncached_tokens = (len(prompt) - cache.admit(prompt, completion)) // 4
+    if config.prompt_tokens_per_second <= 0:
+        return 0.0, uncached_tokens
+    return uncached_tokens / config.prompt_tokens_per_second, uncached_tokens
+
+
+async def generate_chunks(config: FakeOllamaConfig, messages: List[Dict], tokens: List[str],
+                          model: Optional[str] = None,
+                          prefill: Tuple[float, int] = (0.0, 0)) -> AsyncIterator[Dict]:
+    """Yield Ollama /api/chat stream chunks paced by the configured rates"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    prefill_time, prompt_tokens = prefill
+    first_token_latency = config.first_token_latency + prefill_time
+    first_due = started + first_token_latency
+    interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+    for i, token in enumerate(tokens):
+        # Absolute schedule so sleep overshoot doesn't accumulate
+        delay = first_due + i * interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield {
+            "model": model or config.model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": token},
+            "done": False,
+        }
+    elapsed_ns = int((loop.time() - started) * 1e9)
+    yield {
+        "model": model or config.model,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "message": {"role": "assistant", "content": ""},
+        "done": True,
+        "done_reason": "stop",
+        "total_duration": elapsed_ns,
+        "load_duration": 0,
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int(first_token_latency * 1e9),
+        "eval_count": len(tokens),
+        "eval_duration": max(0, elapsed_ns - int(first_token_latency * 1e9)),
+    }
+
+
+class FakeOllamaClient:
+    """Drop-in for the ollama.AsyncClient methods OllamaPool uses, never leaving the process"""
+
+    def __init__(self, config: FakeOllamaConfig = FakeOllamaConfig()):
+        self.config = config
+        self.requests = 0
+        self.cache = PrefixCache(config.cache_slots)
+
+    async def chat(self, model: str = "", messages: Optional[List[Dict]] = None,
+                   stream: bool = False, options: Optional[Dict] = None, **kwargs):
+        self.requests += 1
+        messages = list(messages or [])
+        failed, tokens = plan_response(self.config, messages, options)
+        if failed:
+            raise ollama.ResponseError("fake ollama: simulated failure", 500)
+        prefill = prefill_seconds(self.config, self.cache, messages, tokens)
+        chunks = generate_chunks(self.config, messages, tokens, model, prefill)
+        if stream:
+            return chunks
+        content = []
+        async for chunk in chunks:
+            content.append(chunk["message"]["content"])
+        chunk["message"]["content"] = "".join(content)
+        return chunk
+
+    async def ps(self) -> Dict:
+        return {"models": []}
+
+    async def close(self) -> None:
+        pass
+
+
+def create_app(config: FakeOllamaConfig):
+    """
+    Starlette app speaking the subset of the Ollama HTTP API the backend uses
+
+    app.state.open_streams counts /api/chat streams still being sent and
+    app.state.closed_streams holds the perf_counter() time each one ended,
+    so a test can check how soon the backend hangs up.
+    """
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    cache = PrefixCache(config.cache_slots)
+
+    async def chat(request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        failed, tokens = plan_response(config, messages, body.get("options"))
+        if failed:
+            return JSONResponse({"error": "fake ollama: simulated failure"}, status_code=500)
+        prefill = prefill_seconds(config, cache, messages, tokens)
+        chunks = generate_chunks(config, messages, tokens, body.get("model"), prefill)
+        if body.get("stream", True):
+            async def ndjson():
+                app.state.open_streams += 1
+                try:
+                    async for chunk in chunks:
+                        yield json.dumps(chunk) + "\n"
+                finally:
+                    app.state.open_streams -= 1
+                    app.state.closed_streams.append(time.perf_counter())
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+        content = []
+        async for chunk in chunks:
+            content.append(chunk["message"]["content"])
+        chunk["message"]["content"] = "".join(content)
+        return JSONResponse(chunk)
+
+    async def tags(request):
+        return JSONResponse({"models": [{"name": config.model, "model": config.model}]})
+
+    async def version(request):
+        return JSONResponse({"version": "0.0.0-fake"})
+
+    async def ps(request):
+        return JSONResponse({"models": []})
+
+    app = Starlette(routes=[
+        Route("/api/chat", chat, methods=["POST"]),
+        Route("/api/tags", tags, methods=["GET"]),
+        Route("/api/version", version, methods=["GET"]),
+        Route("/api/ps", ps, methods=["GET"]),
+    ])
+    app.state.open_streams = 0
+    app.state.closed_streams = []
+    return app
+
+
+def main():
+    defaults = FakeOllamaConfig()
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default=defaults.model)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--first-token-latency", type=float, default=defaults.first_token_latency)
+    parser.add_argument("--response-tokens", type=int, default=defaults.response_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--prompt-tokens-per-second", type=float,
+                        default=defaults.prompt_tokens_per_second)
+    parser.add_argument("--cache-slots", type=int, default=defaults.cache_slots)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = FakeOllamaConfig(
+        model=args.model,
+        tokens_per_second=args.tokens_per_second,
+        first_token_latency=args.first_token_latency,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        cache_slots=args.cache_slots,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# fast_responses.py
+# orjson-backed JSON responses and pre-serialized, ETag-cached static bodies
+
+import hashlib
+from typing import Any
+
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (used as the app-wide default)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class StaticJSON:
+    """
+    A JSON body serialized once and served as raw bytes
+
+    The strong ETag is a hash of the body, so it only changes when the
+    content does (i.e. between deploys). Requests carrying a matching
+    If-None-Match get an empty 304.
+    """
+
+    def __init__(self, content: Any, max_age: int = 3600):
+        self.body = dumps(content)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.headers = {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={max_age}",
+        }
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison for If-None-Match (RFC 9110 13.1.2)
+        candidates = (tag.strip() for tag in if_none_match.split(","))
+        return any(tag.removeprefix("W/") == self.etag for tag in candidates)
+
+    def response(self, request: Request) -> Response:
+        if self.matches(request.headers.get("if-none-match", "")):
+            return Response(status_code=304, headers=self.headers)
+        return Response(content=self.body, media_type="application/json", headers=self.headers)
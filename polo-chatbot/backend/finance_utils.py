@@ -1,8 +1,131 @@
 # finance_utils.py
 # Finance Query Detection and Validation Utility
 
+import os
 import re
-from typing import Dict, List, Tuple
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from query_classifier import HashedNgramClassifier, load_samples, train_query_classifier
+
+
+class KeywordMatch(NamedTuple):
+    """A single keyword hit inside a query"""
+    term: str
+    category: str
+    start: int
+    end: int
+    rank: int  # insertion order, used to keep "first keyword wins" precedence
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton matching every registered term in one pass
+
+    Terms are added once, compiled with build(), and then find_all() walks
+    the query a single time regardless of how many terms are registered.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str, str, bool]]] = [[]]
+        self._size = 0
+        self._built = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, term: str, category: str, whole_word: bool = False) -> None:
+        """Register a term under a category (must be called before build)"""
+        if self._built:
+            raise RuntimeError("KeywordMatcher is already built")
+        term = term.lower()
+        if not term:
+            return
+        node = 0
+        for char in term:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((self._size, term, category, whole_word))
+        self._size += 1
+
+    def add_all(self, terms: Iterable[str], category: str, whole_word: bool = False) -> None:
+        for term in terms:
+            self.add(term, category, whole_word)
+
+    def build(self) -> "KeywordMatcher":
+        """Compute failure links (breadth-first) and merge suffix outputs"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+        self._built = True
+        return self
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """
+        Return every term occurrence in text (case-insensitive)
+
+        Matches are reported in order of their end offset.
+        """
+        if not self._built:
+            self.build()
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        node = 0
+        for pos, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                end = pos + 1
+                for rank, term, category, whole_word in out[node]:
+                    start = end - len(term)
+                    if whole_word and not _on_word_boundary(text, start, end):
+                        continue
+                    matches.append(KeywordMatch(term, category, start, end, rank))
+        return matches
+
+
+def _on_word_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
+
+
+def build_keyword_matcher(categories: Dict[str, List[str]],
+                          rejected: Iterable[str] = (),
+                          reject_category: str = "non_finance",
+                          whole_words: Iterable[str] = ()) -> KeywordMatcher:
+    """
+    Compile category keyword tables (and reject indicators) into one matcher
+
+    Terms listed in whole_words only match as whole words, so short ones
+    like "emi" don't fire inside "premium".
+    """
+    whole_words = {term.lower() for term in whole_words}
+    matcher = KeywordMatcher()
+    for term in rejected:
+        matcher.add(term, reject_category, term.lower() in whole_words)
+    for category, keywords in categories.items():
+        for term in keywords:
+            matcher.add(term, category, term.lower() in whole_words)
+    return matcher.build()
+
 
 class FinanceQueryValidator:
     """
@@ -13,13 +136,13 @@ class FinanceQueryValidator:
     FINANCE_KEYWORDS = {
         "banking": ["bank", "account", "savings", "checking", "deposit", "atm", "debit", "credit card"],
         "investments": ["stock", "share", "equity", "mutual fund", "etf", "bond", "portfolio", "invest", "dividend", "capital gains"],
-        "loans": ["loan", "mortgage", "emi", "interest rate", "principal", "borrowing", "credit", "refinance", "down payment"],
+        "loans": ["loan", "mortgage", "emi", "emis", "interest rate", "principal", "borrowing", "credit", "refinance", "down payment"],
         "insurance": ["insurance", "premium", "policy", "life insurance", "health insurance", "term insurance", "coverage"],
         "taxation": ["tax", "income tax", "gst", "tds", "itr", "deduction", "exemption", "tax saving", "capital gains tax"],
         "retirement": ["retirement", "pension", "pf", "provident fund", "epf", "nps", "retirement planning", "401k"],
         "budgeting": ["budget", "expense", "income", "savings", "financial planning", "cash flow", "spending"],
         "cryptocurrency": ["crypto", "bitcoin", "ethereum", "blockchain", "cryptocurrency", "altcoin", "wallet"],
-        "real_estate": ["property", "real estate", "home loan", "rent", "housing", "reit"],
+        "real_estate": ["property", "real estate", "home loan", "rent", "rental", "housing", "reit"],
         "market": ["market", "trading", "forex", "commodity", "gold", "silver", "nifty", "sensex", "dow jones"],
         "finance_general": ["finance", "money", "wealth", "financial", "asset", "liability", "net worth", "roi", "return on investment"]
     }
@@ -30,36 +153,87 @@ class FinanceQueryValidator:
         "celebrity", "travel", "health", "medical", "disease",
         "programming", "code", "software", "hardware", "computer"
     ]
+
+    # Short terms and abbreviations that are often parts of longer words
+    # ("emi" in "premium", "rent" in "parents", "code" in "decode"); they
+    # only match as whole words
+    WHOLE_WORD_TERMS = [
+        "atm", "etf", "emi", "emis", "gst", "tds", "itr", "pf", "epf", "nps", "401k",
+        "rent", "reit", "roi", "gold", "code",
+    ]
+
+    # Financial amounts/numbers (e.g., "₹10000", "$500", "10 lakhs")
+    FINANCIAL_PATTERN = re.compile(
+        r'(₹|rs\.?|inr|usd|\$|€|£)\s*\d+|(\d+\s*(lakh|crore|thousand|million|billion))'
+    )
+
+    # Single-pass automaton over all indicators and keywords, built at import
+    _matcher = build_keyword_matcher(FINANCE_KEYWORDS, NON_FINANCE_INDICATORS,
+                                     whole_words=WHOLE_WORD_TERMS)
+
+    # Labelled queries the second-stage classifier learns from, besides the tables above
+    SAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_samples.tsv")
+
+    # Second opinion on queries the keyword pass cannot settle (~30 ms to train at import)
+    classifier: HashedNgramClassifier = train_query_classifier(
+        FINANCE_KEYWORDS, NON_FINANCE_INDICATORS, load_samples(SAMPLES_PATH)
+    )
+
+    @classmethod
+    def find_keywords(cls, query: str) -> List[KeywordMatch]:
+        """Return every indicator/keyword match in the query with its offsets"""
+        return cls._matcher.find_all(query)
+
+    @classmethod
+    def match_categories(cls, query: str) -> Dict[str, List[Tuple[int, int]]]:
+        """Map each matched category to the (start, end) offsets of its hits"""
+        categories: Dict[str, List[Tuple[int, int]]] = {}
+        for match in cls.find_keywords(query):
+            categories.setdefault(match.category, []).append((match.start, match.end))
+        return categories
     
     @classmethod
-    def is_finance_query(cls, query: str) -> Tuple[bool, str]:
+    def is_finance_query(cls, query: str, use_classifier: bool = True) -> Tuple[bool, str]:
         """
         Check if query is finance-related
         
+        The keyword pass decides clear cases. Queries it cannot place
+        ("unknown") and queries mixing finance keywords with non-finance
+        indicators ("health insurance premium") go to the classifier, unless
+        use_classifier is False.
+        
         Args:
             query: User input string
+            use_classifier: Ask the second-stage classifier on ambiguous queries
             
         Returns:
             Tuple of (is_finance: bool, category: str)
         """
         query_lower = query.lower()
+        has_amount = cls.FINANCIAL_PATTERN.search(query_lower) is not None
         
-        # Check for non-finance indicators first
-        for indicator in cls.NON_FINANCE_INDICATORS:
-            if indicator in query_lower:
-                return False, "non_finance"
-        
-        # Check for finance keywords
-        for category, keywords in cls.FINANCE_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in query_lower:
-                    return True, category
+        # Non-finance indicators are registered first, so the lowest-ranked
+        # match reproduces the old "indicators first, then keywords in
+        # table order" precedence from a single scan
+        matches = cls._matcher.find_all(query_lower)
+        if matches:
+            first = min(matches, key=lambda match: match.rank)
+            if first.category != "non_finance":
+                return True, first.category
+            finance = [match for match in matches if match.category != "non_finance"]
+            if use_classifier and (finance or has_amount):
+                if cls.classifier.predict(query_lower)[0]:
+                    if finance:
+                        return True, min(finance, key=lambda match: match.rank).category
+                    return True, "financial_calculation"
+            return False, "non_finance"
         
         # Check for financial amounts/numbers (e.g., "₹10000", "$500", "10 lakhs")
-        financial_pattern = r'(₹|rs\.?|inr|usd|\$|€|£)\s*\d+|(\d+\s*(lakh|crore|thousand|million|billion))'
-        if re.search(financial_pattern, query_lower):
+        if has_amount:
             return True, "financial_calculation"
         
+        if use_classifier and cls.classifier.predict(query_lower)[0]:
+            return True, "finance_general"
         return False, "unknown"
     
     @classmethod
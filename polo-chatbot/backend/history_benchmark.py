@@ -0,0 +1,103 @@
+# history_benchmark.py
+# Memory of in-memory chat history: plain dicts per message vs. MessageRecords
+#
+# python history_benchmark.py --sessions 10000 --messages 200
+#
+# Message texts come from a shared pool, so both layouts reference the same
+# string objects and the report isolates the per-message storage overhead.
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+import uuid
+from typing import Callable, Dict, List
+
+from session_store import InMemorySessionStore
+
+CATEGORIES = ("investments", "loans", "taxation", "budgeting", None)
+
+
+def message_pool(size: int, chars: int) -> List[str]:
+    return [(f"message {i} " * chars)[:chars] for i in range(size)]
+
+
+def build_dicts(chat_ids: List[str], messages: int, pool: List[str]) -> Dict[str, List[Dict]]:
+    """The previous layout: a list of dicts per session"""
+    store: Dict[str, List[Dict]] = {}
+    for n, chat_id in enumerate(chat_ids):
+        history = store[chat_id] = []
+        for i in range(messages):
+            message = {"role": "user" if i % 2 == 0 else "assistant",
+                       "content": pool[(n + i) % len(pool)]}
+            category = CATEGORIES[i % len(CATEGORIES)]
+            if category is not None:
+                message["category"] = category
+            history.append(message)
+    return store
+
+
+def build_records(chat_ids: List[str], messages: int, pool: List[str]) -> InMemorySessionStore:
+    store = InMemorySessionStore()
+    for n, chat_id in enumerate(chat_ids):
+        store.create(chat_id)
+        for i in range(messages):
+            message = {"role": "user" if i % 2 == 0 else "assistant",
+                       "content": pool[(n + i) % len(pool)]}
+            category = CATEGORIES[i % len(CATEGORIES)]
+            if category is not None:
+                message["category"] = category
+            store.append_message(chat_id, message)
+    return store
+
+
+def measure(build: Callable, chat_ids: List[str], messages: int, pool: List[str]) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    store = build(chat_ids, messages, pool)
+    elapsed = time.perf_counter() - started
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del store
+    gc.collect()
+    total = len(chat_ids) * messages
+    return {
+        "bytes": used,
+        "megabytes": round(used / 2 ** 20, 1),
+        "bytes_per_message": round(used / total, 1),
+        "build_seconds": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chat history memory layouts")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=200, help="messages per session")
+    parser.add_argument("--pool", type=int, default=1000, help="distinct message texts")
+    parser.add_argument("--chars", type=int, default=400, help="characters per message text")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    pool = message_pool(args.pool, args.chars)
+    chat_ids = [str(uuid.uuid4()) for _ in range(args.sessions)]
+    dicts = measure(build_dicts, chat_ids, args.messages, pool)
+    records = measure(build_records, chat_ids, args.messages, pool)
+    report = {
+        "config": {"sessions": args.sessions, "messages": args.messages,
+                   "pool": args.pool, "chars": args.chars},
+        "dict_of_lists": dicts,
+        "message_records": records,
+        "saved_ratio": round(1 - records["bytes"] / dicts["bytes"], 3),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
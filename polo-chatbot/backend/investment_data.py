@@ -384,3 +384,117 @@ def get_investment_recommendations(capital, monthly_sip, risk_appetite, preferen
             }
     
     return recommendations
+
+
+# Which catalog sections back each asset class of RISK_ALLOCATIONS, per risk level
+ASSET_CLASS_SOURCES = {
+    "equity_mutual_funds": {
+        "low": [("mutual_funds", "index"), ("mutual_funds", "large_cap")],
+        "medium": [("mutual_funds", "large_cap"), ("mutual_funds", "index"), ("mutual_funds", "mid_cap")],
+        "high": [("mutual_funds", "mid_cap"), ("mutual_funds", "small_cap"), ("mutual_funds", "large_cap")],
+    },
+    "debt_mutual_funds": {
+        "default": [("mutual_funds", "debt")],
+    },
+    "hybrid_funds": {
+        "default": [("mutual_funds", "hybrid")],
+    },
+    "stocks": {
+        "low": [("stocks", "blue_chip")],
+        "medium": [("stocks", "blue_chip"), ("stocks", "growth")],
+        "high": [("stocks", "growth"), ("stocks", "blue_chip")],
+    },
+    "fixed_deposits": {
+        "default": [("debt", "fixed_deposits")],
+    },
+    "government_schemes": {
+        "default": [("debt", "government_schemes"), ("debt", "bonds")],
+    },
+}
+
+# UI preference -> asset classes it covers
+PREFERENCE_ASSET_CLASSES = {
+    "mutual_funds": ["equity_mutual_funds", "debt_mutual_funds", "hybrid_funds"],
+    "stocks": ["stocks"],
+    "bonds": ["government_schemes", "fixed_deposits"],
+    "debt_funds": ["debt_mutual_funds"],
+}
+
+PICKS_PER_ASSET_CLASS = 3
+
+
+def get_sip_guideline(monthly_sip):
+    """Return the SIP_GUIDELINES tier for a monthly SIP amount"""
+    if monthly_sip < 5000:
+        tier = "below_5000"
+    elif monthly_sip < 10000:
+        tier = "5000_to_10000"
+    elif monthly_sip <= 25000:
+        tier = "10000_to_25000"
+    else:
+        tier = "above_25000"
+    return {"tier": tier, **SIP_GUIDELINES[tier]}
+
+
+def _instrument_name(item):
+    return item.get("name") or f"{item['bank']} {item['type']}"
+
+
+def _catalog_section(source, section):
+    catalog = {"mutual_funds": MUTUAL_FUNDS, "stocks": STOCKS, "debt": DEBT_INSTRUMENTS}[source]
+    return catalog.get(section, [])
+
+
+def _picks_for(asset_class, risk):
+    sources = ASSET_CLASS_SOURCES.get(asset_class, {})
+    sections = sources.get(risk) or sources.get("default", [])
+    picks = []
+    for source, section in sections:
+        for item in _catalog_section(source, section):
+            pick = {"name": _instrument_name(item), "section": section}
+            for field in ("category", "sector", "expected_return", "interest_rate",
+                          "expense_ratio", "tenure", "min_investment"):
+                if field in item:
+                    pick[field] = item[field]
+            picks.append(pick)
+            if len(picks) == PICKS_PER_ASSET_CLASS:
+                return picks
+    return picks
+
+
+# Picks only depend on (risk, asset class), so they are computed once here
+_PICKS = {
+    risk: {
+        asset_class: _picks_for(asset_class, risk)
+        for asset_class in allocation if asset_class != "expected_return"
+    }
+    for risk, allocation in RISK_ALLOCATIONS.items()
+}
+
+
+def build_portfolio(capital, monthly_sip, risk_appetite, preferences=None):
+    """
+    Deterministic portfolio: allocation amounts, concrete picks and SIP guidance
+
+    Picks are limited to the asset classes covered by the user's preferences
+    (all allocated classes when no preference is given).
+    """
+    risk = risk_appetite.lower()
+    if risk not in RISK_ALLOCATIONS:
+        risk = "medium"
+    recommendations = get_investment_recommendations(capital, monthly_sip, risk, preferences or [])
+
+    allowed = set()
+    for preference in preferences or []:
+        allowed.update(PREFERENCE_ASSET_CLASSES.get(preference.lower(), []))
+
+    picks = {
+        asset_class: funds
+        for asset_class, funds in _PICKS[risk].items()
+        if recommendations["capital_breakdown"][asset_class]["percentage"] > 0
+        and (not allowed or asset_class in allowed)
+    }
+
+    recommendations["picks"] = picks
+    recommendations["sip_guidance"] = get_sip_guideline(monthly_sip)
+    return recommendations
@@ -0,0 +1,158 @@
+# keyword_benchmark.py
+# Keyword matching cost per query: one substring scan per term vs. the KeywordMatcher automaton
+#
+# python keyword_benchmark.py --sizes 100 1000 10000 --repeat 20
+#
+# The keyword tables are grown to each size by adding synthetic terms to the
+# real FINANCE_KEYWORDS categories (round-robin), as a multilingual table
+# would grow. Both matchers answer "first indicator or keyword in table
+# order", the verdict the keyword pass of is_finance_query() uses, and the
+# report checks they agree on every query of query_samples.tsv. Both match
+# plain substrings here, so the comparison leaves out whole-word terms.
+#
+# The script also checks FinanceQueryValidator's own matcher on queries where
+# a short term sits inside a longer word ("emi" in "premium") and exits
+# non-zero if one of them matches or a whole-word use is missed.
+
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from finance_utils import FinanceQueryValidator, build_keyword_matcher
+from loadtest import summarize
+from query_classifier import load_samples
+
+
+# (query, term that must match or None, terms that must not match)
+WHOLE_WORD_CASES = [
+    ("health insurance premium", "premium", ["emi"]),
+    ("my parents pay the current bills", None, ["rent"]),
+    ("open a current account", "account", ["rent"]),
+    ("can I decode this error", None, ["code"]),
+    ("the helpful fitness coach", None, ["pf"]),
+    ("an arbitrary number", None, ["itr"]),
+    ("dental treatment", None, ["atm"]),
+    ("android phone", None, ["roi"]),
+    ("what is my emi for a car loan", "emi", []),
+    ("two EMIs a month", "emis", []),
+    ("should I pay rent or buy", "rent", []),
+    ("file my itr before july", "itr", []),
+    ("pf withdrawal rules", "pf", []),
+    ("nearest ATM", "atm", []),
+    ("python code", "code", []),
+]
+
+
+def check_whole_words() -> List[str]:
+    """Failures of the whole-word cases, [] if they all hold"""
+    failures = []
+    for query, expected, forbidden in WHOLE_WORD_CASES:
+        terms = {match.term for match in FinanceQueryValidator.find_keywords(query)}
+        if expected is not None and expected not in terms:
+            failures.append(f"{query!r}: {expected!r} did not match")
+        for term in forbidden:
+            if term in terms:
+                failures.append(f"{query!r}: {term!r} matched inside a longer word")
+    return failures
+
+
+def grow_tables(size: int, seed: int) -> Tuple[Dict[str, List[str]], List[str]]:
+    """FINANCE_KEYWORDS and NON_FINANCE_INDICATORS padded to size terms in total"""
+    rng = random.Random(seed)
+    categories = {name: list(terms) for name, terms in FinanceQueryValidator.FINANCE_KEYWORDS.items()}
+    indicators = list(FinanceQueryValidator.NON_FINANCE_INDICATORS)
+    names = list(categories)
+    count = sum(len(terms) for terms in categories.values()) + len(indicators)
+    index = 0
+    while count < size:
+        term = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+        categories[names[index % len(names)]].append(term)
+        index += 1
+        count += 1
+    return categories, indicators
+
+
+def scan_per_term(query: str, categories: Dict[str, List[str]], indicators: List[str]) -> Optional[str]:
+    """The previous implementation: one `in` test per term, indicators first"""
+    query_lower = query.lower()
+    for indicator in indicators:
+        if indicator in query_lower:
+            return "non_finance"
+    for category, keywords in categories.items():
+        for keyword in keywords:
+            if keyword in query_lower:
+                return category
+    return None
+
+
+def time_queries(match, queries: List[str], repeat: int) -> List[float]:
+    """Per-query latency in microseconds (mean over repeat runs of each query)"""
+    timings = []
+    perf_counter = time.perf_counter
+    for query in queries:
+        started = perf_counter()
+        for _ in range(repeat):
+            match(query)
+        timings.append((perf_counter() - started) / repeat * 1e6)
+    return timings
+
+
+def run(args) -> Dict:
+    queries = [text for text, _ in load_samples(FinanceQueryValidator.SAMPLES_PATH)]
+    results = []
+    for size in args.sizes:
+        categories, indicators = grow_tables(size, args.seed)
+        started = time.perf_counter()
+        matcher = build_keyword_matcher(categories, indicators)
+        build_seconds = time.perf_counter() - started
+
+        def automaton(query: str) -> Optional[str]:
+            matches = matcher.find_all(query)
+            return min(matches, key=lambda match: match.rank).category if matches else None
+
+        def per_term(query: str) -> Optional[str]:
+            return scan_per_term(query, categories, indicators)
+
+        disagreements = sum(1 for query in queries if automaton(query) != per_term(query))
+        old = summarize(time_queries(per_term, queries, args.repeat))
+        new = summarize(time_queries(automaton, queries, args.repeat))
+        results.append({
+            "terms": len(matcher),
+            "automaton_build_seconds": round(build_seconds, 4),
+            "per_term_scan_us": old,
+            "automaton_us": new,
+            "speedup_mean": round(old["mean"] / new["mean"], 2),
+            "disagreements": disagreements,
+        })
+    return {
+        "config": {"queries": len(queries), "repeat": args.repeat, "seed": args.seed},
+        "sizes": results,
+        "failures": check_whole_words(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark keyword matching against table size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="total indicators + keywords")
+    parser.add_argument("--repeat", type=int, default=20, help="runs of each query per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if report["failures"]:
+        sys.exit("FAILED: " + "; ".join(report["failures"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# loadtest.py
+# Concurrent SSE load test for the chat API, reporting throughput and latency as JSON
+#
+# Against a running backend:  python loadtest.py --url http://127.0.0.1:8000 --chats 50
+# Self-contained (starts fake_ollama.py and the API as subprocesses):
+#                             python loadtest.py --spawn --chats 200 --concurrency 50
+# Prompt cache reuse, turn 1 vs turn N:
+#                             python loadtest.py --spawn --chats 8 --concurrency 4 --turns 20 \
+#                                 --prompt-tokens-per-second 400 --prompt-layout stable
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from context_builder import count_tokens
+from finance_utils import FinanceQueryValidator
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict:
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 6),
+        "min": round(values[0], 6),
+        "p50": round(percentile(values, 50), 6),
+        "p95": round(percentile(values, 95), 6),
+        "p99": round(percentile(values, 99), 6),
+        "max": round(values[-1], 6),
+    }
+
+
+class TurnResult:
+    """Timings of one POST /chats/{chat_id} stream"""
+
+    __slots__ = ("turn", "status", "error", "ttft", "latency", "events", "chars", "tokens")
+
+    def __init__(self, turn: int = 0):
+        self.turn = turn
+        self.status = 0
+        self.error: Optional[str] = None
+        self.ttft: Optional[float] = None
+        self.latency = 0.0
+        self.events = 0
+        self.chars = 0
+        self.tokens = 0
+
+
+async def run_turn(client: httpx.AsyncClient, chat_id: str, text: str,
+                   stream_mode: Optional[str] = None, turn: int = 0) -> TurnResult:
+    result = TurnResult(turn)
+    body = {"message": text}
+    if stream_mode:
+        body["stream_mode"] = stream_mode
+    started = time.perf_counter()
+    try:
+        async with client.stream("POST", f"/chats/{chat_id}", json=body) as response:
+            result.status = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                result.error = f"http_{response.status_code}"
+                return result
+            event = "message"
+            data = None
+            async for line in response.aiter_lines():
+                if not line:
+                    if event == "message" and data is not None:
+                        if data.startswith("Error:"):
+                            result.error = "stream_error"
+                        else:
+                            if result.ttft is None:
+                                result.ttft = time.perf_counter() - started
+                            result.events += 1
+                            result.chars += len(data)
+                            result.tokens += count_tokens(data)
+                    event = "message"
+                    data = None
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    value = line[6:] if line.startswith("data: ") else line[5:]
+                    data = value if data is None else data + "\n" + value
+    except httpx.HTTPError as e:
+        result.error = type(e).__name__
+    finally:
+        result.latency = time.perf_counter() - started
+    return result
+
+
+async def run_conversation(client: httpx.AsyncClient, index: int, args, queries: List[str],
+                           results: List[TurnResult], create_latencies: List[float]) -> None:
+    started = time.perf_counter()
+    try:
+        response = await client.post("/chats")
+    except httpx.HTTPError as e:
+        failed = TurnResult()
+        failed.error = f"create_{type(e).__name__}"
+        results.append(failed)
+        return
+    create_latencies.append(time.perf_counter() - started)
+    if response.status_code != 200:
+        failed = TurnResult()
+        failed.status = response.status_code
+        failed.error = f"create_http_{response.status_code}"
+        results.append(failed)
+        return
+    chat_id = response.json()["id"]
+    for turn in range(args.turns):
+        text = queries[(index + turn) % len(queries)]
+        if not args.allow_cache:
+            # Unique text per turn so neither the response cache nor
+            # single-flight coalescing hides the generation path
+            text = f"{text} (load test {args.run_id}-{index}-{turn})"
+        results.append(await run_turn(client, chat_id, text, args.stream_mode, turn + 1))
+
+
+async def server_cpu_seconds(client: httpx.AsyncClient) -> Optional[float]:
+    """process_cpu_seconds_total of the worker answering /metrics"""
+    try:
+        response = await client.get("/metrics")
+    except httpx.HTTPError:
+        return None
+    for line in response.text.splitlines():
+        if line.startswith("process_cpu_seconds_total "):
+            return float(line.split()[1])
+    return None
+
+
+async def run_load(args) -> Dict:
+    queries = FinanceQueryValidator.get_sample_queries()
+    results: List[TurnResult] = []
+    create_latencies: List[float] = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        # Warm-up traffic is excluded from the report
+        for i in range(args.warmup):
+            await run_conversation(client, -1 - i, args, queries, [], [])
+
+        pending = iter(range(args.chats))
+
+        async def worker():
+            for index in pending:
+                await run_conversation(client, index, args, queries, results, create_latencies)
+
+        cpu_before = await server_cpu_seconds(client)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(args.concurrency, args.chats))))
+        elapsed = time.perf_counter() - started
+        cpu_after = await server_cpu_seconds(client)
+
+    ok = [r for r in results if r.error is None]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r.error is not None:
+            errors[r.error] = errors.get(r.error, 0) + 1
+    events = sum(r.events for r in ok)
+    # Measured from the streamed text, so it reflects what the API delivered
+    # rather than the model server's configured speed
+    tokens = sum(r.tokens for r in ok)
+    server_cpu = None
+    if cpu_before is not None and cpu_after is not None:
+        server_cpu = round(cpu_after - cpu_before, 3)
+    # Median TTFT per turn number shows whether later turns reuse the
+    # model server's prompt cache or pay for the whole prompt again
+    ttft_by_turn: Dict[int, List[float]] = {}
+    for r in ok:
+        if r.ttft is not None and r.turn:
+            ttft_by_turn.setdefault(r.turn, []).append(r.ttft)
+    return {
+        "config": {
+            "url": args.url,
+            "chats": args.chats,
+            "turns": args.turns,
+            "concurrency": args.concurrency,
+            "allow_cache": args.allow_cache,
+            "stream_mode": args.stream_mode,
+            "prompt_layout": args.prompt_layout,
+            "fake_ollama": fake_config(args) if args.spawn else None,
+            "python": platform.python_version(),
+        },
+        "duration_seconds": round(elapsed, 3),
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": errors,
+        "throughput": {
+            "requests_per_second": round(len(ok) / elapsed, 3) if elapsed else None,
+            "events_per_second": round(events / elapsed, 3) if elapsed else None,
+            "tokens_per_second": round(tokens / elapsed, 3) if elapsed else None,
+        },
+        "server_cpu_seconds": server_cpu,
+        "create_chat_latency_seconds": summarize(create_latencies),
+        "ttft_seconds": summarize([r.ttft for r in ok if r.ttft is not None]),
+        "ttft_p50_by_turn_seconds": {
+            turn: round(percentile(sorted(values), 50), 6)
+            for turn, values in sorted(ttft_by_turn.items())
+        },
+        "latency_seconds": summarize([r.latency for r in ok]),
+        "events_per_response": summarize([r.events for r in ok]),
+        "tokens_per_response": summarize([r.tokens for r in ok]),
+    }
+
+
+def fake_config(args) -> Dict:
+    return {
+        "tokens_per_second": args.tokens_per_second,
+        "first_token_latency": args.first_token_latency,
+        "response_tokens": args.response_tokens,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+        "prompt_tokens_per_second": args.prompt_tokens_per_second,
+        "cache_slots": args.cache_slots,
+    }
+
+
+def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn_servers(args) -> List[subprocess.Popen]:
+    """Start fake_ollama.py and the API (pointed at it) as child processes"""
+    fake = subprocess.Popen([
+        sys.executable, "fake_ollama.py",
+        "--port", str(args.fake_port),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--first-token-latency", str(args.first_token_latency),
+        "--response-tokens", str(args.response_tokens),
+        "--error-rate", str(args.error_rate),
+        "--seed", str(args.seed),
+        "--prompt-tokens-per-second", str(args.prompt_tokens_per_second),
+        "--cache-slots", str(args.cache_slots),
+    ], cwd=BACKEND_DIR)
+    # No background warm-answer generations competing with the measured load,
+    # and no per-IP rate limits (every simulated user shares 127.0.0.1)
+    env = dict(os.environ, OLLAMA_HOST=f"http://127.0.0.1:{args.fake_port}",
+               WARM_ANSWERS_INTERVAL="-1", WARM_ANSWERS_PATH="", RATE_LIMIT_ENABLED="0")
+    if args.prompt_layout:
+        env["PROMPT_LAYOUT"] = args.prompt_layout
+    port = httpx.URL(args.url).port or 8000
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "api:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ], cwd=BACKEND_DIR, env=env)
+    processes = [fake, api]
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.fake_port}/api/version")
+        wait_until_up(f"{args.url}/health")
+    except Exception:
+        stop_servers(processes)
+        raise
+    return processes
+
+
+def stop_servers(processes: List[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the FinanceGPT chat API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--chats", type=int, default=50, help="conversations to run")
+    parser.add_argument("--turns", type=int, default=1, help="messages per conversation")
+    parser.add_argument("--concurrency", type=int, default=20, help="conversations in parallel")
+    parser.add_argument("--warmup", type=int, default=2, help="unreported conversations first")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--allow-cache", action="store_true",
+                        help="send the sample queries verbatim (measures cache hits)")
+    parser.add_argument("--stream-mode", choices=("token", "interval", "sentence"),
+                        help="SSE batching mode to request (default: server default)")
+    parser.add_argument("--run-id", default=str(int(time.time())))
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--spawn", action="store_true",
+                        help="start fake_ollama.py and the API locally for the run")
+    parser.add_argument("--fake-port", type=int, default=11435)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0,
+                        help="fake prefill speed for uncached prompt text (0 = free)")
+    parser.add_argument("--cache-slots", type=int, default=4,
+                        help="prompts the fake server keeps cached")
+    parser.add_argument("--prompt-layout", choices=("stable", "sliding"),
+                        help="PROMPT_LAYOUT for the spawned API (default: server default)")
+    args = parser.parse_args()
+
+    processes = spawn_servers(args) if args.spawn else []
+    try:
+        report = asyncio.run(run_load(args))
+    finally:
+        stop_servers(processes)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+# ollama_pool.py
+# Pool of Ollama servers with health probes, least-loaded routing and failover
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+import ollama
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+# Keep the model loaded between requests (-1 = never unload)
+DEFAULT_KEEP_ALIVE = "-1"
+
+
+def parse_keep_alive(value: str):
+    """Seconds as a number (negative = forever) or an Ollama duration such as 30m"""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class OllamaBackend:
+    """One Ollama server and its load/latency counters"""
+
+    def __init__(self, host: str, client=None):
+        self.host = host
+        self.client = client if client is not None else ollama.AsyncClient(host=host)
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.ttft_ewma: Optional[float] = None
+        self.probe_latency: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def record_ttft(self, seconds: float, weight: float = 0.2) -> None:
+        if self.ttft_ewma is None:
+            self.ttft_ewma = seconds
+        else:
+            self.ttft_ewma += weight * (seconds - self.ttft_ewma)
+
+    def mark_failed(self, error: BaseException) -> None:
+        self.failures += 1
+        self.healthy = False
+        self.last_error = f"{type(error).__name__}: {error}"
+
+    def stats(self) -> Dict:
+        return {
+            "host": self.host,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ttft_ewma_seconds": round(self.ttft_ewma, 4) if self.ttft_ewma is not None else None,
+            "probe_latency_seconds": round(self.probe_latency, 4) if self.probe_latency is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaPool:
+    """
+    Routes chat requests over several Ollama servers
+
+    Requests go to the healthy backend with the fewest outstanding requests,
+    except that a chat sticks to the backend that last served it (whose KV
+    cache still holds the conversation prefix) while that backend is healthy
+    and no more than affinity_slack requests busier than the least loaded
+    one. A backend failing before the first token is marked unhealthy and the
+    request is retried on the next candidate; once tokens have been sent,
+    errors are passed on. Background probes bring backends back.
+
+    chat() takes the same arguments as ollama.AsyncClient.chat() plus chat_id,
+    and sends keep_alive with every request unless the caller sets one.
+    """
+
+    def __init__(self, hosts: List[str], probe_interval: float = 10.0,
+                 probe_timeout: float = 2.0, affinity_slack: int = 2,
+                 max_affinity_entries: int = 10000, keep_alive=None,
+                 clients: Optional[List] = None):
+        if not hosts:
+            raise ValueError("OllamaPool needs at least one host")
+        if clients is None:
+            clients = [None] * len(hosts)
+        self.backends = [OllamaBackend(host, client) for host, client in zip(hosts, clients)]
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.affinity_slack = affinity_slack
+        self.max_affinity_entries = max_affinity_entries
+        self.keep_alive = keep_alive
+        # chat_id -> backend that served it last (LRU)
+        self._affinity: "OrderedDict[str, OllamaBackend]" = OrderedDict()
+        self._probe_task: Optional[asyncio.Task] = None
+        self.failovers = 0
+        self.affinity_hits = 0
+
+    @classmethod
+    def from_env(cls) -> "OllamaPool":
+        """OLLAMA_HOSTS=http://gpu1:11434,http://gpu2:11434 (falls back to OLLAMA_HOST)"""
+        hosts = [h.strip() for h in os.environ.get("OLLAMA_HOSTS", "").split(",") if h.strip()]
+        if not hosts:
+            hosts = [os.environ.get("OLLAMA_HOST") or DEFAULT_HOST]
+        return cls(
+            hosts,
+            probe_interval=float(os.environ.get("OLLAMA_PROBE_INTERVAL", "10")),
+            keep_alive=parse_keep_alive(os.environ.get("OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE)),
+        )
+
+    @classmethod
+    def from_clients(cls, clients: List, **kwargs) -> "OllamaPool":
+        """A pool over ready-made clients such as FakeOllamaClient, named client-0, client-1, ..."""
+        return cls([f"client-{i}" for i in range(len(clients))], clients=clients, **kwargs)
+
+    # -- routing ----------------------------------------------------------
+
+    def candidates(self, chat_id: Optional[str] = None) -> List[OllamaBackend]:
+        """Backends in the order a request should try them"""
+        healthy = [b for b in self.backends if b.healthy]
+        unhealthy = [b for b in self.backends if not b.healthy]
+        # Unhealthy backends stay as a last resort so a false negative
+        # from a probe never turns into an outage
+        ordered = (sorted(healthy, key=lambda b: (b.outstanding, b.ttft_ewma or 0.0))
+                   + sorted(unhealthy, key=lambda b: b.outstanding))
+        if chat_id is not None and healthy:
+            preferred = self._affinity.get(chat_id)
+            if (preferred is not None and preferred.healthy
+                    and preferred.outstanding <= ordered[0].outstanding + self.affinity_slack):
+                self.affinity_hits += 1
+                ordered.remove(preferred)
+                ordered.insert(0, preferred)
+        return ordered
+
+    def _remember(self, chat_id: Optional[str], backend: OllamaBackend) -> None:
+        if chat_id is None:
+            return
+        self._affinity[chat_id] = backend
+        self._affinity.move_to_end(chat_id)
+        while len(self._affinity) > self.max_affinity_entries:
+            self._affinity.popitem(last=False)
+
+    def forget(self, chat_id: str) -> None:
+        self._affinity.pop(chat_id, None)
+
+    # -- requests ---------------------------------------------------------
+
+    async def chat(self, *args, stream: bool = False, chat_id: Optional[str] = None, **kwargs):
+        if self.keep_alive is not None:
+            kwargs.setdefault("keep_alive", self.keep_alive)
+        if stream:
+            return self._stream(args, kwargs, chat_id)
+        last_error: Optional[BaseException] = None
+        for attempt, backend in enumerate(self.candidates(chat_id)):
+            if attempt:
+                self.failovers += 1
+            backend.outstanding += 1
+            backend.requests += 1
+            started = time.perf_counter()
+            try:
+                response = await backend.client.chat(*args, stream=False, **kwargs)
+            except Exception as e:
+                backend.mark_failed(e)
+                last_error = e
+                continue
+            finally:
+                backend.outstanding -= 1
+            backend.record_ttft(time.perf_counter() - started)
+            self._remember(chat_id, backend)
+            return response
+        raise last_error
+
+    async def _stream(self, args, kwargs, chat_id: Optional[str]) -> AsyncIterator:
+        last_error: Optional[BaseException] = None
+        for attempt, backend in enumerate(self.candidates(chat_id)):
+            if attempt:
+                self.failovers += 1
+            backend.outstanding += 1
+            backend.requests += 1
+            started = time.perf_counter()
+            upstream = None
+            try:
+                try:
+                    upstream = await backend.client.chat(*args, stream=True, **kwargs)
+                    first = await upstream.__anext__()
+                except StopAsyncIteration:
+                    first = None
+                except Exception as e:
+                    # Nothing was sent yet, so another backend can take over
+                    backend.mark_failed(e)
+                    last_error = e
+                    continue
+                backend.record_ttft(time.perf_counter() - started)
+                self._remember(chat_id, backend)
+                if first is not None:
+                    yield first
+                    async for chunk in upstream:
+                        yield chunk
+                return
+            finally:
+                backend.outstanding -= 1
+                aclose = getattr(upstream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+        raise last_error
+
+    async def warm_up(self, model: str, timeout: float = 300.0, options: Optional[Dict] = None,
+                      system_prompt: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Load model on every backend with a one-token generation
+
+        This also pins the model with keep_alive. options should carry the
+        num_ctx later requests use, or the first of them reloads the model;
+        a system_prompt shared by all requests gets prefilled into the
+        server's prompt cache. Returns per-host timings or errors; a failed
+        warm-up marks the backend unhealthy until it probes fine again.
+        """
+        options = dict(options or {}, num_predict=1)
+        messages = [{"role": "user", "content": "Hi"}]
+        if system_prompt:
+            messages.insert(0, {"role": "system", "content": system_prompt})
+
+        async def warm(backend: OllamaBackend) -> Dict:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(backend.client.chat(
+                    model=model,
+                    messages=messages,
+                    options=options,
+                    keep_alive=self.keep_alive,
+                ), timeout)
+            except Exception as e:
+                backend.mark_failed(e)
+                return {"ok": False, "error": backend.last_error,
+                        "seconds": round(time.perf_counter() - started, 3)}
+            backend.healthy = True
+            return {"ok": True, "seconds": round(time.perf_counter() - started, 3)}
+
+        results = await asyncio.gather(*(warm(backend) for backend in self.backends))
+        return {backend.host: result for backend, result in zip(self.backends, results)}
+
+    # -- health -----------------------------------------------------------
+
+    async def probe(self, backend: OllamaBackend) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(backend.client.ps(), self.probe_timeout)
+        except Exception as e:
+            backend.healthy = False
+            backend.last_error = f"probe: {type(e).__name__}: {e}"
+            return
+        backend.probe_latency = time.perf_counter() - started
+        backend.healthy = True
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self.probe(backend) for backend in self.backends))
+
+    async def _probe_loop(self) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.probe_interval)
+
+    def start_health_checks(self) -> None:
+        if self._probe_task is None:
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+
+    async def aclose(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        for backend in self.backends:
+            await backend.client.close()
+
+    def stats(self) -> Dict:
+        return {
+            "backends": [backend.stats() for backend in self.backends],
+            "failovers": self.failovers,
+            "affinity_hits": self.affinity_hits,
+            "keep_alive": self.keep_alive,
+            "tracked_chats": len(self._affinity),
+        }
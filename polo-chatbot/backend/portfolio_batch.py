@@ -0,0 +1,126 @@
+# portfolio_batch.py
+# Vectorized capital/SIP breakdowns for whole client books
+
+import json
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+from investment_data import RISK_ALLOCATIONS
+
+RISK_LEVELS = list(RISK_ALLOCATIONS)
+DEFAULT_RISK = "medium"
+
+# Largest accepted capital / SIP in rupees; keeps every breakdown finite
+MAX_AMOUNT = 1e15
+
+# Union of asset classes across templates, in first-seen order
+ASSET_CLASSES = list(dict.fromkeys(
+    asset_class
+    for allocation in RISK_ALLOCATIONS.values()
+    for asset_class in allocation
+    if asset_class != "expected_return"
+))
+
+# (risk level x asset class) percentage matrix and a mask of which classes each
+# template actually lists, mirroring get_investment_recommendations' output
+ALLOCATION_MATRIX = np.array([
+    [RISK_ALLOCATIONS[risk].get(asset_class, 0) for asset_class in ASSET_CLASSES]
+    for risk in RISK_LEVELS
+], dtype=np.float64)
+PRESENT_MASK = np.array([
+    [asset_class in RISK_ALLOCATIONS[risk] for asset_class in ASSET_CLASSES]
+    for risk in RISK_LEVELS
+], dtype=bool)
+EXPECTED_RETURNS = [RISK_ALLOCATIONS[risk]["expected_return"] for risk in RISK_LEVELS]
+
+_RISK_CODES = {risk: code for code, risk in enumerate(RISK_LEVELS)}
+
+
+def encode_risk(risk_appetite: Sequence[str]) -> np.ndarray:
+    """Map risk strings to row indexes of ALLOCATION_MATRIX (unknown -> medium)"""
+    default = _RISK_CODES[DEFAULT_RISK]
+    return np.fromiter(
+        (_RISK_CODES.get(risk.lower(), default) for risk in risk_appetite),
+        dtype=np.intp, count=len(risk_appetite),
+    )
+
+
+def compute_batch(capital: Sequence[float], monthly_sip: Sequence[float],
+                  risk_appetite: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    Compute capital and SIP breakdowns for N profiles at once
+
+    Returns arrays: "risk" (N,) codes, and "capital_breakdown" /
+    "sip_breakdown" of shape (N, len(ASSET_CLASSES)) in rupees.
+    """
+    capital = np.asarray(capital, dtype=np.float64)
+    monthly_sip = np.asarray(monthly_sip, dtype=np.float64)
+    if not (len(capital) == len(monthly_sip) == len(risk_appetite)):
+        raise ValueError("capital, monthly_sip and risk_appetite must have the same length")
+    for name, amounts in (("capital", capital), ("monthly_sip", monthly_sip)):
+        # NaN fails both comparisons
+        if not np.all((amounts >= 0) & (amounts <= MAX_AMOUNT)):
+            raise ValueError(f"{name} amounts must be between 0 and {MAX_AMOUNT:.0e}")
+
+    # Same (amount * percentage) / 100 order as the scalar function, so the
+    # results match it bit for bit
+    risk = encode_risk(risk_appetite)
+    percentages = ALLOCATION_MATRIX[risk]
+    return {
+        "risk": risk,
+        "capital_breakdown": capital[:, None] * percentages / 100,
+        "sip_breakdown": monthly_sip[:, None] * percentages / 100,
+    }
+
+
+def to_columns(result: Dict[str, np.ndarray]) -> Dict:
+    """Arrow-style columnar layout: one flat list per output column"""
+    columns = {"risk_profile": [RISK_LEVELS[code] for code in result["risk"].tolist()]}
+    for idx, asset_class in enumerate(ASSET_CLASSES):
+        columns[f"capital_{asset_class}"] = result["capital_breakdown"][:, idx].tolist()
+        columns[f"sip_{asset_class}"] = result["sip_breakdown"][:, idx].tolist()
+    columns["expected_return"] = [EXPECTED_RETURNS[code] for code in result["risk"].tolist()]
+    return {"rows": len(result["risk"]), "asset_classes": ASSET_CLASSES, "columns": columns}
+
+
+def _ndjson_template(code: int) -> str:
+    """%-format template of one output line for a risk level"""
+    names = [name for idx, name in enumerate(ASSET_CLASSES) if PRESENT_MASK[code, idx]]
+    breakdown = ",".join(f'"{name}":%r' for name in names)
+    return (
+        '{"index":%d,"risk_profile":' + json.dumps(RISK_LEVELS[code])
+        + ',"capital_breakdown":{' + breakdown + '}'
+        + ',"sip_breakdown":{' + breakdown + '}'
+        + ',"total_expected_return":' + json.dumps(EXPECTED_RETURNS[code]).replace("%", "%%") + '}'
+    )
+
+
+_NDJSON_TEMPLATES = [_ndjson_template(code) for code in range(len(RISK_LEVELS))]
+_PRESENT_COLUMNS = [np.flatnonzero(PRESENT_MASK[code]) for code in range(len(RISK_LEVELS))]
+
+
+def iter_ndjson(result: Dict[str, np.ndarray], chunk_rows: int = 2000) -> Iterator[bytes]:
+    """
+    Yield NDJSON (one profile per line), chunk_rows lines per yielded block
+
+    Lines are rendered from per-risk templates; float repr is valid JSON for
+    the finite amounts compute_batch() guarantees.
+    """
+    risk = result["risk"]
+    for start in range(0, len(risk), chunk_rows):
+        stop = start + chunk_rows
+        codes = risk[start:stop]
+        capital = result["capital_breakdown"][start:stop]
+        sip = result["sip_breakdown"][start:stop]
+        lines: List[str] = [""] * len(codes)
+        # Render each risk level's rows together so columns are gathered once
+        for code, template in enumerate(_NDJSON_TEMPLATES):
+            rows = np.flatnonzero(codes == code)
+            if not len(rows):
+                continue
+            columns = _PRESENT_COLUMNS[code]
+            values = np.hstack([capital[rows][:, columns], sip[rows][:, columns]]).tolist()
+            for row, row_values in zip(rows.tolist(), values):
+                lines[row] = template % (start + row, *row_values)
+        yield ("\n".join(lines) + "\n").encode("utf-8")
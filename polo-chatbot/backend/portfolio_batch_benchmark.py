@@ -0,0 +1,90 @@
+# portfolio_batch_benchmark.py
+# Client-book breakdowns: get_investment_recommendations in a loop vs. compute_batch
+#
+# python portfolio_batch_benchmark.py --profiles 50000 --repeat 3
+#
+# Each stage is timed repeat times and the best run is reported. Besides the
+# arithmetic, the two output encodings of /portfolio/batch are timed, since
+# they dominate the endpoint once the math is vectorized. Every batch amount
+# is compared with the scalar function's result for the same profile.
+
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+from investment_data import get_investment_recommendations
+from portfolio_batch import ASSET_CLASSES, RISK_LEVELS, compute_batch, iter_ndjson, to_columns
+
+
+def best_of(repeat: int, run: Callable):
+    """(fastest wall time in seconds, result of the last run)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    capital = [float(rng.randrange(10000, 50000000, 1000)) for _ in range(args.profiles)]
+    monthly_sip = [float(rng.randrange(500, 200000, 500)) for _ in range(args.profiles)]
+    risk = [rng.choice(RISK_LEVELS) for _ in range(args.profiles)]
+
+    scalar_seconds, scalar = best_of(args.repeat, lambda: [
+        get_investment_recommendations(c, s, r, []) for c, s, r in zip(capital, monthly_sip, risk)
+    ])
+    batch_seconds, batch = best_of(args.repeat, lambda: compute_batch(capital, monthly_sip, risk))
+    ndjson_seconds, ndjson = best_of(args.repeat, lambda: b"".join(iter_ndjson(batch)))
+    columns_seconds, _ = best_of(args.repeat, lambda: to_columns(batch))
+
+    mismatches = 0
+    for row, recommendation in enumerate(scalar):
+        for idx, asset_class in enumerate(ASSET_CLASSES):
+            for key, matrix in (("capital_breakdown", batch["capital_breakdown"]),
+                                ("sip_breakdown", batch["sip_breakdown"])):
+                expected = recommendation[key].get(asset_class, {"amount": 0.0})["amount"]
+                if matrix[row, idx] != expected:
+                    mismatches += 1
+
+    return {
+        "config": {"profiles": args.profiles, "repeat": args.repeat, "numpy": np.__version__},
+        "scalar_loop_seconds": round(scalar_seconds, 4),
+        "compute_batch_seconds": round(batch_seconds, 4),
+        "speedup": round(scalar_seconds / batch_seconds, 1),
+        "ndjson_seconds": round(ndjson_seconds, 4),
+        "ndjson_megabytes": round(len(ndjson) / 2 ** 20, 1),
+        "columns_seconds": round(columns_seconds, 4),
+        "profiles_per_second": {
+            "scalar_loop": round(args.profiles / scalar_seconds),
+            "compute_batch": round(args.profiles / batch_seconds),
+            "compute_batch_and_ndjson": round(args.profiles / (batch_seconds + ndjson_seconds)),
+        },
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch portfolio computation")
+    parser.add_argument("--profiles", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the best is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
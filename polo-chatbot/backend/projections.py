@@ -0,0 +1,134 @@
+# projections.py
+# Monte Carlo projection of lump-sum + SIP portfolio outcomes
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from investment_data import RISK_ALLOCATIONS
+
+# Annualized volatility assumed per asset class of RISK_ALLOCATIONS
+ASSET_CLASS_VOLATILITY = {
+    "equity_mutual_funds": 0.16,
+    "stocks": 0.22,
+    "hybrid_funds": 0.10,
+    "debt_mutual_funds": 0.03,
+    "fixed_deposits": 0.0,
+    "government_schemes": 0.0,
+}
+
+PERCENTILES = (10, 50, 90)
+
+# Above this many (month x path) cells per block, months are simulated in
+# chunks so memory stays bounded regardless of horizon
+MAX_BLOCK_CELLS = 2_000_000
+
+_RETURN_RANGE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:-\s*(\d+(?:\.\d+)?))?\s*%")
+
+
+def parse_return_range(text: str) -> Tuple[float, float]:
+    """Parse "12-14%" / "7.1%" into (low, high) annual returns as fractions"""
+    match = _RETURN_RANGE.search(text)
+    if not match:
+        raise ValueError(f"Unrecognized return range: {text!r}")
+    low = float(match.group(1)) / 100
+    high = float(match.group(2)) / 100 if match.group(2) else low
+    return min(low, high), max(low, high)
+
+
+def portfolio_volatility(risk_appetite: str) -> float:
+    """Weighted volatility of a RISK_ALLOCATIONS template (fully correlated, so conservative)"""
+    allocation = RISK_ALLOCATIONS.get(risk_appetite.lower(), RISK_ALLOCATIONS["medium"])
+    return sum(
+        percentage / 100 * ASSET_CLASS_VOLATILITY.get(asset_class, 0.0)
+        for asset_class, percentage in allocation.items()
+        if asset_class != "expected_return"
+    )
+
+
+def simulate(capital: float, monthly_sip: float, years: int,
+             return_range: Tuple[float, float], volatility: float,
+             paths: int = 10000, seed: Optional[int] = 42,
+             chunk_months: Optional[int] = None) -> Dict:
+    """
+    Simulate monthly wealth paths and report percentile bands per year
+
+    Each path draws its expected annual return uniformly from return_range
+    and then compounds lognormal monthly returns with the given annual
+    volatility. The SIP is invested at the start of every month.
+
+    Months are processed in blocks of chunk_months (chosen automatically from
+    MAX_BLOCK_CELLS when not given); only the running wealth per path is
+    carried between blocks. Normals are drawn month-major, so results are
+    identical for any chunk size with the same seed.
+    """
+    months = years * 12
+    if chunk_months is None:
+        chunk_months = max(1, min(months, MAX_BLOCK_CELLS // max(paths, 1)))
+
+    rng = np.random.default_rng(seed)
+    low, high = return_range
+    annual_mean = rng.uniform(low, high, size=paths)
+    monthly_sigma = volatility / np.sqrt(12)
+    monthly_drift = np.log1p(annual_mean) / 12 - monthly_sigma ** 2 / 2
+
+    wealth = np.full(paths, float(capital))
+    bands: List[Dict] = []
+    month = 0
+    while month < months:
+        block = min(chunk_months, months - month)
+        shocks = rng.standard_normal((block, paths))
+        growth = np.exp(monthly_drift + monthly_sigma * shocks)  # (block, paths)
+
+        # W_t = P_t * (W_0 + sip * sum_{s<=t} 1 / P_{s-1}), P = cumulative growth
+        cumulative = np.cumprod(growth, axis=0)
+        previous = cumulative / growth
+        block_wealth = cumulative * (wealth + monthly_sip * np.cumsum(1.0 / previous, axis=0))
+
+        for offset in range(block):
+            if (month + offset + 1) % 12 == 0:
+                year = (month + offset + 1) // 12
+                values = np.percentile(block_wealth[offset], PERCENTILES)
+                bands.append({
+                    "year": year,
+                    "invested": capital + monthly_sip * 12 * year,
+                    **{f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, values)},
+                })
+        wealth = block_wealth[-1]
+        month += block
+
+    invested = capital + monthly_sip * months
+    return {
+        "paths": paths,
+        "years": years,
+        "seed": seed,
+        "return_range": [low, high],
+        "volatility": round(volatility, 4),
+        "bands": bands,
+        "final": {
+            "invested": invested,
+            **{f"p{p}": round(float(v), 2)
+               for p, v in zip(PERCENTILES, np.percentile(wealth, PERCENTILES))},
+            "probability_of_loss": round(float(np.mean(wealth < invested)), 4),
+        },
+    }
+
+
+def project_portfolio(capital: float, monthly_sip: float, risk_appetite: str = "medium",
+                      years: int = 10, expected_return: Optional[str] = None,
+                      paths: int = 10000, seed: Optional[int] = 42,
+                      chunk_months: Optional[int] = None) -> Dict:
+    """
+    Project a profile's outcomes using its RISK_ALLOCATIONS template
+
+    expected_return (e.g. a fund's "12-14%") overrides the template's range.
+    """
+    risk = risk_appetite.lower()
+    if risk not in RISK_ALLOCATIONS:
+        risk = "medium"
+    return_range = parse_return_range(expected_return or RISK_ALLOCATIONS[risk]["expected_return"])
+    result = simulate(capital, monthly_sip, years, return_range, portfolio_volatility(risk),
+                      paths=paths, seed=seed, chunk_months=chunk_months)
+    result["risk_profile"] = risk
+    return result
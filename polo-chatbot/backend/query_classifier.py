@@ -0,0 +1,155 @@
+# query_classifier.py
+# Hashed n-gram logistic regression giving a second opinion on ambiguous queries
+
+import random
+import re
+from collections import OrderedDict
+from math import exp
+from typing import Dict, Iterable, List, Optional, Tuple
+from zlib import crc32
+
+TOKEN = re.compile(r"[a-z0-9₹$€£%]+")
+
+# Function words appear in finance and off-topic questions alike ("what is",
+# "how do i"); left in, they teach the model that any question is finance
+STOP_WORDS = frozenset("""
+a about all am an and any are at be been but by can could did do does for from get give
+had has have here how i if in into is it its me more most much my no not of on or our
+please should so some tell than that the then there these this those to up vs was we
+what when where which who why will with would you your
+""".split())
+
+# Tokens longer than this also contribute their first STEM_LENGTH characters,
+# so "investing" shares evidence with "investment"
+STEM_LENGTH = 5
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase content words; numbers collapse to a single shape token"""
+    return ["<num>" if token.isdigit() else token
+            for token in TOKEN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def load_samples(path: str) -> List[Tuple[str, bool]]:
+    """Read label<TAB>query lines ("finance" or "other"); # starts a comment"""
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            label, text = line.split("\t", 1)
+            if label not in ("finance", "other"):
+                raise ValueError(f"Unknown label {label!r} in {path}")
+            samples.append((text, label == "finance"))
+    return samples
+
+
+def keyword_examples(categories: Dict[str, List[str]],
+                     rejected: Iterable[str]) -> List[Tuple[str, bool]]:
+    """Turn keyword tables and reject indicators into labelled phrases"""
+    examples = [(keyword, True) for keywords in categories.values() for keyword in keywords]
+    examples.extend((indicator, False) for indicator in rejected)
+    return examples
+
+
+class HashedNgramClassifier:
+    """
+    Binary logistic regression over hashed words and word stems
+
+    Features are hashed (crc32, stable across processes) into 2**bits weights,
+    so there is no vocabulary to store. The model has no bias term: a query
+    made only of words it never saw scores exactly 0.5, below threshold, so
+    the classifier accepts on evidence rather than on the class balance of
+    its training data. Scoring is a sum over a handful of list lookups;
+    verdicts are memoized per token sequence in an LRU of cache_size entries.
+    """
+
+    def __init__(self, bits: int = 18, threshold: float = 0.6, cache_size: int = 4096):
+        self.mask = (1 << bits) - 1
+        self.threshold = threshold
+        self.weights = [0.0] * (1 << bits)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.trained_examples = 0
+
+    def features(self, tokens: List[str]) -> List[int]:
+        names = []
+        for token in tokens:
+            names.append("w:" + token)
+            if len(token) > STEM_LENGTH and token != "<num>":
+                names.append("s:" + token[:STEM_LENGTH])
+        mask = self.mask
+        return [crc32(name.encode("utf-8")) & mask for name in names]
+
+    def _probability(self, features: List[int]) -> float:
+        weights = self.weights
+        z = sum(weights[f] for f in features)
+        if z < -30.0:
+            return 0.0
+        return 1.0 / (1.0 + exp(-z))
+
+    def fit(self, examples: List[Tuple[str, bool]], epochs: int = 30,
+            learning_rate: float = 0.3, l2: float = 1e-4, seed: int = 0) -> "HashedNgramClassifier":
+        """Train with plain SGD on log loss (deterministic for a given seed)"""
+        encoded = [(self.features(tokenize(text)), 1.0 if label else 0.0) for text, label in examples]
+        order = list(range(len(encoded)))
+        rng = random.Random(seed)
+        weights = self.weights
+        decay = 1.0 - learning_rate * l2
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            # Decaying step size so late epochs refine rather than oscillate
+            rate = learning_rate / (1.0 + epoch * 0.1)
+            for i in order:
+                features, target = encoded[i]
+                step = rate * (target - self._probability(features))
+                for f in features:
+                    weights[f] = weights[f] * decay + step
+        self.trained_examples = len(encoded)
+        self._cache.clear()
+        return self
+
+    def predict(self, text: str) -> Tuple[bool, float]:
+        """(is_finance, probability) for text, memoized per token sequence"""
+        tokens = tokenize(text)
+        key = " ".join(tokens)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return cached
+        self.misses += 1
+        probability = self._probability(self.features(tokens))
+        verdict = (probability >= self.threshold, probability)
+        self._cache[key] = verdict
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return verdict
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "trained_examples": self.trained_examples,
+            "threshold": self.threshold,
+            "cache_entries": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def train_query_classifier(categories: Dict[str, List[str]], rejected: Iterable[str],
+                           samples: Optional[List[Tuple[str, bool]]] = None,
+                           **kwargs) -> HashedNgramClassifier:
+    """Fit a classifier on the keyword tables plus labelled sample queries"""
+    examples = keyword_examples(categories, rejected) + list(samples or [])
+    return HashedNgramClassifier(**kwargs).fit(examples)
@@ -0,0 +1,255 @@
+# rate_limit.py
+# Token-bucket rate limits per client IP and per chat, applied as ASGI middleware
+
+import math
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fast_responses import FastJSONResponse
+
+
+class RateLimit(NamedTuple):
+    """capacity tokens, refilled evenly over per_seconds"""
+    capacity: float
+    per_seconds: float
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimit":
+        """Parse capacity/per_seconds, e.g. "20/60" = 20 a minute in bursts of up to 20"""
+        capacity, per_seconds = value.split("/")
+        limit = cls(float(capacity), float(per_seconds))
+        if limit.capacity <= 0 or limit.per_seconds <= 0:
+            raise ValueError(f"Rate limit must be positive: {value!r}")
+        return limit
+
+
+# Budget name -> limit. Sessions and messages cost one token per request;
+# the generation budget is charged with the tokens each answer produced
+DEFAULT_LIMITS = {
+    "sessions_per_ip": RateLimit(20, 60),
+    "messages_per_ip": RateLimit(30, 60),
+    "messages_per_chat": RateLimit(10, 60),
+    "generated_tokens_per_ip": RateLimit(20000, 600),
+}
+
+
+class Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class BucketStore:
+    """
+    Token buckets of one budget, keyed by client IP or chat_id
+
+    A bucket is refilled lazily when touched, so every operation is one dict
+    lookup and a little arithmetic. A full bucket behaves exactly like a
+    missing one, so compact() drops buckets that have refilled completely;
+    beyond max_keys the oldest bucket is evicted.
+    """
+
+    def __init__(self, limit: RateLimit, max_keys: int = 100000):
+        self.capacity = limit.capacity
+        self.rate = limit.capacity / limit.per_seconds
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Bucket] = {}
+        self.rejected = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, key: str, now: float) -> Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+                self.evictions += 1
+            bucket = self._buckets[key] = Bucket(self.capacity, now)
+            return bucket
+        tokens = bucket.tokens + (now - bucket.updated) * self.rate
+        bucket.tokens = tokens if tokens < self.capacity else self.capacity
+        bucket.updated = now
+        return bucket
+
+    def wait(self, key: str, cost: float, now: float) -> float:
+        """Seconds until key can spend cost tokens (0.0 = now)"""
+        bucket = self._refill(key, now)
+        if bucket.tokens >= cost:
+            return 0.0
+        return (cost - bucket.tokens) / self.rate
+
+    def take(self, key: str, cost: float, now: float) -> None:
+        """Spend tokens; the balance may go negative down to -capacity"""
+        bucket = self._refill(key, now)
+        bucket.tokens = max(bucket.tokens - cost, -self.capacity)
+
+    def compact(self, now: float) -> int:
+        """Drop buckets that have refilled completely; returns how many"""
+        capacity, rate = self.capacity, self.rate
+        full = [key for key, bucket in self._buckets.items()
+                if bucket.tokens + (now - bucket.updated) * rate >= capacity]
+        for key in full:
+            del self._buckets[key]
+        return len(full)
+
+    def stats(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "per_second": round(self.rate, 4),
+            "keys": len(self._buckets),
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+        }
+
+
+class RateLimiter:
+    """
+    The budgets guarding session creation and message generation
+
+    check() either spends one token from every (budget, key) pair it is given
+    or, if any of them is short, spends nothing and returns the budget and
+    the seconds to wait. Generated tokens are charged after the fact with
+    charge(); a client in debt is refused new messages until it is repaid.
+    """
+
+    def __init__(self, limits: Dict[str, RateLimit] = DEFAULT_LIMITS, enabled: bool = True,
+                 trust_forwarded: bool = False, max_keys: int = 100000,
+                 compact_interval: float = 60.0):
+        self.enabled = enabled
+        self.trust_forwarded = trust_forwarded
+        self.compact_interval = compact_interval
+        self.stores = {name: BucketStore(limit, max_keys) for name, limit in limits.items()}
+        self._next_compaction = time.monotonic() + compact_interval
+        self.compacted = 0
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """
+        RATE_LIMIT_ENABLED=0 turns limiting off; RATE_LIMIT_<BUDGET>=capacity/seconds
+        overrides a budget (e.g. RATE_LIMIT_MESSAGES_PER_CHAT=5/60);
+        RATE_LIMIT_TRUST_FORWARDED=1 keys clients by X-Forwarded-For
+        """
+        limits = {
+            name: RateLimit.parse(os.environ[f"RATE_LIMIT_{name.upper()}"])
+            if f"RATE_LIMIT_{name.upper()}" in os.environ else limit
+            for name, limit in DEFAULT_LIMITS.items()
+        }
+        return cls(
+            limits,
+            enabled=os.environ.get("RATE_LIMIT_ENABLED", "1") != "0",
+            trust_forwarded=os.environ.get("RATE_LIMIT_TRUST_FORWARDED", "0") == "1",
+        )
+
+    def client_key(self, scope) -> str:
+        """The client IP of an ASGI scope (first X-Forwarded-For hop if trusted)"""
+        if self.trust_forwarded:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    return value.split(b",", 1)[0].strip().decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _maybe_compact(self, now: float) -> None:
+        if now >= self._next_compaction:
+            self._next_compaction = now + self.compact_interval
+            self.compacted += sum(store.compact(now) for store in self.stores.values())
+
+    def check(self, keys: List[Tuple[str, str]], now: Optional[float] = None,
+              debts: Tuple[Tuple[str, str], ...] = ()) -> Optional[Tuple[str, float]]:
+        """
+        Spend one token per (budget, key) in keys, or return (budget, retry_after)
+
+        debts are (budget, key) pairs that must not be overdrawn but are
+        charged elsewhere (generated tokens).
+        """
+        if now is None:
+            now = time.monotonic()
+        self._maybe_compact(now)
+        stores = self.stores
+        for name, key in debts:
+            store = stores[name]
+            wait = store.wait(key, 0.0, now)
+            if wait:
+                store.rejected += 1
+                return name, wait
+        for name, key in keys:
+            store = stores[name]
+            wait = store.wait(key, 1.0, now)
+            if wait:
+                store.rejected += 1
+                return name, wait
+        for name, key in keys:
+            stores[name].take(key, 1.0, now)
+        return None
+
+    def charge(self, name: str, key: str, cost: float, now: Optional[float] = None) -> None:
+        if self.enabled and cost > 0:
+            self.stores[name].take(key, cost, time.monotonic() if now is None else now)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "trust_forwarded": self.trust_forwarded,
+            "compacted": self.compacted,
+            "budgets": {name: store.stats() for name, store in self.stores.items()},
+        }
+
+
+RATE_LIMITED_MESSAGES = {
+    "sessions_per_ip": "Too many new chats from your network, please wait a moment.",
+    "messages_per_ip": "Too many messages from your network, please slow down.",
+    "messages_per_chat": "Too many messages in this chat, please slow down.",
+    "generated_tokens_per_ip": "You have used up your answer budget for now, please retry later.",
+}
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying a RateLimiter to POST /chats and POST /chats/{chat_id}
+
+    Refused requests get a 429 with a Retry-After header (whole seconds,
+    rounded up) and never reach the route. Everything else passes through
+    after a method and path comparison.
+    """
+
+    def __init__(self, app, limiter: RateLimiter, rejections=None):
+        self.app = app
+        self.limiter = limiter
+        # Optional counter labelled by budget (see metrics.py)
+        self.rejections = rejections
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        if path == "/chats":
+            client = self.limiter.client_key(scope)
+            denied = self.limiter.check([("sessions_per_ip", client)])
+        elif path.startswith("/chats/") and path.count("/") == 2:
+            client = self.limiter.client_key(scope)
+            denied = self.limiter.check(
+                [("messages_per_ip", client), ("messages_per_chat", path[7:])],
+                debts=(("generated_tokens_per_ip", client),),
+            )
+        else:
+            await self.app(scope, receive, send)
+            return
+        if denied is None:
+            await self.app(scope, receive, send)
+            return
+        name, wait = denied
+        if self.rejections is not None:
+            self.rejections.labels(name).inc()
+        response = FastJSONResponse(
+            {"detail": {"error": "rate_limited", "limit": name,
+                        "message": RATE_LIMITED_MESSAGES[name]}},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+        await response(scope, receive, send)
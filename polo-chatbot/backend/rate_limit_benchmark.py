@@ -0,0 +1,118 @@
+# rate_limit_benchmark.py
+# Per-request overhead of RateLimitMiddleware in front of a no-op ASGI app
+#
+# python rate_limit_benchmark.py --requests 200000 --clients 10000
+#
+# Each request is timed around the middleware call, once with the middleware
+# and once against the bare app; the overhead is the difference. Clients and
+# chats are spread so most checks touch buckets that already exist, as they
+# would under steady traffic, and the limits are set high enough that every
+# request is admitted (the rejection path is timed separately).
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+from loadtest import summarize
+from rate_limit import DEFAULT_LIMITS, RateLimit, RateLimiter, RateLimitMiddleware
+
+
+async def noop_app(scope, receive, send):
+    pass
+
+
+async def noop_send(message):
+    pass
+
+
+async def noop_receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def make_scopes(requests: int, clients: int, chats: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    chat_ids = [f"{rng.getrandbits(128):032x}" for _ in range(chats)]
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    scopes = []
+    for i in range(requests):
+        # One in ten requests creates a session, the rest send messages
+        path = "/chats" if i % 10 == 0 else f"/chats/{rng.choice(chat_ids)}"
+        scopes.append({
+            "type": "http", "method": "POST", "path": path, "headers": [],
+            "client": (rng.choice(ips), 40000),
+        })
+    return scopes
+
+
+async def time_calls(app, scopes: List[Dict]) -> List[float]:
+    """Per-call latency in microseconds"""
+    timings = []
+    perf_counter = time.perf_counter
+    for scope in scopes:
+        started = perf_counter()
+        await app(scope, noop_receive, noop_send)
+        timings.append((perf_counter() - started) * 1e6)
+    return timings
+
+
+async def run(args) -> Dict:
+    scopes = make_scopes(args.requests, args.clients, args.chats, args.seed)
+    generous = {name: RateLimit(1e12, 1.0) for name in DEFAULT_LIMITS}
+    limiter = RateLimiter(generous, compact_interval=args.compact_interval)
+    middleware = RateLimitMiddleware(noop_app, limiter)
+
+    # Warm both paths (bucket creation, code caches) before measuring
+    await time_calls(middleware, scopes[:10000])
+    await time_calls(noop_app, scopes[:10000])
+    bare = await time_calls(noop_app, scopes)
+    limited = await time_calls(middleware, scopes)
+
+    strict = RateLimiter({name: RateLimit(1, 3600) for name in DEFAULT_LIMITS})
+    rejecting = RateLimitMiddleware(noop_app, strict)
+    same_client = [dict(scopes[1], client=("10.0.0.1", 40000))] * min(args.requests, 20000)
+    rejected = await time_calls(rejecting, same_client)
+
+    bucket_keys = {name: len(store) for name, store in limiter.stores.items()}
+    started = time.perf_counter()
+    compacted = sum(store.compact(time.monotonic() + 3600) for store in limiter.stores.values())
+    compaction_seconds = time.perf_counter() - started
+
+    bare_stats, limited_stats = summarize(bare), summarize(limited)
+    overhead_mean = limited_stats["mean"] - bare_stats["mean"]
+    return {
+        "config": {"requests": args.requests, "clients": args.clients, "chats": args.chats},
+        "bare_app_us": bare_stats,
+        "with_rate_limit_us": limited_stats,
+        "rejected_429_us": summarize(rejected),
+        "overhead_mean_us": round(overhead_mean, 3),
+        "overhead_p99_us": round(limited_stats["p99"] - bare_stats["p99"], 3),
+        "bucket_keys": bucket_keys,
+        "compaction": {"dropped": compacted, "seconds": round(compaction_seconds, 4)},
+        "within_budget": overhead_mean < args.budget_us,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rate limiting middleware")
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=10000, help="distinct client IPs")
+    parser.add_argument("--chats", type=int, default=20000)
+    parser.add_argument("--compact-interval", type=float, default=60.0)
+    parser.add_argument("--budget-us", type=float, default=20.0, help="allowed mean overhead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
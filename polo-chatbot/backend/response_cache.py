@@ -0,0 +1,110 @@
+# response_cache.py
+# LRU + TTL cache of full LLM answers, keyed on the normalized query and the prompt as sent
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!]+$")
+_REPLAY_TOKEN = re.compile(r"\s*\S+\s*")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    message = _WHITESPACE.sub(" ", message.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", message)
+
+
+def make_cache_key(message: str, system_prompt: str,
+                   history: Optional[List[Dict]] = None,
+                   model: str = "") -> str:
+    """
+    Build a cache key for one generation
+
+    Prior turns are part of the key so follow-up questions never reuse an
+    answer given in a different conversation. system_prompt and history
+    must be the messages as sent, including any per-user profile text, so
+    an answer quoting one user's amounts is never replayed to another.
+    Profiles therefore only share an entry when their prompt text is
+    identical (same amounts, risk and preferences); only the question is
+    normalized.
+    """
+    payload = {
+        "model": model,
+        "message": normalize_message(message),
+        "system": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        "history": [
+            [msg["role"], normalize_message(msg["content"])] for msg in history or []
+        ],
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def split_for_replay(text: str, words_per_chunk: int = 3) -> List[str]:
+    """Split a cached answer into token-like chunks for SSE replay"""
+    tokens = _REPLAY_TOKEN.findall(text)
+    return [
+        "".join(tokens[idx:idx + words_per_chunk])
+        for idx in range(0, len(tokens), words_per_chunk)
+    ]
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache with per-entry TTL
+
+    Entries expire ttl_seconds after they were stored; once max_entries is
+    reached the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
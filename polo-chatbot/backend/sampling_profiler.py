@@ -0,0 +1,117 @@
+# sampling_profiler.py
+# Stack-sampling profiler that attaches to a running worker for a few seconds
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Innermost frames of an asyncio event loop waiting for I/O
+IDLE_FRAMES = frozenset([("selectors.py", "select"), ("selectors.py", "poll")])
+
+
+def frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack at a fixed interval
+
+    A background thread reads sys._current_frames() every interval seconds,
+    so the profiled thread (normally the event loop) runs unmodified: no
+    tracing hooks, no restart, and the cost ends when the profile does.
+    Samples whose innermost frame is the loop waiting in its selector count
+    as idle; the others show where the thread spends its time. Only one
+    profile runs at a time.
+    """
+
+    def __init__(self, max_depth: int = 64):
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self.profiles = 0
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _stack(self, frame) -> Tuple[Tuple[str, ...], bool]:
+        code = frame.f_code
+        idle = (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(frame_label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels), idle
+
+    def run(self, seconds: float, thread_id: int, interval: float = 0.005,
+            top: int = 30) -> Dict:
+        """Profile thread_id for seconds; blocks, so call it from another thread"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            stacks: Counter = Counter()
+            idle = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+            next_sample = started
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now < next_sample:
+                    time.sleep(next_sample - now)
+                next_sample = max(next_sample, now) + interval
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    continue
+                stack, is_idle = self._stack(frame)
+                del frame
+                if is_idle:
+                    idle += 1
+                else:
+                    stacks[stack] += 1
+            elapsed = time.perf_counter() - started
+            self.profiles += 1
+        finally:
+            self._lock.release()
+        return self.report(stacks, idle, elapsed, interval, top)
+
+    @staticmethod
+    def report(stacks: Counter, idle: int, elapsed: float, interval: float, top: int) -> Dict:
+        busy = sum(stacks.values())
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+
+        def ranked(counter: Counter) -> List[Dict]:
+            return [{"function": label, "samples": count,
+                     "percent": round(100.0 * count / busy, 2)}
+                    for label, count in counter.most_common(top)]
+
+        return {
+            "seconds": round(elapsed, 3),
+            "interval_seconds": interval,
+            "samples": busy + idle,
+            "idle_samples": idle,
+            "busy_samples": busy,
+            "top_self": ranked(own),
+            "top_total": ranked(total),
+            # Brendan Gregg's folded format (flamegraph.pl, speedscope)
+            "collapsed": "".join(f"{';'.join(stack)} {count}\n"
+                                 for stack, count in stacks.most_common()),
+        }
+
+    def stats(self) -> Dict:
+        return {"running": self.running, "profiles": self.profiles}
+
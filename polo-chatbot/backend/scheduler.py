@@ -0,0 +1,167 @@
+# scheduler.py
+# Admission control and per-chat fair scheduling of LLM generations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Dict, Optional
+
+
+class QueueFull(Exception):
+    """The wait queue is at capacity; the request should be rejected"""
+
+
+class Ticket:
+    """A request's place in the scheduler (waiting -> running -> done)"""
+
+    __slots__ = ("chat_id", "enqueued_at", "granted", "state", "wait_seconds")
+
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        self.enqueued_at = time.monotonic()
+        self.granted = asyncio.Event()
+        self.state = "waiting"
+        self.wait_seconds = 0.0
+
+
+class GenerationScheduler:
+    """
+    Bounded concurrency with a bounded, per-chat fair wait queue
+
+    At most max_concurrent generations run at once and at most max_queue
+    requests wait. Waiting requests are grouped per chat and slots are handed
+    out round-robin across chats, so one chat sending many messages cannot
+    starve the others.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 64):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        # chat_id -> its waiting tickets; dict order is the round-robin order
+        self._queues: "OrderedDict[str, deque[Ticket]]" = OrderedDict()
+
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.granted_total = 0
+
+    def check_admission(self) -> None:
+        """Raise QueueFull when no slot is free and the wait queue is full"""
+        if self.active >= self.max_concurrent and self.waiting >= self.max_queue:
+            self.rejected_total += 1
+            raise QueueFull(f"{self.waiting} generations are already waiting")
+
+    def enqueue(self, chat_id: str, admitted: bool = False) -> Ticket:
+        """
+        Queue a request (or grant it a slot right away)
+
+        Pass admitted=True when check_admission() already ran for this
+        request, e.g. before its response started streaming.
+        """
+        if not admitted:
+            self.check_admission()
+        ticket = Ticket(chat_id)
+        self.admitted_total += 1
+        if self.active < self.max_concurrent and not self.waiting:
+            self._grant(ticket)
+        else:
+            self._queues.setdefault(chat_id, deque()).append(ticket)
+            self.waiting += 1
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """Number of tickets that will be granted before this one (0 = next)"""
+        if ticket.state != "waiting":
+            return 0
+        own = self._queues.get(ticket.chat_id)
+        if not own:
+            return 0
+        index = own.index(ticket)
+        ahead = index
+        before_own_chat = True
+        for chat_id, queue in self._queues.items():
+            if chat_id == ticket.chat_id:
+                before_own_chat = False
+                continue
+            # Round-robin: every earlier round serves one ticket from each chat,
+            # and chats ahead in the rotation are also served in our round
+            ahead += min(len(queue), index + (1 if before_own_chat else 0))
+        return ahead
+
+    async def wait(self, ticket: Ticket, stop: Optional[asyncio.Event] = None,
+                   poll_interval: float = 0.5) -> AsyncIterator[int]:
+        """
+        Wait for a slot, yielding the queue position whenever it changes
+
+        Returns as soon as the ticket is granted (immediately if it already
+        is), or as soon as stop is set, in which case the ticket leaves the
+        queue right away.
+        """
+        last = None
+        while not ticket.granted.is_set():
+            if stop is not None and stop.is_set():
+                self.release(ticket)
+                return
+            current = self.position(ticket)
+            if current != last:
+                last = current
+                yield current
+            waiters = [asyncio.ensure_future(ticket.granted.wait())]
+            if stop is not None:
+                waiters.append(asyncio.ensure_future(stop.wait()))
+            try:
+                await asyncio.wait(waiters, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+
+    def release(self, ticket: Ticket) -> None:
+        """Give back a running slot or leave the queue (safe to call twice)"""
+        if ticket.state == "running":
+            self.active -= 1
+            ticket.state = "done"
+            self._dispatch()
+        elif ticket.state == "waiting":
+            queue = self._queues.get(ticket.chat_id)
+            if queue is not None:
+                queue.remove(ticket)
+                self.waiting -= 1
+                if not queue:
+                    del self._queues[ticket.chat_id]
+            ticket.state = "done"
+
+    def _dispatch(self) -> None:
+        while self.active < self.max_concurrent and self._queues:
+            chat_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            self.waiting -= 1
+            # Move this chat to the back of the rotation (or drop it if empty)
+            del self._queues[chat_id]
+            if queue:
+                self._queues[chat_id] = queue
+            self._grant(ticket)
+
+    def _grant(self, ticket: Ticket) -> None:
+        ticket.state = "running"
+        ticket.wait_seconds = time.monotonic() - ticket.enqueued_at
+        self.active += 1
+        self.granted_total += 1
+        self.wait_seconds_total += ticket.wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, ticket.wait_seconds)
+        ticket.granted.set()
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "waiting_chats": len(self._queues),
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "wait_seconds_avg": round(self.wait_seconds_total / self.granted_total, 4) if self.granted_total else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
@@ -0,0 +1,442 @@
+# session_store.py
+# Pluggable storage for chat sessions, message history and user profiles
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class MessageRecord:
+    """
+    One stored message
+
+    A slotted record takes under 40% of the memory of the equivalent
+    dict, and role/category are interned so the few distinct values are
+    shared by every message instead of being copied per row.
+    """
+
+    __slots__ = ("role", "content", "category", "interrupted")
+
+    def __init__(self, role: str, content: str, category: Optional[str] = None,
+                 interrupted: bool = False):
+        self.role = sys.intern(role)
+        self.content = content
+        self.category = sys.intern(category) if category is not None else None
+        self.interrupted = interrupted
+
+    @classmethod
+    def from_dict(cls, message: Dict) -> "MessageRecord":
+        return cls(message["role"], message["content"], message.get("category"),
+                   bool(message.get("interrupted")))
+
+    def to_dict(self, seq: Optional[int] = None) -> Dict:
+        message = {"role": self.role, "content": self.content}
+        if self.category is not None:
+            message["category"] = self.category
+        if self.interrupted:
+            message["interrupted"] = True
+        if seq is not None:
+            message["seq"] = seq
+        return message
+
+
+class SessionStore:
+    """
+    Interface for chat session storage
+
+    Messages go in and come out as plain dicts with "role", "content" and
+    optional "category" and "interrupted" keys, in the same shape the API
+    returns them; stores keep them as MessageRecords. Every message has a
+    per-session sequence number (0, 1, 2, ...) that history pages use as
+    their cursor.
+    """
+
+    def create(self, chat_id: str) -> None:
+        raise NotImplementedError
+
+    def exists(self, chat_id: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, chat_id: str) -> bool:
+        """Remove a session together with its messages and profile"""
+        raise NotImplementedError
+
+    def append_message(self, chat_id: str, message: Dict) -> None:
+        """Add a message to a session; raises KeyError if it does not exist (any more)"""
+        raise NotImplementedError
+
+    def get_messages(self, chat_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Return the session's messages in order (only the last `limit` if given)"""
+        raise NotImplementedError
+
+    def get_page(self, chat_id: str, after: Optional[int] = None,
+                 limit: Optional[int] = None) -> List[Dict]:
+        """
+        Messages with a sequence number above `after` (all if None), oldest
+        first, at most `limit` of them; each dict carries its "seq"
+        """
+        raise NotImplementedError
+
+    def set_profile(self, chat_id: str, profile: Optional[Dict]) -> None:
+        raise NotImplementedError
+
+    def get_profile(self, chat_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Persist any buffered writes (no-op for stores without buffering)"""
+
+    def close(self) -> None:
+        self.flush()
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; state is lost on restart"""
+
+    def __init__(self):
+        self._messages: Dict[str, List[MessageRecord]] = {}
+        self._profiles: Dict[str, Optional[Dict]] = {}
+
+    def create(self, chat_id: str) -> None:
+        self._messages[chat_id] = []
+        self._profiles[chat_id] = None
+
+    def exists(self, chat_id: str) -> bool:
+        return chat_id in self._messages
+
+    def delete(self, chat_id: str) -> bool:
+        self._profiles.pop(chat_id, None)
+        return self._messages.pop(chat_id, None) is not None
+
+    def append_message(self, chat_id: str, message: Dict) -> None:
+        self._messages[chat_id].append(MessageRecord.from_dict(message))
+
+    def get_messages(self, chat_id: str, limit: Optional[int] = None) -> List[Dict]:
+        records = self._messages.get(chat_id, [])
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        return [record.to_dict() for record in records]
+
+    def get_page(self, chat_id: str, after: Optional[int] = None,
+                 limit: Optional[int] = None) -> List[Dict]:
+        # The sequence number is the list index
+        start = after + 1 if after is not None else 0
+        end = start + limit if limit is not None else None
+        records = self._messages.get(chat_id, [])
+        return [record.to_dict(seq) for seq, record in enumerate(records[start:end], start)]
+
+    def set_profile(self, chat_id: str, profile: Optional[Dict]) -> None:
+        self._profiles[chat_id] = profile
+
+    def get_profile(self, chat_id: str) -> Optional[Dict]:
+        return self._profiles.get(chat_id)
+
+    def count(self) -> int:
+        return len(self._messages)
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    SQLite (WAL) backed store with write-behind batching
+
+    Every write (new sessions, profiles, deletes and messages) only goes
+    into an ordered queue; a background thread commits it in batches every
+    flush_interval seconds (or as soon as batch_size writes are waiting),
+    on a connection of its own. Reads use a separate connection, which WAL
+    mode never blocks behind a commit, and merge the queue so a write is
+    visible immediately. Callers on the event loop therefore never wait for
+    the flush thread.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            chat_id TEXT PRIMARY KEY,
+            profile TEXT,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            chat_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            category TEXT,
+            interrupted INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (chat_id, seq)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str = "sessions.db", flush_interval: float = 0.05,
+                 batch_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        # Written to by the flush thread only
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+        self._db_lock = threading.Lock()
+        # Reads see the last committed state without waiting for the writer
+        self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._read_lock = threading.Lock()
+
+        # Write-behind queue of ("session", chat_id, created_at),
+        # ("profile", chat_id, profile), ("delete", chat_id) and
+        # ("message", chat_id, seq, MessageRecord) tuples not yet committed,
+        # in order. _unflushed indexes the queued and in-flight messages by
+        # chat and seq until their batch is committed.
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._unflushed: Dict[str, Dict[int, MessageRecord]] = {}
+        # Sessions created or read in this process: next message seq and profile
+        self._next_seq: Dict[str, int] = {}
+        self._profiles: Dict[str, Optional[Dict]] = {}
+        # Deleted sessions whose delete is not committed yet
+        self._deleted: Dict[str, int] = {}
+        self._count = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        self._flush_lock = threading.Lock()
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-flush", daemon=True)
+        self._flusher.start()
+
+    def _migrate(self) -> None:
+        """Add columns introduced after a database was first created"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(messages)")}
+        if "interrupted" not in columns:
+            self._conn.execute(
+                "ALTER TABLE messages ADD COLUMN interrupted INTEGER NOT NULL DEFAULT 0"
+            )
+
+    def _query(self, query: str, params: tuple) -> List[tuple]:
+        with self._read_lock:
+            return self._reader.execute(query, params).fetchall()
+
+    def _enqueue(self, op: tuple) -> None:
+        """Queue a write (caller holds _lock)"""
+        self._pending.append(op)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    # -- sessions ---------------------------------------------------------
+
+    def create(self, chat_id: str) -> None:
+        existed = self.exists(chat_id)
+        with self._lock:
+            self._enqueue(("session", chat_id, time.time()))
+            self._next_seq[chat_id] = 0
+            self._profiles[chat_id] = None
+            if not existed:
+                self._count += 1
+
+    def exists(self, chat_id: str) -> bool:
+        with self._lock:
+            if chat_id in self._next_seq:
+                return True
+            if chat_id in self._deleted:
+                return False
+        return bool(self._query("SELECT 1 FROM sessions WHERE chat_id = ?", (chat_id,)))
+
+    def delete(self, chat_id: str) -> bool:
+        existed = self.exists(chat_id)
+        with self._lock:
+            self._next_seq.pop(chat_id, None)
+            self._profiles.pop(chat_id, None)
+            self._pending = [op for op in self._pending if op[1] != chat_id]
+            self._unflushed.pop(chat_id, None)
+            self._enqueue(("delete", chat_id))
+            self._deleted[chat_id] = self._deleted.get(chat_id, 0) + 1
+            if existed:
+                self._count -= 1
+        return existed
+
+    def count(self) -> int:
+        return self._count
+
+    # -- profiles ---------------------------------------------------------
+
+    def set_profile(self, chat_id: str, profile: Optional[Dict]) -> None:
+        with self._lock:
+            self._enqueue(("profile", chat_id, json.dumps(profile) if profile is not None else None))
+            self._profiles[chat_id] = profile
+
+    def get_profile(self, chat_id: str) -> Optional[Dict]:
+        with self._lock:
+            if chat_id in self._profiles:
+                return self._profiles[chat_id]
+            if chat_id in self._deleted:
+                return None
+        rows = self._query("SELECT profile FROM sessions WHERE chat_id = ?", (chat_id,))
+        return json.loads(rows[0][0]) if rows and rows[0][0] else None
+
+    # -- messages ---------------------------------------------------------
+
+    def append_message(self, chat_id: str, message: Dict) -> None:
+        """Queue a message; raises KeyError for a missing or deleted session"""
+        with self._lock:
+            known = chat_id in self._next_seq
+        if not known and self.exists(chat_id):
+            # A session from before a restart: continue after its last message
+            rows = self._query("SELECT MAX(seq) FROM messages WHERE chat_id = ?", (chat_id,))
+            with self._lock:
+                if chat_id not in self._deleted:
+                    self._next_seq.setdefault(chat_id, rows[0][0] + 1 if rows[0][0] is not None else 0)
+        with self._lock:
+            seq = self._next_seq.get(chat_id)
+            if seq is None:
+                raise KeyError(chat_id)
+            self._next_seq[chat_id] = seq + 1
+            record = MessageRecord.from_dict(message)
+            self._unflushed.setdefault(chat_id, {})[seq] = record
+            self._enqueue(("message", chat_id, seq, record))
+
+    def get_messages(self, chat_id: str, limit: Optional[int] = None) -> List[Dict]:
+        query = ("SELECT seq, role, content, category, interrupted FROM messages "
+                 "WHERE chat_id = ? ORDER BY seq DESC")
+        params: tuple = (chat_id,)
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (chat_id, limit)
+        records = self._read(chat_id, query, params)
+        ordered = [records[seq].to_dict() for seq in sorted(records)]
+        if limit is not None:
+            return ordered[-limit:] if limit > 0 else []
+        return ordered
+
+    def get_page(self, chat_id: str, after: Optional[int] = None,
+                 limit: Optional[int] = None) -> List[Dict]:
+        after = after if after is not None else -1
+        query = ("SELECT seq, role, content, category, interrupted FROM messages "
+                 "WHERE chat_id = ? AND seq > ? ORDER BY seq")
+        params: tuple = (chat_id, after)
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (chat_id, after, limit)
+        records = self._read(chat_id, query, params, after)
+        seqs = sorted(records)
+        if limit is not None:
+            seqs = seqs[:limit]
+        return [records[seq].to_dict(seq) for seq in seqs]
+
+    def _read(self, chat_id: str, query: str, params: tuple,
+              after: int = -1) -> Dict[int, MessageRecord]:
+        """Rows from query merged with the chat's unflushed messages, by seq"""
+        # Snapshot unflushed messages before reading the table; anything the
+        # flusher commits in between is de-duplicated by sequence number
+        with self._lock:
+            if chat_id in self._deleted:
+                return {}
+            queued = [(seq, record) for seq, record in self._unflushed.get(chat_id, {}).items()
+                      if seq > after]
+        rows = self._query(query, params)
+        records = {seq: MessageRecord(role, content, category, bool(interrupted))
+                   for seq, role, content, category, interrupted in rows}
+        for seq, record in queued:
+            records.setdefault(seq, record)
+        return records
+
+    # -- write-behind -----------------------------------------------------
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+            now = time.time()
+            with self._db_lock:
+                self._conn.execute("BEGIN")
+                rows = []
+                for op in batch:
+                    if op[0] == "message":
+                        _, cid, seq, record = op
+                        rows.append((cid, seq, record.role, record.content, record.category,
+                                     int(record.interrupted), now))
+                        continue
+                    # Keep the order: queued messages go in before a session write
+                    self._insert_messages(rows)
+                    rows = []
+                    if op[0] == "session":
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO sessions (chat_id, profile, created_at) "
+                            "VALUES (?, NULL, ?)", (op[1], op[2]),
+                        )
+                    elif op[0] == "profile":
+                        self._conn.execute(
+                            "UPDATE sessions SET profile = ? WHERE chat_id = ?", (op[2], op[1]),
+                        )
+                    else:
+                        self._conn.execute("DELETE FROM messages WHERE chat_id = ?", (op[1],))
+                        self._conn.execute("DELETE FROM sessions WHERE chat_id = ?", (op[1],))
+                self._insert_messages(rows)
+                self._conn.execute("COMMIT")
+            # In slices, so appends never wait for a whole batch
+            for start in range(0, len(batch), 1000):
+                with self._lock:
+                    self._forget_committed(batch[start:start + 1000])
+
+    def _forget_committed(self, ops: List[tuple]) -> None:
+        """Drop committed writes from the read-side indexes (caller holds _lock)"""
+        for op in ops:
+            if op[0] == "message":
+                unflushed = self._unflushed.get(op[1])
+                # Unless the chat was deleted (and re-created) meanwhile
+                if unflushed is not None and unflushed.get(op[2]) is op[3]:
+                    del unflushed[op[2]]
+                    if not unflushed:
+                        del self._unflushed[op[1]]
+            elif op[0] == "delete":
+                remaining = self._deleted.pop(op[1], 1) - 1
+                if remaining:
+                    self._deleted[op[1]] = remaining
+
+    def _insert_messages(self, rows: List[tuple]) -> None:
+        if rows:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages "
+                "(chat_id, seq, role, content, category, interrupted, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        with self._read_lock:
+            self._reader.close()
+        with self._db_lock:
+            self._conn.close()
+
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    """
+    Build the configured store
+
+    SESSION_STORE selects "memory" (default) or "sqlite"; SESSION_DB_PATH sets
+    the SQLite file location.
+    """
+    backend = (backend or os.getenv("SESSION_STORE", "memory")).lower()
+    if backend == "sqlite":
+        return SqliteSessionStore(os.getenv("SESSION_DB_PATH", "sessions.db"))
+    if backend == "memory":
+        return InMemorySessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
@@ -0,0 +1,132 @@
+# session_store_benchmark.py
+# Append and history-read throughput of the session stores at 100k sessions
+#
+# python session_store_benchmark.py --sessions 100000 --messages 10 --reads 100000
+#
+# Messages are appended turn by turn across all sessions (every session gets
+# its first message before any gets its second), as concurrent chats would
+# write them. Append latency is what the streaming path pays: for SQLite that
+# is queueing the message, with the commit left to the write-behind thread,
+# so the time until everything is committed is reported separately. Every
+# read_every-th append is followed by a last-N history read of that session,
+# timed separately: those reads run while the write-behind thread commits.
+# The remaining reads are last-N history lookups and pages of random
+# sessions after all writes are committed.
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+from loadtest import summarize
+from session_store import InMemorySessionStore, SessionStore, SqliteSessionStore
+
+
+def fill(store: SessionStore, chat_ids: List[str], messages: int, chars: int,
+         read_every: int, limit: int) -> Dict:
+    text = ("x" * chars)
+    started = time.perf_counter()
+    for chat_id in chat_ids:
+        store.create(chat_id)
+    create_seconds = time.perf_counter() - started
+
+    timings = []
+    read_timings = []
+    perf_counter = time.perf_counter
+    started = perf_counter()
+    count = 0
+    for i in range(messages):
+        message = {"role": "user" if i % 2 == 0 else "assistant", "content": text,
+                   "category": "investments"}
+        for chat_id in chat_ids:
+            call_started = perf_counter()
+            store.append_message(chat_id, message)
+            timings.append((perf_counter() - call_started) * 1e6)
+            count += 1
+            if count % read_every == 0:
+                call_started = perf_counter()
+                store.get_messages(chat_id, limit=limit)
+                read_timings.append((perf_counter() - call_started) * 1e6)
+    append_seconds = perf_counter() - started
+    store.flush()
+    committed_seconds = perf_counter() - started
+    appends = len(chat_ids) * messages
+    return {
+        "sessions_per_second": round(len(chat_ids) / create_seconds),
+        "appends": appends,
+        "appends_per_second": round(appends / append_seconds),
+        "append_us": summarize(timings),
+        "read_during_writes_us": summarize(read_timings),
+        "all_committed_seconds": round(committed_seconds, 3),
+    }
+
+
+def read(store: SessionStore, chat_ids: List[str], reads: int, limit: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    sample = [rng.choice(chat_ids) for _ in range(reads)]
+    report = {}
+    for name, call in (("last_messages", lambda chat_id: store.get_messages(chat_id, limit=limit)),
+                       ("page", lambda chat_id: store.get_page(chat_id, after=1, limit=limit))):
+        timings = []
+        perf_counter = time.perf_counter
+        started = perf_counter()
+        for chat_id in sample:
+            call_started = perf_counter()
+            call(chat_id)
+            timings.append((perf_counter() - call_started) * 1e6)
+        elapsed = perf_counter() - started
+        report[name] = {"reads_per_second": round(reads / elapsed), "read_us": summarize(timings)}
+    return report
+
+
+def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    chat_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(args.sessions)]
+    report: Dict = {
+        "config": {"sessions": args.sessions, "messages": args.messages, "chars": args.chars,
+                   "reads": args.reads, "limit": args.limit, "read_every": args.read_every},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {"memory": InMemorySessionStore()}
+        if not args.skip_sqlite:
+            stores["sqlite"] = SqliteSessionStore(os.path.join(directory, "sessions.db"))
+        for name, store in stores.items():
+            result = fill(store, chat_ids, args.messages, args.chars, args.read_every, args.limit)
+            result.update(read(store, chat_ids, args.reads, args.limit, args.seed))
+            if isinstance(store, SqliteSessionStore):
+                result["database_megabytes"] = round(
+                    sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+                    / 2 ** 20, 1)
+            store.close()
+            report[name] = result
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark session store appends and history reads")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=10, help="messages per session")
+    parser.add_argument("--chars", type=int, default=400, help="characters per message")
+    parser.add_argument("--reads", type=int, default=100000, help="history reads per read pattern")
+    parser.add_argument("--limit", type=int, default=10, help="messages per history read")
+    parser.add_argument("--read-every", type=int, default=100,
+                        help="appends between history reads while writing")
+    parser.add_argument("--skip-sqlite", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# single_flight.py
+# Coalesce identical in-flight LLM generations into one upstream stream
+
+import asyncio
+import hashlib
+import json
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+def flight_key(model: str, messages: List[Dict], options: Dict) -> str:
+    """Identity of a generation: same model, messages and options -> same output stream"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "options": options},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCancelled(Exception):
+    """The shared upstream generation was cancelled before it finished"""
+
+
+class Flight:
+    """One upstream generation and the text chunks it has produced so far"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Condition()
+        # Called once the upstream generation has ended (e.g. to free its slot)
+        self.on_done: Optional[Callable[[], None]] = None
+
+
+class SingleFlight:
+    """
+    Shares one upstream token stream between identical concurrent requests
+
+    The first request for a key starts the upstream generation in a task;
+    requests arriving while it runs subscribe to it. Every subscriber first
+    receives the prefix produced so far and then each new chunk. The upstream
+    is cancelled as soon as its last subscriber goes away, and a key is
+    forgotten once its generation ends, so later requests start fresh.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def is_in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    async def wake(self, key: str) -> None:
+        """Make subscribers of key re-check their stop events"""
+        flight = self._flights.get(key)
+        if flight is not None:
+            async with flight.changed:
+                flight.changed.notify_all()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._flights),
+            "upstream_calls": self.upstream_calls,
+            "coalesced_requests": self.coalesced,
+        }
+
+    async def stream(self, key: str,
+                     start: Callable[[], Awaitable[AsyncIterator]],
+                     stop: Optional[asyncio.Event] = None,
+                     on_done: Optional[Callable[[], None]] = None) -> AsyncIterator[str]:
+        """
+        Yield the text chunks of the generation identified by key
+
+        start() is only called when no identical generation is in flight; it
+        must return an async iterator of Ollama chat chunks. Use this inside
+        contextlib.aclosing() so leaving early releases the subscription.
+        Setting stop (followed by wake(key)) ends this subscription early.
+
+        on_done is called when the upstream generation ends if this request
+        starts it, even if this subscriber leaves first and others keep
+        listening; a request joining a running generation has no upstream
+        of its own, so its on_done is called right away.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight()
+            flight.on_done = on_done
+            self._flights[key] = flight
+            flight.task = asyncio.get_running_loop().create_task(self._pump(key, flight, start))
+            self.upstream_calls += 1
+        else:
+            self.coalesced += 1
+            if on_done is not None:
+                on_done()
+
+        flight.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(
+                        lambda: position < len(flight.chunks) or flight.done
+                        or (stop is not None and stop.is_set())
+                    )
+                    if stop is not None and stop.is_set():
+                        return
+                    new_chunks = flight.chunks[position:]
+                    position = len(flight.chunks)
+                    finished = flight.done
+                for chunk in new_chunks:
+                    yield chunk
+                if finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more: free the upstream slot
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    async def _pump(self, key: str, flight: Flight,
+                    start: Callable[[], Awaitable[AsyncIterator]]) -> None:
+        try:
+            upstream = await start()
+            try:
+                async for chunk in upstream:
+                    content = chunk["message"]["content"]
+                    if content:
+                        async with flight.changed:
+                            flight.chunks.append(content)
+                            flight.changed.notify_all()
+            finally:
+                # Closing the stream closes the HTTP response to Ollama
+                aclose = getattr(upstream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+        except asyncio.CancelledError:
+            flight.error = GenerationCancelled("Upstream generation was cancelled")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            self._forget(key, flight)
+            flight.done = True
+            if flight.on_done is not None:
+                flight.on_done()
+            async with flight.changed:
+                flight.changed.notify_all()
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
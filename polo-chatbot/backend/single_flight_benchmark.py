@@ -0,0 +1,195 @@
+# single_flight_benchmark.py
+# Upstream generations for bursts of duplicate requests, with and without SingleFlight
+#
+# python single_flight_benchmark.py --bursts 10 --burst-size 50 --distinct 4 --spread 0.3
+#
+# Each burst sends burst_size requests spread over spread seconds, every one
+# asking one of distinct sample queries, at a FakeOllamaClient. Without
+# coalescing every request is its own upstream call; with it, requests for a
+# query already being generated subscribe to that stream, and those arriving
+# after it started get the produced prefix replayed. Upstream calls are
+# counted by the fake client itself, and every request's text is compared
+# with what the fake model generates for its query.
+#
+# It then checks the coalescing guarantees and exits non-zero if one fails:
+# burst_size identical requests make exactly one upstream call and all get
+# the same text, and a request joining halfway through a generation gets the
+# already-streamed prefix replayed without a second upstream call.
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Dict, List
+
+from fake_ollama import FakeOllamaClient, FakeOllamaConfig
+from finance_utils import FinanceQueryValidator
+from loadtest import summarize
+from single_flight import SingleFlight, flight_key
+
+MODEL = "qwen2.5:7b"
+OPTIONS = {"temperature": 0.7, "num_predict": 1000}
+
+
+def request_messages(query: str) -> List[Dict]:
+    return [{"role": "system", "content": "You are FinanceGPT."},
+            {"role": "user", "content": query}]
+
+
+async def direct(client: FakeOllamaClient, messages: List[Dict]) -> str:
+    text = []
+    async for chunk in await client.chat(model=MODEL, messages=messages, stream=True, options=OPTIONS):
+        text.append(chunk["message"]["content"])
+    return "".join(text)
+
+
+async def coalesced(flights: SingleFlight, client: FakeOllamaClient, messages: List[Dict]) -> str:
+    def start():
+        return client.chat(model=MODEL, messages=messages, stream=True, options=OPTIONS)
+
+    text = []
+    async for content in flights.stream(flight_key(MODEL, messages, OPTIONS), start):
+        text.append(content)
+    return "".join(text)
+
+
+async def run_mode(mode: str, args, arrivals: List[List], expected: Dict[str, str]) -> Dict:
+    client = FakeOllamaClient(FakeOllamaConfig(
+        model=MODEL, tokens_per_second=args.tokens_per_second,
+        first_token_latency=args.first_token_latency, response_tokens=args.response_tokens,
+    ))
+    flights = SingleFlight()
+    latencies: List[float] = []
+    mismatches = 0
+
+    async def one(delay: float, query: str) -> None:
+        nonlocal mismatches
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        messages = request_messages(query)
+        if mode == "single_flight":
+            text = await coalesced(flights, client, messages)
+        else:
+            text = await direct(client, messages)
+        latencies.append(time.perf_counter() - started)
+        if text != expected[query]:
+            mismatches += 1
+
+    started = time.perf_counter()
+    for burst in arrivals:
+        await asyncio.gather(*(one(delay, query) for delay, query in burst))
+    elapsed = time.perf_counter() - started
+    requests = sum(len(burst) for burst in arrivals)
+    return {
+        "requests": requests,
+        "upstream_calls": client.requests,
+        "requests_per_upstream_call": round(requests / client.requests, 2),
+        "seconds": round(elapsed, 3),
+        "latency_seconds": summarize(latencies),
+        "text_mismatches": mismatches,
+        "single_flight": flights.stats() if mode == "single_flight" else None,
+    }
+
+
+async def check_coalescing(args, query: str, expected: str) -> List[str]:
+    """Failures of the coalescing guarantees for one query, [] if they all hold"""
+    failures = []
+    messages = request_messages(query)
+    key = flight_key(MODEL, messages, OPTIONS)
+
+    # N identical requests at once -> one upstream call, N identical texts
+    client = FakeOllamaClient(FakeOllamaConfig(
+        model=MODEL, tokens_per_second=args.tokens_per_second,
+        first_token_latency=args.first_token_latency, response_tokens=args.response_tokens,
+    ))
+    flights = SingleFlight()
+    texts = await asyncio.gather(*(coalesced(flights, client, messages) for _ in range(args.burst_size)))
+    if client.requests != 1:
+        failures.append(f"{args.burst_size} identical requests made {client.requests} upstream calls")
+    if any(text != expected for text in texts):
+        failures.append(f"{sum(text != expected for text in texts)} of {len(texts)} joiners got different text")
+
+    # A request joining mid-generation gets the streamed prefix replayed
+    client = FakeOllamaClient(FakeOllamaConfig(
+        model=MODEL, tokens_per_second=args.tokens_per_second,
+        first_token_latency=args.first_token_latency, response_tokens=args.response_tokens,
+    ))
+    flights = SingleFlight()
+    originator = asyncio.get_running_loop().create_task(coalesced(flights, client, messages))
+    prefix = 0
+    while prefix < args.response_tokens // 2 and not originator.done():
+        await asyncio.sleep(0.001)
+        flight = flights._flights.get(key)
+        prefix = len(flight.chunks) if flight is not None else prefix
+    late = await coalesced(flights, client, messages)
+    first = await originator
+    if prefix == 0:
+        failures.append("the late joiner arrived before any chunk was streamed")
+    if client.requests != 1:
+        failures.append(f"the late joiner started its own upstream call ({client.requests} calls)")
+    if late != expected or first != expected:
+        failures.append(f"the late joiner (after {prefix} chunks) did not get the full text replayed")
+    return failures
+
+
+async def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    queries = FinanceQueryValidator.get_sample_queries()[:args.distinct]
+    arrivals = [
+        sorted((rng.uniform(0, args.spread), rng.choice(queries)) for _ in range(args.burst_size))
+        for _ in range(args.bursts)
+    ]
+    # Reference text of every query, generated alone
+    reference = FakeOllamaClient(FakeOllamaConfig(
+        model=MODEL, tokens_per_second=0, first_token_latency=0,
+        response_tokens=args.response_tokens,
+    ))
+    expected = {query: await direct(reference, request_messages(query)) for query in queries}
+
+    baseline = await run_mode("direct", args, arrivals, expected)
+    single_flight = await run_mode("single_flight", args, arrivals, expected)
+    failures = await check_coalescing(args, queries[0], expected[queries[0]])
+    if baseline["text_mismatches"] or single_flight["text_mismatches"]:
+        failures.append(f"{baseline['text_mismatches']} direct and {single_flight['text_mismatches']} "
+                        f"coalesced responses differ from the model's text")
+    return {
+        "config": {"bursts": args.bursts, "burst_size": args.burst_size, "distinct": args.distinct,
+                   "spread_seconds": args.spread, "tokens_per_second": args.tokens_per_second,
+                   "first_token_latency": args.first_token_latency,
+                   "response_tokens": args.response_tokens},
+        "direct": baseline,
+        "single_flight": single_flight,
+        "upstream_reduction": round(1 - single_flight["upstream_calls"] / baseline["upstream_calls"], 4),
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-flight coalescing of generations")
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--burst-size", type=int, default=50, help="requests per burst")
+    parser.add_argument("--distinct", type=int, default=4, help="different queries per burst")
+    parser.add_argument("--spread", type=float, default=0.3, help="seconds over which a burst arrives")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.1)
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.burst_size < 1 or args.response_tokens < 2:
+        parser.error("--burst-size must be at least 1 and --response-tokens at least 2")
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if report["failures"]:
+        sys.exit("FAILED: " + "; ".join(report["failures"]))
+
+
+if __name__ == "__main__":
+    main()
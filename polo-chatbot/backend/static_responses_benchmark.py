@@ -0,0 +1,156 @@
+# static_responses_benchmark.py
+# Throughput of the static endpoints: per-request dict + JSONResponse vs. StaticJSON bytes and 304s
+#
+# python static_responses_benchmark.py --requests 5000 --repeat 3
+#
+# Both variants are mounted on a bare FastAPI app (no middleware) and called
+# in-process through httpx's ASGI transport, so the numbers isolate handler
+# and serialization cost from the network. "rebuild" is the previous
+# implementation: the handler builds the dict on every request and FastAPI
+# encodes it with jsonable_encoder and the stdlib JSONResponse. "static" is
+# api.py's handlers serving StaticJSON bytes; "not_modified" sends the ETag
+# back in If-None-Match and gets an empty 304. Every static body is checked
+# to decode to the same JSON as the rebuilt one.
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Dict, List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from loadtest import summarize
+
+ROUTES = ["/", "/investment-options", "/sample-queries", "/allocations"]
+
+
+def rebuild_app(api) -> FastAPI:
+    """The handlers as they were before StaticJSON"""
+    app = FastAPI(default_response_class=JSONResponse)
+
+    @app.get("/")
+    async def root():
+        return {
+            "service": "FinanceGPT API",
+            "version": "1.0.0",
+            "status": "active",
+            "description": "Finance-specific chatbot powered by Ollama"
+        }
+
+    @app.get("/investment-options")
+    async def get_investment_options():
+        return {
+            "mutual_funds": {
+                "large_cap": [fund["name"] for fund in api.MUTUAL_FUNDS["large_cap"][:3]],
+                "mid_cap": [fund["name"] for fund in api.MUTUAL_FUNDS["mid_cap"][:2]],
+                "debt": [fund["name"] for fund in api.MUTUAL_FUNDS["debt"][:2]]
+            },
+            "stocks": {
+                "blue_chip": [stock["name"] for stock in api.STOCKS["blue_chip"][:5]]
+            },
+            "risk_allocations": api.RISK_ALLOCATIONS
+        }
+
+    @app.get("/sample-queries")
+    async def get_sample_queries():
+        return {
+            "queries": api.FinanceQueryValidator.get_sample_queries()
+        }
+
+    @app.get("/allocations")
+    async def get_allocations():
+        return {
+            "risk_allocations": api.RISK_ALLOCATIONS,
+            "sip_guidelines": api.SIP_GUIDELINES
+        }
+
+    return app
+
+
+def static_app(api) -> FastAPI:
+    """api.py's current handlers without the app's middleware"""
+    app = FastAPI()
+    for path, handler in (("/", api.root), ("/investment-options", api.get_investment_options),
+                          ("/sample-queries", api.get_sample_queries),
+                          ("/allocations", api.get_allocations)):
+        app.add_api_route(path, handler, methods=["GET"])
+    return app
+
+
+async def time_route(client: httpx.AsyncClient, path: str, requests: int, repeat: int,
+                     headers: Callable[[], Dict]) -> Dict:
+    """Best-of-repeat throughput and the latencies (µs) of that run"""
+    best_rate = 0.0
+    best_timings: List[float] = []
+    status = None
+    size = None
+    perf_counter = time.perf_counter
+    for _ in range(repeat):
+        timings = []
+        started = perf_counter()
+        for _ in range(requests):
+            call_started = perf_counter()
+            response = await client.get(path, headers=headers())
+            timings.append((perf_counter() - call_started) * 1e6)
+        rate = requests / (perf_counter() - started)
+        if rate > best_rate:
+            best_rate, best_timings = rate, timings
+        status, size = response.status_code, len(response.content)
+    return {"requests_per_second": round(best_rate), "latency_us": summarize(best_timings),
+            "status": status, "body_bytes": size}
+
+
+async def run(args) -> Dict:
+    os.environ.update(WARM_ANSWERS_INTERVAL="-1", WARM_ANSWERS_PATH="", RATE_LIMIT_ENABLED="0")
+    import api
+
+    transports = {
+        "rebuild": httpx.ASGITransport(app=rebuild_app(api)),
+        "static": httpx.ASGITransport(app=static_app(api)),
+    }
+    report: Dict = {"config": {"requests": args.requests, "repeat": args.repeat}, "routes": {}}
+    mismatches = 0
+    async with httpx.AsyncClient(transport=transports["rebuild"], base_url="http://bench") as rebuild, \
+            httpx.AsyncClient(transport=transports["static"], base_url="http://bench") as static:
+        for path in ROUTES:
+            first = await static.get(path)
+            etag = first.headers["etag"]
+            if first.json() != (await rebuild.get(path)).json():
+                mismatches += 1
+            result = {
+                "rebuild": await time_route(rebuild, path, args.requests, args.repeat, dict),
+                "static": await time_route(static, path, args.requests, args.repeat, dict),
+                "not_modified": await time_route(static, path, args.requests, args.repeat,
+                                                 lambda: {"If-None-Match": etag}),
+            }
+            base = result["rebuild"]["requests_per_second"]
+            result["speedup"] = {
+                "static": round(result["static"]["requests_per_second"] / base, 2),
+                "not_modified": round(result["not_modified"]["requests_per_second"] / base, 2),
+            }
+            report["routes"][path] = result
+    report["body_mismatches"] = mismatches
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark static endpoint responses")
+    parser.add_argument("--requests", type=int, default=5000, help="requests per route and variant")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is reported")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
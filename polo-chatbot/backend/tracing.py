@@ -0,0 +1,187 @@
+# tracing.py
+# Lightweight per-request spans, a ring buffer of sampled traces and request IDs
+
+import random
+import re
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+# Incoming X-Request-ID values are kept only if they look like an ID
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Span:
+    __slots__ = ("name", "start", "duration", "attrs")
+
+    def __init__(self, name: str, start: float, duration: float, attrs: Optional[Dict]):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.attrs = attrs
+
+
+class _SpanTimer:
+    """Context manager timing one span of a trace"""
+
+    __slots__ = ("trace", "name", "attrs", "started")
+
+    def __init__(self, trace: "Trace", name: str, attrs: Optional[Dict]):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> "_SpanTimer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.attrs = dict(self.attrs or {}, error=exc_type.__name__)
+        self.trace.add(self.name, self.started, time.perf_counter() - self.started, self.attrs)
+
+
+class Trace:
+    """
+    Timings of one request: a list of spans relative to its start
+
+    Spans are flat (no parent links); a stage that happens many times, such
+    as writing SSE events, is recorded once with its total and a count.
+    """
+
+    __slots__ = ("request_id", "name", "attrs", "started_at", "started", "spans",
+                 "status", "duration")
+
+    def __init__(self, request_id: str, name: str, attrs: Dict):
+        self.request_id = request_id
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.status: Optional[str] = None
+        self.duration: Optional[float] = None
+
+    def span(self, name: str, **attrs) -> _SpanTimer:
+        return _SpanTimer(self, name, attrs or None)
+
+    def add(self, name: str, start: float, duration: float, attrs: Optional[Dict] = None) -> None:
+        """Record a span timed elsewhere (start is a perf_counter() value)"""
+        self.spans.append(Span(name, start - self.started, duration, attrs))
+
+    def to_dict(self) -> Dict:
+        spans = []
+        for span in self.spans:
+            entry = {"name": span.name, "start_ms": round(span.start * 1000, 3),
+                     "duration_ms": round(span.duration * 1000, 3)}
+            if span.attrs:
+                entry.update(span.attrs)
+            spans.append(entry)
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            **self.attrs,
+            "spans": spans,
+        }
+
+
+class Tracer:
+    """
+    Keeps the most recent traces in a bounded ring buffer
+
+    Every request is traced (a handful of perf_counter calls), but only a
+    sample_rate fraction of finished traces is kept, plus every trace slower
+    than slow_seconds or finishing with an error status.
+    """
+
+    def __init__(self, capacity: int = 512, sample_rate: float = 0.1, slow_seconds: float = 2.0):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self._traces: "deque[Trace]" = deque(maxlen=capacity)
+        self._random = random.Random()
+        self.started = 0
+        self.kept = 0
+
+    def start(self, name: str, request_id: str, **attrs) -> Trace:
+        self.started += 1
+        return Trace(request_id, name, attrs)
+
+    def finish(self, trace: Trace, status: str = "ok") -> None:
+        """End the trace and maybe keep it (only the first call counts)"""
+        if trace.duration is not None:
+            return
+        trace.duration = time.perf_counter() - trace.started
+        trace.status = status
+        if (status != "ok" or trace.duration >= self.slow_seconds
+                or self._random.random() < self.sample_rate):
+            self._traces.append(trace)
+            self.kept += 1
+
+    def recent(self, limit: int = 50, min_duration: float = 0.0,
+               name: Optional[str] = None) -> List[Dict]:
+        """Newest first"""
+        traces = []
+        for trace in reversed(self._traces):
+            if trace.duration < min_duration or (name is not None and trace.name != name):
+                continue
+            traces.append(trace.to_dict())
+            if len(traces) >= limit:
+                break
+        return traces
+
+    def stats(self) -> Dict:
+        return {
+            "capacity": self._traces.maxlen,
+            "buffered": len(self._traces),
+            "sample_rate": self.sample_rate,
+            "slow_seconds": self.slow_seconds,
+            "started": self.started,
+            "kept": self.kept,
+        }
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving every HTTP request an ID
+
+    A well-formed incoming X-Request-ID (e.g. from a proxy) is kept,
+    otherwise a new one is generated. Routes read it from
+    request.state.request_id, and every response carries it back in the
+    X-Request-ID header.
+    """
+
+    HEADER = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.HEADER:
+                value = value.decode("latin-1")
+                if _REQUEST_ID.match(value):
+                    request_id = value
+                break
+        if request_id is None:
+            request_id = new_request_id()
+        scope.setdefault("state", {})["request_id"] = request_id
+        header = (self.HEADER, request_id.encode("latin-1"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), header]
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
@@ -0,0 +1,177 @@
+# warm_answers.py
+# Versioned on-disk cache of precomputed answers to the advertised sample queries
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from response_cache import normalize_message
+
+# Bump when the file layout changes; files written by another version are ignored
+CACHE_VERSION = 1
+
+
+class WarmQuery(NamedTuple):
+    """One answer to keep warm: the exact prompt it is generated from"""
+    query: str
+    risk: Optional[str]  # None = chats without a profile
+    messages: List[Dict]
+    options: Dict
+
+
+def entry_key(query: str, risk: Optional[str]) -> str:
+    return f"{risk or '-'}|{normalize_message(query)}"
+
+
+def prompt_hash(messages: List[Dict], options: Dict) -> str:
+    """Hash of everything besides the model that shapes a generation"""
+    encoded = json.dumps({"messages": messages, "options": options},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class WarmAnswerCache:
+    """
+    Answers to fixed queries, one per (query, risk level), persisted as JSON
+
+    Every entry records the model and the prompt hash it was generated with.
+    Lookups compare them with the current model and the hashes set by
+    expect(), so an edited system prompt or a model switch turns old entries
+    stale (skipped, then regenerated by refresh()) instead of serving answers
+    to a different prompt. Writes go through a temp file and os.replace, so a
+    crash never leaves a truncated cache.
+    """
+
+    def __init__(self, path: Optional[str], max_age_seconds: float = 24 * 3600.0):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self._entries: Dict[str, Dict] = {}
+        # entry key -> prompt hash of the current WarmQuery set (see expect())
+        self._current: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.generated = 0
+        self.failures = 0
+        self.last_refresh: Optional[Dict] = None
+        self.load()
+
+    def load(self) -> None:
+        self._entries = {}
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self._entries = data.get("entries", {})
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".warm_answers.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "entries": self._entries}, f,
+                          ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _valid(self, entry: Optional[Dict], model: str, digest: str) -> bool:
+        return entry is not None and entry["model"] == model and entry["prompt_hash"] == digest
+
+    def get(self, query: str, risk: Optional[str], model: str) -> Optional[str]:
+        """The answer generated for query under risk with the current prompt, if any"""
+        key = entry_key(query, risk)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if not self._valid(entry, model, self._current.get(key, "")):
+            self.stale += 1
+            return None
+        self.hits += 1
+        return entry["answer"]
+
+    def expect(self, queries: List[WarmQuery]) -> None:
+        """Set the prompts lookups must match (entries for others are stale)"""
+        self._current = {entry_key(q.query, q.risk): prompt_hash(q.messages, q.options)
+                         for q in queries}
+
+    async def refresh(self, queries: List[WarmQuery], model: str,
+                      generate: Callable[[WarmQuery], Awaitable[str]]) -> Dict:
+        """
+        Generate every missing, stale or expired answer, one at a time
+
+        Entries for queries no longer in the list are dropped. The file is
+        saved after each answer so a restart keeps the finished ones.
+        """
+        started = time.perf_counter()
+        self.expect(queries)
+        removed = [key for key in self._entries if key not in self._current]
+        for key in removed:
+            del self._entries[key]
+        if removed:
+            self.save()
+        generated = failed = 0
+        for query in queries:
+            key = entry_key(query.query, query.risk)
+            entry = self._entries.get(key)
+            if (self._valid(entry, model, self._current[key])
+                    and time.time() - entry["created_at"] < self.max_age_seconds):
+                continue
+            try:
+                answer = await generate(query)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                failed += 1
+                continue
+            if not answer:
+                failed += 1
+                continue
+            self._entries[key] = {
+                "query": query.query,
+                "risk": query.risk,
+                "model": model,
+                "prompt_hash": self._current[key],
+                "created_at": time.time(),
+                "answer": answer,
+            }
+            generated += 1
+            self.save()
+        self.generated += generated
+        self.failures += failed
+        self.last_refresh = {
+            "finished_at": time.time(),
+            "seconds": round(time.perf_counter() - started, 3),
+            "generated": generated,
+            "failed": failed,
+            "removed": len(removed),
+        }
+        return self.last_refresh
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "path": self.path,
+            "entries": len(self._entries),
+            "expected": len(self._current),
+            "max_age_seconds": self.max_age_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "generated": self.generated,
+            "failures": self.failures,
+            "last_refresh": self.last_refresh,
+        }
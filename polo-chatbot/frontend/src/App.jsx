@@ -6,10 +6,14 @@ import jsPDF from 'jspdf';
 import './App.css';
 
 // Utility function to parse SSE stream
+// Only unnamed (message) events carry answer text; named events such as
+// "queue" are status updates from the server and are skipped here
 async function* parseSSEStream(stream) {
   const reader = stream.getReader();
   const decoder = new TextDecoder('utf-8');
   let buffer = '';
+  let eventName = 'message';
+  let dataLines = [];
 
   while (true) {
     const { done, value } = await reader.read();
@@ -19,12 +23,23 @@ async function* parseSSEStream(stream) {
     const lines = buffer.split('\n');
     buffer = lines.pop() || '';
 
-    for (const line of lines) {
-      if (line.startsWith('data: ')) {
-        const chunk = line.slice(6);
-        if (chunk.trim()) {
-          yield chunk;
+    for (const rawLine of lines) {
+      // The server frames events with CRLF
+      const line = rawLine.endsWith('\r') ? rawLine.slice(0, -1) : rawLine;
+      if (line === '') {
+        // A batched chunk can span several data lines (one per newline)
+        if (eventName === 'message' && dataLines.length) {
+          const chunk = dataLines.join('\n');
+          if (chunk) {
+            yield chunk;
+          }
         }
+        eventName = 'message';
+        dataLines = [];
+      } else if (line.startsWith('event:')) {
+        eventName = line.slice(6).trim();
+      } else if (line.startsWith('data:')) {
+        dataLines.push(line.startsWith('data: ') ? line.slice(6) : line.slice(5));
       }
     }
   }
@@ -59,11 +74,21 @@ async function sendChatMessage(chatId, message, userProfile, signal) {
   });
   if (!res.ok) {
     const errorData = await res.json();
-    return Promise.reject({ status: res.status, data: errorData });
+    return Promise.reject({
+      status: res.status,
+      data: errorData,
+      // Quoted in the error message so a slow or failed chat can be found in /debug/traces
+      requestId: res.headers.get('X-Request-ID')
+    });
   }
   return res.body;
 }
 
+async function cancelChatGeneration(chatId) {
+  // Best effort: the server also stops when the aborted stream disconnects
+  await fetch(`${API_URL}/chats/${chatId}/cancel`, { method: 'POST' }).catch(() => {});
+}
+
 async function getSampleQueries() {
   const res = await fetch(`${API_URL}/sample-queries`);
   const data = await res.json();
@@ -495,6 +520,9 @@ function Chatbot() {
     if (abortControllerRef.current) {
       abortControllerRef.current.abort();
       abortControllerRef.current = null;
+      if (chatId) {
+        cancelChatGeneration(chatId);
+      }
       
       setMessages(prev => {
         const updated = [...prev];
@@ -572,6 +600,9 @@ function Chatbot() {
       } else if (err.data?.detail) {
         errorMessage = err.data.detail;
       }
+      if (err.requestId && err.status >= 500) {
+        errorMessage += ` (request ID: ${err.requestId})`;
+      }
       
       setMessages(prev => {
         const updated = [...prev];